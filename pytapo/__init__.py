@@ -1,21 +1,41 @@
 #
 # Author: See contributors at https://github.com/JurajNyiri/pytapo/graphs/contributors
 #
+import asyncio
+import contextvars
+import inspect
 import json
 import requests
 import uuid
 from .transport.transport import Transport
+from .transport.pool import TransportPool, PooledSession
+from .transport.pytapo.streamDecode import streamElements
 from .logger import Logger
-from .asyncHandler import AsyncHandler
+from .asyncHandler import AsyncHandler, runCoroutine
+from .futures import getSubmitExecutor
+from .motorQueue import MotorQueue
+from .retryPolicy import RetryPolicyEngine, RetryAction
+from .error import ResponseException, TemporarySuspensionException
+from .deadline import deadlineScope, deadlineMethods, sleep, asyncSleep, checkDeadline
 
 from datetime import datetime, timedelta
 from warnings import warn
 
-from .const import ERROR_CODES, MAX_LOGIN_RETRIES
+from .const import (
+    ERROR_CODES,
+    EVENT_PAGE_SIZE,
+    RECORDINGS_PAGE_SIZE,
+    RECORDINGS_BATCH_SIZE,
+)
+from .playback.pages import iterPages
+from .views import MostView
+from .userIDPool import UserIDPool
+from .capabilities import Capabilities, deferDiscovery
 from .media_stream.session import HttpMediaSession
 from .media_stream._utils import StreamType
 
 
+@deadlineMethods
 class Tapo:
 
     def __init__(
@@ -38,12 +58,32 @@ class Tapo:
         playerID=None,
         printWarnInformation=True,
         transportMethod=None,
+        rateLimit=True,
+        retryPolicy=None,
+        timeout=None,
+        sessionPoolSize=1,
+        parent=None,
+        keepAlive=False,
+        capabilities=None,
     ):
-
-        self.logger = Logger(printDebugInformation, printWarnInformation)
-        self.asyncHandler = AsyncHandler(hass)
+        self.parent = parent
+        if parent is not None:
+            # child of a hub, shares its authenticated transport
+            self.logger = parent.logger
+            self.asyncHandler = parent.asyncHandler
+            hass = parent.hass
+            controlPort = parent.controlPort
+            isKLAP = parent.isKLAP
+            KLAPVersion = parent.KLAPVersion
+            transportMethod = parent.transport.method
+            if timeout is None:
+                timeout = parent.timeout
+        else:
+            self.logger = Logger(printDebugInformation, printWarnInformation)
+            self.asyncHandler = AsyncHandler(hass)
 
         self.host = host
+        self.timeout = timeout
         if hass is not None:
             self.hass = hass
         else:
@@ -76,21 +116,27 @@ class Tapo:
 
         self.logger.debugLog(f"Transport method determined: {transport_method}")
 
-        self.transport = Transport(
-            host=host,
-            controlPort=controlPort,
-            user=user,
-            password=password,
-            logger=self.logger,
-            method=transport_method,
-            KLAPVersion=self.KLAPVersion,
-            retryStok=retryStok,
-            hass=hass,
-            asyncHandler=self.asyncHandler,
-            cloudPassword=cloudPassword,
-            reuseSession=reuseSession,
-            redactConfidentialInformation=redactConfidentialInformation,
-        )
+        if parent is not None:
+            self.retryPolicy = parent.retryPolicy
+            self._transportArgs = parent._transportArgs
+            self.transport = parent.transport
+            self.transportPool = parent.transportPool
+        else:
+            self._createTransport(
+                host,
+                user,
+                password,
+                cloudPassword,
+                reuseSession,
+                retryStok,
+                redactConfidentialInformation,
+                hass,
+                transport_method,
+                rateLimit,
+                retryPolicy,
+                sessionPoolSize,
+                keepAlive,
+            )
 
         self.klapTransport = None
         self.user = user
@@ -98,8 +144,12 @@ class Tapo:
         self.cloudPassword = cloudPassword
         self.superSecretKey = superSecretKey
         self.userID = False
+        self.userIDPool = UserIDPool(self)
+        # capabilities dict of a stored profile skips discovering them again
+        self.capabilities = Capabilities(capabilities)
         self.childID = childID
         self.timeCorrection = False
+        self.motorQueue = None
         if streamPort is None:
             self.streamPort = 8800
         else:
@@ -123,9 +173,64 @@ class Tapo:
         if not self.presets:
             self.presets = {}
 
+    def _createTransport(
+        self,
+        host,
+        user,
+        password,
+        cloudPassword,
+        reuseSession,
+        retryStok,
+        redactConfidentialInformation,
+        hass,
+        transport_method,
+        rateLimit,
+        retryPolicy,
+        sessionPoolSize,
+        keepAlive,
+    ):
+        if retryPolicy is None:
+            self.retryPolicy = RetryPolicyEngine()
+        else:
+            self.retryPolicy = retryPolicy
+
+        self._transportArgs = {
+            "host": host,
+            "controlPort": self.controlPort,
+            "user": user,
+            "password": password,
+            "logger": self.logger,
+            "method": transport_method,
+            "rateLimit": rateLimit,
+            "retryPolicy": self.retryPolicy,
+            "KLAPVersion": self.KLAPVersion,
+            "retryStok": retryStok,
+            "hass": hass,
+            "cloudPassword": cloudPassword,
+            "reuseSession": reuseSession,
+            "redactConfidentialInformation": redactConfidentialInformation,
+            "keepAlive": keepAlive,
+        }
+        self.transport = Transport(
+            asyncHandler=self.asyncHandler, **self._transportArgs
+        )
+        if sessionPoolSize > 1:
+            self.transportPool = TransportPool(
+                PooledSession(self.transport, self.asyncHandler, primary=True),
+                self._createPooledSession,
+                sessionPoolSize,
+                self.logger,
+            )
+        else:
+            self.transportPool = None
+
+    # called on every connect, asks for presets without discovering capabilities
     def isSupportingPresets(self):
+        if not self.capabilities.isSupported("getPresetConfig"):
+            return False
         try:
-            presets = self.getPresets()
+            with deferDiscovery():
+                presets = self.getPresets()
             return presets
         except Exception:
             return False
@@ -148,6 +253,31 @@ class Tapo:
     def getEncryptionMethod(self):
         return self.transport.getEncryptionMethod()
 
+    # everything needed to recreate this device without detecting it again
+    def getProfile(self):
+        return {
+            "host": self.host,
+            "controlPort": self.controlPort,
+            "childID": self.childID,
+            "deviceType": self.deviceType,
+            "isKLAP": self.isKLAP,
+            "KLAPVersion": self.KLAPVersion,
+            "transportMethod": self.transport.method,
+            "streamPort": self.streamPort,
+            "playerID": self.playerID,
+            "capabilities": self.capabilities.toDict(),
+        }
+
+    def getCapabilities(self, refresh=False):
+        if refresh or not self.capabilities.discovered:
+            self.capabilities.discover(self)
+        return self.capabilities
+
+    # discovery runs once, before the first call to a method gated by a component
+    def _discoverCapabilities(self, methods):
+        if self.capabilities.needsDiscovery(methods):
+            self.getCapabilities()
+
     def responseIsOK(self, data=None):
         try:
             if "error_code" not in data or data["error_code"] == 0:
@@ -156,32 +286,69 @@ class Tapo:
         except Exception as e:
             raise Exception("Unexpected response from Tapo Camera: " + str(e))
 
-    def executeFunction(self, method, params, retry=False):
+    # deadline in seconds for all Tapo calls made inside the block, including retries
+    def withDeadline(self, timeout):
+        return deadlineScope(timeout)
+
+    def executeFunction(self, method, params, retry=False, timeout=None):
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            return self._executeFunction(method, params, retry)
+
+    def _executeFunction(self, method, params, retry=False):
+        # fails locally for methods the device does not support
+        self._discoverCapabilities([method])
+        self.capabilities.check(method)
+        data = self._getFunctionData(
+            method, self.performRequest(self._getFunctionRequest(method, params))
+        )
+        try:
+            return self._getFunctionResult(method, data)
+        except ResponseException as err:
+            delay = self._getFunctionRetryDelay(err.errorCode, retry)
+            if delay is None:
+                raise
+            if err.errorCode == -64303:
+                self.setCruise(False, retry=True)
+        sleep(delay, method)
+        return self._executeFunction(method, params, True)
+
+    async def executeFunctionAsync(self, method, params, retry=False, timeout=None):
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            return await self._executeFunctionAsync(method, params, retry)
+
+    async def _executeFunctionAsync(self, method, params, retry=False):
+        if self.capabilities.needsDiscovery([method]):
+            await self._runSync(self.getCapabilities)
+        self.capabilities.check(method)
+        data = self._getFunctionData(
+            method,
+            await self._performRequestAsync(self._getFunctionRequest(method, params)),
+        )
+        try:
+            return self._getFunctionResult(method, data)
+        except ResponseException as err:
+            delay = self._getFunctionRetryDelay(err.errorCode, retry)
+            if delay is None:
+                raise
+            if err.errorCode == -64303:
+                await self._runSync(lambda: self.setCruise(False, retry=True))
+        await asyncSleep(delay, method)
+        return await self._executeFunctionAsync(method, params, True)
+
+    def _getFunctionRequest(self, method, params):
+        request = {"method": method}
+        if params is not None:
+            request["params"] = params
         if method == "multipleRequest":
-            if params is not None:
-                data = self.performRequest(
-                    {"method": "multipleRequest", "params": params}
-                )["result"]["responses"]
-            else:
-                data = self.performRequest({"method": "multipleRequest"})["result"][
-                    "responses"
-                ]
-        else:
-            if params is not None:
-                data = self.performRequest(
-                    {
-                        "method": "multipleRequest",
-                        "params": {"requests": [{"method": method, "params": params}]},
-                    }
-                )["result"]["responses"][0]
-            else:
-                data = self.performRequest(
-                    {
-                        "method": "multipleRequest",
-                        "params": {"requests": [{"method": method}]},
-                    }
-                )["result"]["responses"][0]
+            return request
+        return {"method": "multipleRequest", "params": {"requests": [request]}}
+
+    def _getFunctionData(self, method, response):
+        if method == "multipleRequest":
+            return response["result"]["responses"]
+        return response["result"]["responses"][0]
 
+    def _getFunctionResult(self, method, data):
         if type(data) == list:
             return data
 
@@ -192,86 +359,202 @@ class Tapo:
             return data["result"]
         elif "method" in data and "error_code" in data and data["error_code"] == 0:
             return data
-        else:
-            if "error_code" in data and data["error_code"] == -64303 and retry is False:
-                self.setCruise(False, retry=True)
-                return self.executeFunction(method, params, True)
-            raise Exception(
-                "Error: {}, Response: {}".format(
-                    (
-                        data["err_msg"]
-                        if "err_msg" in data
-                        else self.getErrorMessage(data["error_code"])
-                    ),
-                    json.dumps(data),
-                )
-            )
+        errorCode = data.get("error_code")
+        self.capabilities.onResponse(method, errorCode)
+        raise ResponseException(
+            errorCode,
+            data,
+            "Error: {}, Response: {}".format(
+                (
+                    data["err_msg"]
+                    if "err_msg" in data
+                    else self.getErrorMessage(errorCode)
+                ),
+                json.dumps(data),
+            ),
+        )
+
+    # reauthentication is handled by performRequest
+    def _getFunctionRetryDelay(self, errorCode, retry):
+        if self.retryPolicy.getPolicy(errorCode).action not in (
+            RetryAction.RETRY,
+            RetryAction.BACKOFF,
+        ):
+            return None
+        decision = self.retryPolicy.decide(errorCode, 1 if retry else 0)
+        return decision.delay if decision.retry else None
 
     def close(self):
+        if self.motorQueue is not None:
+            self.motorQueue.close()
+        if self.parent is not None:
+            # transport belongs to the hub
+            return None
+        if self.transportPool is not None:
+            self.transportPool.close()
+        self.transport.shutdown()
         return self.asyncHandler.executeAsyncExecutorJob(self.transport.close)
 
-    def performRequest(self, requestData, loginRetryCount=0):
-        self.asyncHandler.executeAsyncExecutorJob(self.transport.authenticate)
-        if self.childID:
-            fullRequest = {
-                "method": "multipleRequest",
-                "params": {
-                    "requests": [
-                        {
-                            "method": "controlChild",
-                            "params": {
-                                "childControl": {
-                                    "device_id": self.childID,
-                                    "request_data": requestData,
-                                }
-                            },
-                        }
-                    ]
-                },
-            }
+    def _createPooledSession(self):
+        asyncHandler = AsyncHandler(self.hass)
+        return PooledSession(
+            Transport(asyncHandler=asyncHandler, **self._transportArgs),
+            asyncHandler,
+        )
+
+    def getSessionPoolStatistics(self):
+        if self.transportPool is None:
+            return None
+        return self.transportPool.getStatistics()
+
+    def getExecutorStatistics(self):
+        return self.transport.getExecutorStatistics()
+
+    def getKeepAliveStatistics(self):
+        if self.transport.keepAlive is None:
+            return None
+        return self.transport.keepAlive.getStatistics()
+
+    def performRequest(self, requestData, loginRetryCount=0, timeout=None):
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            return self._performRequest(requestData, loginRetryCount)
+
+    def _performRequest(self, requestData, loginRetryCount=0, session=None):
+        if session is None and self.transportPool is not None:
+            session = self.transportPool.acquire()
+            try:
+                response = self._performRequest(requestData, loginRetryCount, session)
+            except Exception as err:
+                self.transportPool.release(session, err=err)
+                raise
+            except BaseException:
+                self.transportPool.release(session)
+                raise
+            self.transportPool.release(session, response)
+            return response
+        if session is None:
+            transport = self.transport
+            asyncHandler = self.asyncHandler
         else:
-            fullRequest = requestData
+            transport = session.transport
+            asyncHandler = session.asyncHandler
+        try:
+            responseJSON = asyncHandler.executeAsyncExecutorJob(
+                self._sendAsync, transport, self._getFullRequest(requestData)
+            )
+        except TemporarySuspensionException as err:
+            sleep(
+                self._getSuspensionDelay(err, loginRetryCount), "temporary suspension"
+            )
+            return self._performRequest(requestData, loginRetryCount + 1, session)
+        decision = self._getResponseRetry(responseJSON, loginRetryCount)
+        if decision is None:
+            return self._unwrapResponse(responseJSON)
+        if decision.clearSession:
+            if responseJSON["error_code"] == -40401:
+                transport.onSessionExpired()
+            asyncHandler.executeAsyncExecutorJob(transport.close)
+        sleep(decision.delay, "retry backoff")
+        return self._performRequest(requestData, loginRetryCount + 1, session)
+
+    # same as performRequest, awaited on the event loop without holding a thread
+    async def performRequestAsync(self, requestData, loginRetryCount=0, timeout=None):
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            return await self._performRequestAsync(requestData, loginRetryCount)
+
+    async def _performRequestAsync(self, requestData, loginRetryCount=0, session=None):
+        if session is None and self.transportPool is not None:
+            session = await self.transportPool.acquireAsync()
+            try:
+                response = await self._performRequestAsync(
+                    requestData, loginRetryCount, session
+                )
+            except Exception as err:
+                await self.transportPool.releaseAsync(session, err=err)
+                raise
+            except BaseException:
+                await self.transportPool.releaseAsync(session)
+                raise
+            await self.transportPool.releaseAsync(session, response)
+            return response
+        transport = self.transport if session is None else session.transport
+        try:
+            responseJSON = await self._sendAsync(
+                transport, self._getFullRequest(requestData)
+            )
+        except TemporarySuspensionException as err:
+            await asyncSleep(
+                self._getSuspensionDelay(err, loginRetryCount), "temporary suspension"
+            )
+            return await self._performRequestAsync(
+                requestData, loginRetryCount + 1, session
+            )
+        decision = self._getResponseRetry(responseJSON, loginRetryCount)
+        if decision is None:
+            return self._unwrapResponse(responseJSON)
+        if decision.clearSession:
+            if responseJSON["error_code"] == -40401:
+                transport.onSessionExpired()
+            await transport.close()
+        await asyncSleep(decision.delay, "retry backoff")
+        return await self._performRequestAsync(
+            requestData, loginRetryCount + 1, session
+        )
+
+    def _getSuspensionDelay(self, err, loginRetryCount):
+        decision = self.retryPolicy.decide(-40404, loginRetryCount, err.secondsLeft)
+        if not decision.retry:
+            raise err
+        self.logger.debugLog(
+            f"Device is temporarily suspended, retrying in {decision.delay}s."
+        )
+        return decision.delay
+
+    # None when the response is OK, raises when it is an error not worth retrying
+    def _getResponseRetry(self, responseJSON, loginRetryCount):
+        self._checkKLAPResponse(responseJSON)
+        if self.responseIsOK(responseJSON):
+            return None
+        #  -40401: Invalid Stok
+        if responseJSON and "error_code" in responseJSON:
+            decision = self.retryPolicy.decide(
+                responseJSON["error_code"], loginRetryCount
+            )
+            if decision.retry:
+                return decision
+        self._raiseResponseError(responseJSON)
+
+    def _getFullRequest(self, requestData):
+        if not self.childID:
+            return requestData
+        return {
+            "method": "multipleRequest",
+            "params": {
+                "requests": [
+                    {
+                        "method": "controlChild",
+                        "params": {
+                            "childControl": {
+                                "device_id": self.childID,
+                                "request_data": requestData,
+                            }
+                        },
+                    }
+                ]
+            },
+        }
 
+    def _checkKLAPResponse(self, responseJSON):
         if self.isKLAP:
-            responseJSON = self.asyncHandler.executeAsyncExecutorJob(
-                self.transport.send, fullRequest
-            )
             if (
                 "result" in responseJSON
                 and "responses" in responseJSON["result"]
                 and len(responseJSON["result"]["responses"]) == 1
             ):
                 if not self.responseIsOK(responseJSON["result"]["responses"][0]):
-                    raise Exception(
-                        "Error: {}, Response: {}".format(
-                            self.getErrorMessage(responseJSON["error_code"]),
-                            json.dumps(responseJSON),
-                        )
-                    )
-        else:
-            responseJSON = self.asyncHandler.executeAsyncExecutorJob(
-                self.transport.send, fullRequest
-            )
-        if not self.responseIsOK(responseJSON):
-            #  -40401: Invalid Stok
-            if (
-                responseJSON
-                and "error_code" in responseJSON
-                and (
-                    responseJSON["error_code"] == -40401
-                    or responseJSON["error_code"] == -1
-                )
-            ) and loginRetryCount < MAX_LOGIN_RETRIES:
-                self.close()
-                return self.performRequest(requestData, loginRetryCount + 1)
-            else:
-                raise Exception(
-                    "Error: {}, Response: {}".format(
-                        self.getErrorMessage(responseJSON["error_code"]),
-                        json.dumps(responseJSON),
-                    )
-                )
+                    self._raiseResponseError(responseJSON)
 
+    def _unwrapResponse(self, responseJSON):
         # strip away child device stuff to ensure consistent response format for HUB cameras
         if self.childID:
             responses = []
@@ -289,12 +572,135 @@ class Tapo:
             if self.responseIsOK(responseJSON):
                 return responseJSON
             else:
-                raise Exception(
-                    "Error: {}, Response: {}".format(
-                        self.getErrorMessage(responseJSON["error_code"]),
-                        json.dumps(responseJSON),
-                    )
+                self._raiseResponseError(responseJSON)
+
+    # authentication and request in a single hop to the event loop
+    async def _sendAsync(self, transport, fullRequest):
+        await transport.authenticate()
+        return await transport.send(fullRequest)
+
+    def submit(self, method, *args, timeout=None, **kwargs):
+        """
+        Starts the method in the background and returns a concurrent future.
+
+        Methods with an async variant (executeFunction, performRequest and getMost)
+        run on the event loop without holding a thread. Any other method blocks one
+        thread of the shared submit executor while it runs, so at most
+        SUBMIT_MAX_WORKERS of those are in flight at once, the rest queue. The
+        deadline starts when the call is submitted.
+        """
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            asyncMethod = getattr(self, method + "Async", None)
+            if asyncMethod is not None and inspect.iscoroutinefunction(asyncMethod):
+                return runCoroutine(
+                    asyncMethod(*args, **kwargs), self.asyncHandler.getLoop()
                 )
+            func = getattr(self, method)
+
+            def call():
+                checkDeadline(method)
+                return func(*args, **kwargs)
+
+            context = contextvars.copy_context()
+            return getSubmitExecutor().submit(context.run, call)
+
+    # sent straight from the event loop, no thread is held while waiting
+    def submitRequest(self, requestData, timeout=None):
+        return self.submit("performRequest", requestData, timeout=timeout)
+
+    # sync calls made from the event loop run in the submit executor
+    async def _runSync(self, func, *args):
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(
+            getSubmitExecutor().submit(context.run, func, *args)
+        )
+
+    def _raiseResponseError(self, responseJSON):
+        raise ResponseException(
+            responseJSON["error_code"],
+            responseJSON,
+            "Error: {}, Response: {}".format(
+                self.getErrorMessage(responseJSON["error_code"]),
+                json.dumps(responseJSON),
+            ),
+        )
+
+    def getRetryStatistics(self):
+        return self.retryPolicy.getStatistics()
+
+    # handle for a child of this hub sharing its authenticated session
+    def getChild(self, childID, **kwargs):
+        kwargs.setdefault("streamPort", self.streamPort)
+        kwargs.setdefault("playerID", self.playerID)
+        return Tapo(
+            self.host,
+            self.user,
+            self.password,
+            self.cloudPassword,
+            self.superSecretKey,
+            childID=childID,
+            parent=self,
+            **kwargs,
+        )
+
+    # requests is a list of (child handle or childID, requestData)
+    def performChildRequests(self, requests, timeout=None):
+        if self.childID:
+            raise Exception("Child requests have to be sent through the hub.")
+        childRequests = [
+            {
+                "method": "controlChild",
+                "params": {
+                    "childControl": {
+                        "device_id": (
+                            child if isinstance(child, str) else child.childID
+                        ),
+                        "request_data": requestData,
+                    }
+                },
+            }
+            for child, requestData in requests
+        ]
+        with deadlineScope(self.timeout if timeout is None else timeout):
+            responseJSON = self._performRequest(
+                {"method": "multipleRequest", "params": {"requests": childRequests}}
+            )
+            responses = responseJSON["result"]["responses"]
+            if len(responses) == len(childRequests):
+                return [self._getChildResponse(response) for response in responses]
+            self.logger.debugLog(
+                f"Hub returned {len(responses)} responses for {len(childRequests)} "
+                "children, requesting them one by one."
+            )
+            results = []
+            for childRequest in childRequests:
+                try:
+                    responseJSON = self._performRequest(
+                        {
+                            "method": "multipleRequest",
+                            "params": {"requests": [childRequest]},
+                        }
+                    )
+                    results.append(
+                        self._getChildResponse(responseJSON["result"]["responses"][0])
+                    )
+                except Exception as err:
+                    results.append(err)
+            return results
+
+    def _getChildResponse(self, response):
+        if response.get("error_code", 0) != 0 or "result" not in response:
+            return ResponseException(
+                response.get("error_code"),
+                response,
+                "Error: {}, Response: {}".format(
+                    self.getErrorMessage(response.get("error_code")),
+                    json.dumps(response),
+                ),
+            )
+        if "response_data" in response["result"]:
+            return response["result"]["response_data"]
+        return response["result"]
 
     def getMediaSession(self, stream_type: StreamType = None, start_time=""):
         query_params = {}
@@ -337,6 +743,12 @@ class Tapo:
             {"childControl": {"start_index": 0}},
         )
 
+    def getAppComponentList(self):
+        return self.executeFunction(
+            "getAppComponentList",
+            {"app_component": {"name": "app_component_list"}},
+        )
+
     def getTimeCorrection(self):
         if self.timeCorrection is False:
             currentTime = self.getTime()
@@ -368,35 +780,70 @@ class Tapo:
         if endTime is False:
             endTime = nowTS + (-1 * timeCorrection) + 60
 
+        return [
+            self._correctEvent(event, timeCorrection, nowTS)
+            for event in self.searchDetectionList(startTime, endTime)
+        ]
+
+    # detection events fetched page by page, same times and defaults as getEvents
+    async def iterEvents(
+        self, startTime=False, endTime=False, pageSize=EVENT_PAGE_SIZE
+    ):
+        timeCorrection = await asyncio.wrap_future(self.submit("getTimeCorrection"))
+        if timeCorrection is False:
+            raise Exception("Failed to get correct camera time.")
+
+        nowTS = int(datetime.timestamp(datetime.now()))
+        if startTime is False:
+            startTime = nowTS + (-1 * timeCorrection) - (10 * 60)
+        if endTime is False:
+            endTime = nowTS + (-1 * timeCorrection) + 60
+
+        def fetch(startIndex, endIndex):
+            return self._fetchStreamed(
+                self.searchDetectionList, startTime, endTime, startIndex, endIndex
+            )
+
+        async for event in iterPages(fetch, pageSize):
+            yield self._correctEvent(event, timeCorrection, nowTS)
+
+    # elements are taken from the response while it is decrypted, so its decrypted
+    # text is never held in full
+    def _fetchStreamed(self, func, *args):
+        elements = []
+        with streamElements(lambda key, element: elements.append(element)):
+            found = func(*args)
+        return found or elements
+
+    def _correctEvent(self, event, timeCorrection, nowTS):
+        event["start_time"] = event["start_time"] + timeCorrection
+        event["end_time"] = event["end_time"] + timeCorrection
+        event["startRelative"] = nowTS - event["start_time"]
+        event["endRelative"] = nowTS - event["end_time"]
+        return event
+
+    # raw detection events in camera time, indexes are inclusive
+    def searchDetectionList(self, startTime, endTime, startIndex=0, endIndex=999):
         responseData = self.executeFunction(
             "searchDetectionList",
             {
                 "playback": {
                     "search_detection_list": {
-                        "start_index": 0,
+                        "start_index": startIndex,
                         "channel": 0,
                         "start_time": startTime,
                         "end_time": endTime,
-                        "end_index": 999,
+                        "end_index": endIndex,
                     }
                 }
             },
         )
-        events = []
-
-        detectionsReturned = (
+        if (
             "playback" in responseData
             and "search_detection_list" in responseData["playback"]
-        )
-
-        if detectionsReturned:
-            for event in responseData["playback"]["search_detection_list"]:
-                event["start_time"] = event["start_time"] + timeCorrection
-                event["end_time"] = event["end_time"] + timeCorrection
-                event["startRelative"] = nowTS - event["start_time"]
-                event["endRelative"] = nowTS - event["end_time"]
-                events.append(event)
-        return events
+        ):
+            return responseData["playback"]["search_detection_list"]
+        return []
 
     def getVideoQualities(self):
         return self.executeFunction(
@@ -1040,14 +1487,17 @@ class Tapo:
             }
         )
 
-    def getAudioConfig(self):
-        return self.executeFunction(
+    def getAudioConfig(self, cached=False):
+        if cached and self.capabilities.audioConfig is not None:
+            return self.capabilities.audioConfig
+        self.capabilities.audioConfig = self.executeFunction(
             "getAudioConfig",
             {
                 "method": "get",
                 "audio_config": {"name": ["speaker", "microphone", "record_audio"]},
             },
         )
+        return self.capabilities.audioConfig
 
     def setRecordAudio(self, enabled: bool):
         return self.executeFunction(
@@ -1385,6 +1835,12 @@ class Tapo:
             {"motor": {"movestep": {"direction": str(angle)}}},
         )
 
+    # Non-blocking, coalescing alternative to motor functions for interactive use
+    def getMotorQueue(self):
+        if self.motorQueue is None:
+            self.motorQueue = MotorQueue(self)
+        return self.motorQueue
+
     def moveMotorClockWise(self):
         return self.moveMotorStep(0)
 
@@ -1424,8 +1880,9 @@ class Tapo:
     def getUserID(self, forceReload=False, retry=False):
         if not self.userID or forceReload is True:
             try:
+                # busy user ID slots (-71101) are retried with backoff by executeFunction
                 response = self.userID = self.executeFunction(
-                    "getUserID", {"system": {"get_user_id": "null"}}
+                    "getUserID", {"system": {"get_user_id": "null"}}, retry=retry
                 )
                 if "user_id" in response:
                     self.userID = response["user_id"]
@@ -1438,14 +1895,41 @@ class Tapo:
                 self.logger.debugLog(
                     f"Encountered error when getting getting user ID: {err}"
                 )
-                # Happens for example when recording is being downloaded
-                if retry is False and (ERROR_CODES["-71101"] in str(err)):
-                    self.logger.debugLog("Retrying getting User ID...")
-                    return self.getUserID(True, True)
-                else:
-                    raise err
+                raise err
         return self.userID
 
+    # new user ID for userIDPool, a full device is reported without retrying
+    def requestUserID(self):
+        response = self.performRequest(
+            {
+                "method": "multipleRequest",
+                "params": {
+                    "requests": [
+                        {
+                            "method": "getUserID",
+                            "params": {"system": {"get_user_id": "null"}},
+                        }
+                    ]
+                },
+            }
+        )["result"]["responses"][0]
+        errorCode = response.get("error_code", 0)
+        if errorCode != 0 or "user_id" not in response.get("result", {}):
+            raise ResponseException(
+                errorCode,
+                response,
+                "Error: {}, Response: {}".format(
+                    self.getErrorMessage(errorCode), json.dumps(response)
+                ),
+            )
+        return response["result"]["user_id"]
+
+    def _shouldRenewUserID(self, err, retry):
+        errorCode = getattr(err, "errorCode", None)
+        if errorCode not in (-71103, -71105):
+            return False
+        return self.retryPolicy.decide(errorCode, 1 if retry else 0).retry
+
     def getRecordingsList(self, start_date="20000101", end_date=None):
         if end_date is None:
             end_date = datetime.today().strftime("%Y%m%d")
@@ -1465,19 +1949,28 @@ class Tapo:
             raise Exception("Video playback is not supported by this camera")
         return result["playback"]["search_results"]
 
+    # search with a user ID leased from userIDPool, an ID the device rejects is dropped
+    def _executeSearch(self, method, getParams):
+        with self.userIDPool.lease() as userIDLease:
+            try:
+                return self.executeFunction(method, getParams(userIDLease.userID))
+            except ResponseException as err:
+                userIDLease.expireOnError({"error_code": err.errorCode})
+                raise
+
     def getRecordingsUTC(
         self, start_time, end_time, start_index=0, end_index=999999999, retry=False
     ):
         try:
-            result = self.executeFunction(
+            result = self._executeSearch(
                 "searchVideoWithUTC",
-                {
+                lambda userID: {
                     "playback": {
                         "search_video_with_utc": {
                             "channel": 0,
                             "end_time": end_time,
                             "end_index": end_index,
-                            "id": self.getUserID(),
+                            "id": userID,
                             "start_index": start_index,
                             "start_time": start_time,
                         }
@@ -1493,14 +1986,11 @@ class Tapo:
             self.logger.debugLog(
                 f"Encountered error when getting recordings time {start_time} - {end_time}: {err}"
             )
-            # user ID expired, get a new one
-            if retry is False and (
-                ERROR_CODES["-71103"] in str(err) or ERROR_CODES["-71105"] in str(err)
-            ):
+            # user ID expired, the retry leases a new one
+            if self._shouldRenewUserID(err, retry):
                 self.logger.debugLog(
                     f"Retrying getting recordings for time {start_time} - {end_time}..."
                 )
-                self.getUserID(True)
                 return self.getRecordingsUTC(
                     start_time, end_time, start_index, end_index, True
                 )
@@ -1516,19 +2006,11 @@ class Tapo:
             )
             return self.getRecordingsUTC(start_time, end_time, start_index, end_index)
         try:
-            result = self.executeFunction(
+            result = self._executeSearch(
                 "searchVideoOfDay",
-                {
-                    "playback": {
-                        "search_video_utility": {
-                            "channel": 0,
-                            "date": date,
-                            "end_index": end_index,
-                            "id": self.getUserID(),
-                            "start_index": start_index,
-                        }
-                    }
-                },
+                lambda userID: self._getRecordingsSearch(
+                    date, userID, start_index, end_index
+                )["params"],
             )
             if "playback" not in result:
                 raise Exception("Video playback is not supported by this camera")
@@ -1537,16 +2019,179 @@ class Tapo:
             self.logger.debugLog(
                 f"Encountered error when getting recordings for date {date}: {err}"
             )
-            # user ID expired, get a new one
-            if retry is False and (
-                ERROR_CODES["-71103"] in str(err) or ERROR_CODES["-71105"] in str(err)
-            ):
+            # user ID expired, the retry leases a new one
+            if self._shouldRenewUserID(err, retry):
                 self.logger.debugLog(f"Retrying getting recordings for date {date}...")
-                self.getUserID(True)
                 return self.getRecordings(date, start_index, end_index, True)
             else:
                 raise err
 
+    def _getRecordingsSearch(self, date, userID, start_index=0, end_index=999999999):
+        if self.childID is not None:
+            date_object = datetime.strptime(date, "%Y%m%d")
+            return {
+                "method": "searchVideoWithUTC",
+                "params": {
+                    "playback": {
+                        "search_video_with_utc": {
+                            "channel": 0,
+                            "end_time": int(
+                                (
+                                    date_object
+                                    + timedelta(hours=23, minutes=59, seconds=59)
+                                ).timestamp()
+                            ),
+                            "end_index": end_index,
+                            "id": userID,
+                            "start_index": start_index,
+                            "start_time": int(date_object.timestamp()),
+                        }
+                    }
+                },
+            }
+        return {
+            "method": "searchVideoOfDay",
+            "params": {
+                "playback": {
+                    "search_video_utility": {
+                        "channel": 0,
+                        "date": date,
+                        "end_index": end_index,
+                        "id": userID,
+                        "start_index": start_index,
+                    }
+                }
+            },
+        }
+
+    def getRecordingDays(self, start_date="20000101", end_date=None):
+        days = set()
+        for result in self.getRecordingsList(start_date, end_date):
+            for value in result.values():
+                if isinstance(value, dict) and "date" in value:
+                    days.add(value["date"])
+        return sorted(days)
+
+    # recordings of all days with recordings in the range, ordered by start time
+    def getRecordingsRange(
+        self, start_date="20000101", end_date=None, batchSize=RECORDINGS_BATCH_SIZE
+    ):
+        recordings = []
+        days = self.getRecordingDays(start_date, end_date)
+        for dayRecordings in self.getRecordingsForDays(days, batchSize).values():
+            recordings.extend(dayRecordings)
+        return sorted(
+            recordings,
+            key=lambda recording: next(iter(recording.values()))["startTime"],
+        )
+
+    # searches of many days packed into multipleRequests, returns {day: recordings}
+    def getRecordingsForDays(self, days, batchSize=RECORDINGS_BATCH_SIZE):
+        days = list(days)
+        results = {}
+        for index in range(0, len(days), batchSize):
+            batch = days[index : index + batchSize]
+            results.update(zip(batch, self._getRecordingsBatch(batch)))
+        return results
+
+    def _getRecordingsBatch(self, days, retry=False):
+        # one leased user ID for all searches of the batch
+        with self.userIDPool.lease() as userIDLease:
+            requests = [
+                self._getRecordingsSearch(day, userIDLease.userID) for day in days
+            ]
+            responses = self._matchResponses(
+                requests,
+                self.executeFunction("multipleRequest", {"requests": requests}),
+            )
+            for response in responses or []:
+                userIDLease.expireOnError(response)
+        if responses is None:
+            self.logger.debugLog(
+                f"Camera responses do not match the searches of {len(days)} days, "
+                "searching them one by one."
+            )
+            return [self.getRecordings(day) for day in days]
+        results = []
+        renewUserID = False
+        for day, response in zip(days, responses):
+            errorCode = response.get("error_code", 0)
+            if errorCode != 0:
+                err = ResponseException(
+                    errorCode,
+                    response,
+                    "Error: {}, Response: {}".format(
+                        self.getErrorMessage(errorCode), json.dumps(response)
+                    ),
+                )
+                if self._shouldRenewUserID(err, retry):
+                    renewUserID = True
+                    results.append(None)
+                    continue
+                self.logger.debugLog(
+                    f"Encountered error when getting recordings for date {day}: {err}"
+                )
+                raise err
+            if "playback" not in response.get("result", {}):
+                raise Exception("Video playback is not supported by this camera")
+            results.append(response["result"]["playback"]["search_video_results"])
+        if renewUserID:
+            # user ID expired, the retry of the whole batch leases a new one
+            expired = [day for day, result in zip(days, results) if result is None]
+            self.logger.debugLog(f"Retrying getting recordings for dates {expired}...")
+            retried = iter(self._getRecordingsBatch(expired, True))
+            results = [
+                next(retried) if result is None else result for result in results
+            ]
+        return results
+
+    # responses of a multipleRequest in the order of its requests, matched on the
+    # echoed params when the device sends them back, None when they do not match
+    def _matchResponses(self, requests, responses):
+        if len(responses) != len(requests):
+            return None
+        if all("params" in response for response in responses):
+            keys = [
+                json.dumps([request["method"], request.get("params")], sort_keys=True)
+                for request in requests
+            ]
+            matched = {}
+            for response in responses:
+                key = json.dumps(
+                    [response.get("method"), response["params"]], sort_keys=True
+                )
+                if key not in keys or key in matched:
+                    return None
+                matched[key] = response
+            return [matched[key] for key in keys]
+        # nothing but the method to go by, position is trusted if all of them match
+        for request, response in zip(requests, responses):
+            if response.get("method", request["method"]) != request["method"]:
+                return None
+        return responses
+
+    # recordings of a day or of a UTC time range, fetched page by page
+    def iterRecordings(
+        self, date=None, startTime=None, endTime=None, pageSize=RECORDINGS_PAGE_SIZE
+    ):
+        if date is not None:
+
+            def fetch(startIndex, endIndex):
+                return self._fetchStreamed(
+                    self.getRecordings, date, startIndex, endIndex
+                )
+
+        elif startTime is not None and endTime is not None:
+
+            def fetch(startIndex, endIndex):
+                return self._fetchStreamed(
+                    self.getRecordingsUTC, startTime, endTime, startIndex, endIndex
+                )
+
+        else:
+            raise Exception("Either date or startTime and endTime are required.")
+        return iterPages(fetch, pageSize)
+
     # does not work for child devices, function discovery needed
     def getCommonImage(self):
         warn("Prefer to use a specific value getter", DeprecationWarning, stacklevel=2)
@@ -2460,6 +3105,103 @@ class Tapo:
     # Used for purposes of HomeAssistant-Tapo-Control
     # Uses method names from https://md.depau.eu/s/r1Ys_oWoP
     def getMost(self, omit_methods=[], chn_id: list = None):
+        requestData = self._getMostRequest(omit_methods, chn_id)
+        skipped = self._skipUnsupported(requestData)
+        results = self.performRequest(requestData)
+        if self._isMalformedMost(requestData, results, omit_methods):
+            return self.getMost(["getAudioConfig"], chn_id)
+        return self._processMostResponse(
+            requestData, results, omit_methods + skipped, chn_id
+        )
+
+    async def getMostAsync(self, omit_methods=[], chn_id: list = None):
+        requestData = self._getMostRequest(omit_methods, chn_id)
+        methods = [request["method"] for request in requestData["params"]["requests"]]
+        if self.capabilities.needsDiscovery(methods):
+            await self._runSync(self.getCapabilities)
+        skipped = self._skipUnsupported(requestData)
+        results = await self.performRequestAsync(requestData)
+        if self._isMalformedMost(requestData, results, omit_methods):
+            return await self.getMostAsync(["getAudioConfig"], chn_id)
+        return self._processMostResponse(
+            requestData, results, omit_methods + skipped, chn_id
+        )
+
+    # True when getMost should be asked again without getAudioConfig
+    def _isMalformedMost(self, requestData, results, omit_methods):
+        try:
+            responses_len = len(results.get("result", {}).get("responses", []))
+            requested_len = len(requestData["params"]["requests"])
+            self.logger.debugLog(
+                f"getMost: requested {requested_len} responses, received {responses_len}"
+            )
+        except Exception:
+            pass
+
+        # handle malformed / unexpected response from camera
+        if len(requestData["params"]["requests"]) != len(
+            results["result"]["responses"]
+        ):
+            if len(omit_methods) == 0:
+                # It was found in https://github.com/JurajNyiri/HomeAssistant-Tapo-Control/issues/455
+                # that on Tapo hubs with encryption enabled having getAudioConfig results in malformed
+                # response, where camera returns invalid json and incorrect number of responses (1)
+                # containing all the others. When getAudioConfig is not requested in this function
+                # it returns everything as expected.
+                return True
+            else:
+                raise Exception(f"Unexpected camera response: {results}")
+        return False
+
+    # unsupported methods are answered with False without asking
+    def _skipUnsupported(self, requestData):
+        requests = requestData["params"]["requests"]
+        self._discoverCapabilities([request["method"] for request in requests])
+        skipped = [
+            request["method"]
+            for request in requests
+            if not self.capabilities.isSupported(request["method"])
+        ]
+        if skipped:
+            requestData["params"]["requests"] = [
+                request for request in requests if request["method"] not in skipped
+            ]
+        return skipped
+
+    # typed lazy view over getMost, see views.py
+    def getMostView(self, omit_methods=[], chn_id: list = None):
+        return MostView(self.getMost(omit_methods, chn_id))
+
+    # getMost of several children of this hub in a single round trip
+    def getMostForChildren(self, children, omit_methods=[]):
+        requests = [
+            (child, child._getMostRequest(omit_methods, None)) for child in children
+        ]
+        skipped = [
+            child._skipUnsupported(requestData) for child, requestData in requests
+        ]
+        responses = self.performChildRequests(requests)
+        returnData = {}
+        for (child, requestData), childSkipped, results in zip(
+            requests, skipped, responses
+        ):
+            try:
+                if isinstance(results, Exception):
+                    raise results
+                if "result" not in results or len(
+                    requestData["params"]["requests"]
+                ) != len(results["result"]["responses"]):
+                    # malformed response, let the child retry on its own
+                    returnData[child.childID] = child.getMost(omit_methods)
+                else:
+                    returnData[child.childID] = child._processMostResponse(
+                        requestData, results, omit_methods + childSkipped, None
+                    )
+            except Exception as err:
+                returnData[child.childID] = err
+        return returnData
+
+    def _getMostRequest(self, omit_methods, chn_id):
         if self.deviceType == "SMART.TAPOCHIME":
             requestData = {
                 "method": "multipleRequest",
@@ -2871,31 +3613,9 @@ class Tapo:
                 if request.get("method") not in omit_methods
             ]
             requestData["params"]["requests"] = filtered_requests
+        return requestData
 
-        results = self.performRequest(requestData)
-        try:
-            responses_len = len(results.get("result", {}).get("responses", []))
-            requested_len = len(requestData["params"]["requests"])
-            self.logger.debugLog(
-                f"getMost: requested {requested_len} responses, received {responses_len}"
-            )
-        except Exception:
-            pass
-
-        # handle malformed / unexpected response from camera
-        if len(requestData["params"]["requests"]) != len(
-            results["result"]["responses"]
-        ):
-            if len(omit_methods) == 0:
-                # It was found in https://github.com/JurajNyiri/HomeAssistant-Tapo-Control/issues/455
-                # that on Tapo hubs with encryption enabled having getAudioConfig results in malformed
-                # response, where camera returns invalid json and incorrect number of responses (1)
-                # containing all the others. When getAudioConfig is not requested in this function
-                # it returns everything as expected.
-                return self.getMost(["getAudioConfig"], chn_id)
-            else:
-                raise Exception(f"Unexpected camera response: {results}")
-
+    def _processMostResponse(self, requestData, results, omit_methods, chn_id):
         returnData = {}
 
         # pre-allocate responses due to some devices not returning methods back
@@ -2929,6 +3649,8 @@ class Tapo:
                     raise Exception(
                         f"Method {result['method']} has been returned more times than expected. Response: {results}"
                     )
+            elif "method" in result:
+                self.capabilities.onResponse(result["method"], result.get("error_code"))
 
         if chn_id:
             method_normalization = {
@@ -2997,4 +3719,8 @@ class Tapo:
         if "get_pair_list" in returnData:
             self.pairList = returnData["get_pair_list"][0]
 
+        audioConfig = returnData.get("getAudioConfig", [False])[0]
+        if audioConfig is not False:
+            self.capabilities.audioConfig = audioConfig
+
         return returnData
@@ -1,25 +1,75 @@
 import asyncio
+import contextvars
 import threading
+from concurrent.futures import Future
+
+_sharedLoop = None
+_sharedThread = None
+_sharedLock = threading.Lock()
+
+
+# one loop in a background thread for all sync Tapo instances of the process,
+# kasa aiohttp sessions stay alive on it between calls
+def getSharedLoop():
+    global _sharedLoop, _sharedThread
+    with _sharedLock:
+        if _sharedLoop is None or _sharedLoop.is_closed():
+            _sharedLoop = asyncio.new_event_loop()
+            _sharedThread = threading.Thread(
+                target=_sharedLoop.run_forever, name="pytapo-loop", daemon=True
+            )
+            _sharedThread.start()
+        return _sharedLoop
+
+
+def runCoroutine(coroutine, loop):
+    future = Future()
+
+    def schedule():
+        if not future.set_running_or_notify_cancel():
+            coroutine.close()
+            return
+        try:
+            # task copies the context of the caller, deadlines cross the thread
+            task = context.run(loop.create_task, coroutine)
+        except BaseException as err:
+            future.set_exception(err)
+            raise
+        task.add_done_callback(done)
+
+    def done(task):
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    context = contextvars.copy_context()
+    loop.call_soon_threadsafe(schedule)
+    return future
 
 
 class AsyncHandler:
     def __init__(self, hass):
         self.hass = hass
-        self._loop = None
-        self._lock = threading.RLock()
-        pass
 
-    def executeAsyncExecutorJob(self, job, *args):
+    def getLoop(self):
         if self.hass is None:
-            # reuse a dedicated loop so kasa aiohttp sessions stay alive between calls
-            # ensure single-threaded access to the loop to avoid "event loop already running"
-            with self._lock:
-                if self._loop is None or self._loop.is_closed():
-                    self._loop = asyncio.new_event_loop()
-                try:
-                    asyncio.set_event_loop(self._loop)
-                    return self._loop.run_until_complete(job(*args))
-                finally:
-                    asyncio.set_event_loop(None)
-        else:
-            return asyncio.run_coroutine_threadsafe(job(*args), self.hass.loop).result()
+            return getSharedLoop()
+        return self.hass.loop
+
+    def executeAsyncExecutorJob(self, job, *args):
+        loop = self.getLoop()
+        if _isLoopThread(loop):
+            raise Exception(
+                "Sync pytapo calls cannot be made from its event loop thread."
+            )
+        return runCoroutine(job(*args), loop).result()
+
+
+def _isLoopThread(loop):
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
@@ -0,0 +1,157 @@
+import json
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .const import ERROR_CODES, UNSUPPORTED_ERROR_CODES, COMPONENT_METHODS
+from .error import ResponseException
+
+_GATED_METHODS = {
+    method for methods in COMPONENT_METHODS.values() for method in methods
+}
+# set while gated calls are made without discovering capabilities first
+_discoveryDeferred = ContextVar("pytapo_discovery_deferred", default=False)
+
+
+@contextmanager
+def deferDiscovery():
+    token = _discoveryDeferred.set(True)
+    try:
+        yield
+    finally:
+        _discoveryDeferred.reset(token)
+
+
+class Capabilities:
+    """
+    What a device supports, kept with its profile.
+
+    discover reads getModuleSpec, getVideoCapability, getAudioSpec and the
+    component lists of the device or of the hub it is a child of. Methods of
+    COMPONENT_METHODS are switched off when module_spec reports their component as
+    "0", methods the device rejected with one of UNSUPPORTED_ERROR_CODES are
+    remembered. Calls to either fail locally without a request. Components missing
+    from the lists switch nothing off, the request is sent and its answer decides.
+    """
+
+    def __init__(self, data=None):
+        data = data or {}
+        self.discovered = data.get("discovered", False)
+        self.moduleSpec = data.get("moduleSpec", {})
+        self.videoCapability = data.get("videoCapability", {})
+        self.audioSpec = data.get("audioSpec", {})
+        self.components = data.get("components", {})
+        self.childComponents = data.get("childComponents", {})
+        self.unsupported = dict(data.get("unsupported", {}))
+        # not part of the profile, settings can change
+        self.audioConfig = None
+        self._updateMissing()
+
+    def toDict(self):
+        return {
+            "discovered": self.discovered,
+            "moduleSpec": self.moduleSpec,
+            "videoCapability": self.videoCapability,
+            "audioSpec": self.audioSpec,
+            "components": self.components,
+            "childComponents": self.childComponents,
+            "unsupported": dict(self.unsupported),
+        }
+
+    def discover(self, tapo):
+        self.moduleSpec = _getPath(
+            _tryCall(tapo.getModuleSpec), "function", "module_spec"
+        )
+        self.videoCapability = _getPath(
+            _tryCall(tapo.getVideoCapability), "video_capability"
+        )
+        self.audioSpec = _getPath(_tryCall(tapo.getAudioSpec), "audio_capability")
+        if tapo.childID is not None and tapo.parent is not None:
+            hubComponents = _getChildComponents(
+                _tryCall(tapo.parent.getChildDeviceComponentList)
+            )
+            self.components = hubComponents.get(tapo.childID, {})
+        else:
+            self.components = _getAppComponents(_tryCall(tapo.getAppComponentList))
+        if tapo.childID is None:
+            self.childComponents = _getChildComponents(
+                _tryCall(tapo.getChildDeviceComponentList)
+            )
+        self.discovered = True
+        self._updateMissing()
+
+    # only an explicit "0" counts, unknown names must not switch off a feature
+    def _updateMissing(self):
+        self.missing = set()
+        for component, methods in COMPONENT_METHODS.items():
+            if str(self.moduleSpec.get(component)) == "0":
+                self.missing.update(methods)
+
+    def needsDiscovery(self, methods):
+        return (
+            not self.discovered
+            and not _discoveryDeferred.get()
+            and any(method in _GATED_METHODS for method in methods)
+        )
+
+    def isSupported(self, method):
+        return method not in self.unsupported and method not in self.missing
+
+    def hasComponent(self, component, childID=None):
+        if childID is not None:
+            return component in self.childComponents.get(childID, {})
+        return component in self.components
+
+    def markUnsupported(self, method, errorCode):
+        self.unsupported[method] = errorCode
+
+    def check(self, method):
+        if not self.isSupported(method):
+            errorCode = self.unsupported.get(method, -40106)
+            raise ResponseException(
+                errorCode,
+                None,
+                "Error: {}, Method {} is not supported by this device.".format(
+                    ERROR_CODES.get(str(errorCode), "UNSUPPORTED_METHOD"), method
+                ),
+            )
+
+    def onResponse(self, method, errorCode):
+        if method != "multipleRequest" and errorCode in UNSUPPORTED_ERROR_CODES:
+            self.markUnsupported(method, errorCode)
+
+    def __repr__(self):
+        return f"Capabilities({json.dumps(self.toDict())})"
+
+
+def _tryCall(func):
+    try:
+        return func()
+    except Exception:
+        return {}
+
+
+def _getPath(data, *path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return {}
+        data = data[key]
+    return data
+
+
+def _getAppComponents(data):
+    return {
+        component["name"]: component.get("version")
+        for component in _getPath(data, "app_component").get("app_component_list", [])
+        if "name" in component
+    }
+
+
+def _getChildComponents(data):
+    children = {}
+    for child in data.get("child_component_list", []):
+        children[child.get("device_id")] = {
+            component["id"]: component.get("ver_code")
+            for component in child.get("component_list", [])
+            if "id" in component
+        }
+    return children
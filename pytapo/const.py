@@ -130,7 +130,80 @@ ERROR_CODES = {
     "-2099": "UNKNOWN_ERROR",
 }
 MAX_LOGIN_RETRIES = 1
+RETRY_MAX_DELAY_SECONDS = 30
+RETRY_JITTER = 0.2
+# server requested delays longer than this are not waited for
+RETRY_MAX_SERVER_DELAY_SECONDS = 10
 CONNECTION_TIMEOUT = 10
+MOTOR_MIN_INTERVAL_SECONDS = 0.3
+MOTOR_MAX_INTERVAL_SECONDS = 2
+MOTOR_BUSY_RETRIES = 5
+FLEET_CONCURRENCY = 16
+# hubs answer for all their children and easily get overloaded
+FLEET_HUB_CONCURRENCY = 2
+FLEET_LOGIN_STAGGER_SECONDS = 0.1
+FLEET_LOGIN_JITTER = 0.5
+FLEET_RECONNECT_SECONDS = 60
+# virtual nodes per worker on the consistent hash ring
+FLEET_HASH_REPLICAS = 64
+# camera ownership lease between collector nodes, renewed every third of it
+LEASE_TTL_SECONDS = 30
+# threads running sync methods passed to Tapo.submit, shared by all instances
+SUBMIT_MAX_WORKERS = 32
+# detection event feed, pages of search_detection_list and how often to poll
+EVENT_PAGE_SIZE = 1000
+EVENT_MAX_PAGES = 100
+EVENT_POLL_SECONDS = 10
+EVENT_LOOKBACK_SECONDS = 600
+# out of order events kept in a sorted run of EventStore before it is merged
+EVENT_STORE_RUN_SIZE = 1024
+# most recent days with recordings are searched again on every sync, they may still grow
+RECORDINGS_RECHECK_DAYS = 2
+# entries per page requested by iterRecordings
+RECORDINGS_PAGE_SIZE = 500
+# days searched in one multipleRequest by getRecordingsRange
+RECORDINGS_BATCH_SIZE = 10
+# user IDs leased to concurrent playback sessions of one device
+USER_ID_POOL_SIZE = 4
+# after the device reported it is full, a bigger pool is tried again after this
+USER_ID_POOL_PROBE_SECONDS = 300
+USER_ID_FULL_ERROR_CODES = {
+    -71101,  # USER_ID_FULL
+    -71102,  # USER_ID_EMPLOYED
+}
+# leased user IDs rejected with these are dropped from the pool
+USER_ID_EXPIRED_ERROR_CODES = {
+    -71103,  # USER_ID_INVALID
+    -71105,  # PLAYBACK_SEARCH_FAILED
+}
+# methods failing with these are remembered as unsupported by the device
+UNSUPPORTED_ERROR_CODES = {
+    -40105,  # Method does not exist
+    -40106,  # UNSUPPORTED_METHOD
+}
+# methods switched off when the module_spec entry of the component is "0"
+COMPONENT_METHODS = {
+    "ptz": [
+        "getPresetConfig",
+        "addMotorPostion",
+        "deletePreset",
+        "motorMoveToPreset",
+        "motorMove",
+    ],
+    "personDetection": ["getPersonDetectionConfig", "setPersonDetectionConfig"],
+    "vehicleDetection": ["getVehicleDetectionConfig", "setVehicleDetectionConfig"],
+    "petDetection": ["getPetDetectionConfig", "setPetDetectionConfig"],
+    "barkDetection": ["getBarkDetectionConfig", "setBarkDetectionConfig"],
+    "meowDetection": ["getMeowDetectionConfig", "setMeowDetectionConfig"],
+    "glassDetection": ["getGlassDetectionConfig", "setGlassDetectionConfig"],
+    "tamperDetection": ["getTamperDetectionConfig", "setTamperDetectionConfig"],
+    "linecrossingDetection": [
+        "getLinecrossingDetectionConfig",
+        "setLinecrossingDetectionConfig",
+    ],
+    "packageDetection": ["getPackageDetectionConfig", "setPackageDetectionConfig"],
+    "targetTrack": ["getTargetTrackConfig", "setTargetTrackConfig"],
+}
 
 
 class EncryptionMethod:
@@ -0,0 +1,139 @@
+import asyncio
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .error import TapoTimeoutException
+
+_currentDeadline = ContextVar("pytapo_deadline", default=None)
+# deadline already enforced by an outer waitFor, nested calls must stay in the same task
+_enforcedDeadline = ContextVar("pytapo_enforced_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self.expiresAt = time.monotonic() + timeout
+
+    def remaining(self):
+        return max(0, self.expiresAt - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, operation=None):
+        if self.expired():
+            raise TapoTimeoutException(self.timeout, operation)
+
+    def clamp(self, timeout, operation=None):
+        self.check(operation)
+        if timeout is None:
+            return self.remaining()
+        return min(timeout, self.remaining())
+
+
+def getDeadline():
+    return _currentDeadline.get()
+
+
+@contextmanager
+def deadlineScope(timeout):
+    current = _currentDeadline.get()
+    if timeout is None or (current is not None and current.remaining() <= timeout):
+        # an outer, tighter deadline keeps applying
+        yield current
+        return
+    deadline = Deadline(timeout)
+    token = _currentDeadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _currentDeadline.reset(token)
+
+
+# public methods of cls open the deadline of the instance once, so every call they
+# make shares it, methods taking a timeout open their own
+def deadlineMethods(cls):
+    for name, func in list(vars(cls).items()):
+        if (
+            name.startswith("_")
+            or not inspect.isfunction(func)
+            or inspect.isgeneratorfunction(func)
+            or inspect.isasyncgenfunction(func)
+            or "timeout" in inspect.signature(func).parameters
+        ):
+            continue
+        setattr(cls, name, _withDeadline(func))
+    return cls
+
+
+def _withDeadline(func):
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            with deadlineScope(getattr(self, "timeout", None)):
+                return await func(self, *args, **kwargs)
+
+    else:
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with deadlineScope(getattr(self, "timeout", None)):
+                return func(self, *args, **kwargs)
+
+    return wrapper
+
+
+def checkDeadline(operation=None):
+    deadline = _currentDeadline.get()
+    if deadline is not None:
+        deadline.check(operation)
+
+
+def clampTimeout(timeout, operation=None):
+    deadline = _currentDeadline.get()
+    if deadline is None:
+        return timeout
+    return deadline.clamp(timeout, operation)
+
+
+# sleeping past the deadline is pointless, fail right away instead
+def _checkSleep(seconds, operation):
+    deadline = _currentDeadline.get()
+    if deadline is not None and seconds >= deadline.remaining():
+        raise TapoTimeoutException(deadline.timeout, operation)
+
+
+def sleep(seconds, operation=None):
+    _checkSleep(seconds, operation)
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+async def asyncSleep(seconds, operation=None):
+    _checkSleep(seconds, operation)
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+async def waitFor(coroutine, operation=None):
+    deadline = _currentDeadline.get()
+    if deadline is None or _enforcedDeadline.get() is deadline:
+        return await coroutine
+    try:
+        remaining = deadline.clamp(None, operation)
+    except TapoTimeoutException:
+        coroutine.close()
+        raise
+    token = _enforcedDeadline.set(deadline)
+    try:
+        return await asyncio.wait_for(coroutine, remaining)
+    except asyncio.TimeoutError as err:
+        if isinstance(err, TapoTimeoutException) or not deadline.expired():
+            raise
+        raise TapoTimeoutException(deadline.timeout, operation) from err
+    finally:
+        _enforcedDeadline.reset(token)
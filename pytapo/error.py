@@ -0,0 +1,44 @@
+class TemporarySuspensionException(Exception):
+    def __init__(self, secondsLeft=None, message=None) -> None:
+        self.secondsLeft = secondsLeft
+        if message is None:
+            message = f"Temporary Suspension: Try again in {secondsLeft} seconds"
+        super().__init__(message)
+
+    def __reduce__(self):
+        return (self.__class__, (self.secondsLeft, str(self)))
+
+
+class CircuitOpenException(Exception):
+    def __init__(self, host: str, secondsLeft: int) -> None:
+        self.host = host
+        self.secondsLeft = secondsLeft
+        super().__init__(
+            f"Device {host} is unreachable, not retrying for {secondsLeft} seconds"
+        )
+
+    def __reduce__(self):
+        return (self.__class__, (self.host, self.secondsLeft))
+
+
+class ResponseException(Exception):
+    def __init__(self, errorCode, response, message: str) -> None:
+        self.errorCode = errorCode
+        self.response = response
+        super().__init__(message)
+
+    def __reduce__(self):
+        return (self.__class__, (self.errorCode, self.response, str(self)))
+
+
+class TapoTimeoutException(TimeoutError):
+    def __init__(self, timeout, operation=None) -> None:
+        self.timeout = timeout
+        self.operation = operation
+        message = f"Deadline of {timeout} seconds exceeded"
+        if operation:
+            message += f" during {operation}"
+        super().__init__(message)
+
+    def __reduce__(self):
+        return (self.__class__, (self.timeout, self.operation))
@@ -0,0 +1,209 @@
+import json
+
+from ..error import ResponseException
+
+
+class DesiredSetting:
+    """
+    A section of the device configuration read and written as a whole.
+
+    The value lives at path inside the result of getMethod and is written back by
+    setMethod with only the fields that differ.
+    """
+
+    def __init__(self, getMethod, setMethod, path, getParams=None):
+        self.getMethod = getMethod
+        self.setMethod = setMethod
+        self.path = path
+        if getParams is None:
+            getParams = {path[0]: {"name": [path[1]]}}
+        self.getParams = getParams
+
+    def getRequest(self):
+        return {"method": self.getMethod, "params": self.getParams}
+
+    def readValue(self, result):
+        for key in self.path:
+            result = result[key]
+        return result
+
+    def setRequest(self, fields):
+        params = {
+            field: ("on" if value else "off") if isinstance(value, bool) else value
+            for field, value in fields.items()
+        }
+        for key in reversed(self.path):
+            params = {key: params}
+        return {"method": self.setMethod, "params": params}
+
+
+SETTINGS = {
+    "led": DesiredSetting("getLedStatus", "setLedStatus", ("led", "config")),
+    "privacyMode": DesiredSetting(
+        "getLensMaskConfig", "setLensMaskConfig", ("lens_mask", "lens_mask_info")
+    ),
+    "timezone": DesiredSetting("getTimezone", "setTimezone", ("system", "basic")),
+    "recordPlan": DesiredSetting(
+        "getRecordPlan", "setRecordPlan", ("record_plan", "chn1_channel")
+    ),
+    "motionDetection": DesiredSetting(
+        "getDetectionConfig", "setDetectionConfig", ("motion_detection", "motion_det")
+    ),
+    "personDetection": DesiredSetting(
+        "getPersonDetectionConfig",
+        "setPersonDetectionConfig",
+        ("people_detection", "detection"),
+    ),
+    "vehicleDetection": DesiredSetting(
+        "getVehicleDetectionConfig",
+        "setVehicleDetectionConfig",
+        ("vehicle_detection", "detection"),
+    ),
+    "tamperDetection": DesiredSetting(
+        "getTamperDetectionConfig",
+        "setTamperDetectionConfig",
+        ("tamper_detection", "tamper_det"),
+    ),
+    "nightVision": DesiredSetting(
+        "getNightVisionModeConfig", "setNightVisionModeConfig", ("image", "switch")
+    ),
+    "msgPush": DesiredSetting(
+        "getMsgPushConfig", "setMsgPushConfig", ("msg_push", "chn1_msg_push_info")
+    ),
+}
+
+
+def _normalizeValue(value):
+    # devices report everything as strings
+    if isinstance(value, bool):
+        return "on" if value else "off"
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(",", ":"))
+    return str(value)
+
+
+def diffSettings(current, desired):
+    return {
+        field: value
+        for field, value in desired.items()
+        if field not in current
+        or _normalizeValue(current[field]) != _normalizeValue(value)
+    }
+
+
+class DesiredState:
+    """
+    Declarative configuration of a TapoFleet.
+
+    Targets are set per device or for a group of devices. apply reads every
+    configured setting of a device in one batched request, diffs it against the
+    target and writes only what differs in a second batched request, so applying
+    an unchanged configuration costs a single read per device.
+    """
+
+    def __init__(self, fleet, settings=SETTINGS):
+        self.fleet = fleet
+        self.settings = settings
+        self.targets = {}
+
+    def setTarget(self, names, config):
+        if isinstance(names, str):
+            names = [names]
+        for setting in config:
+            if setting not in self.settings:
+                raise Exception(f"Unknown setting {setting}.")
+        for name in names:
+            target = self.targets.setdefault(name, {})
+            for setting, fields in config.items():
+                target.setdefault(setting, {}).update(fields)
+
+    def removeTarget(self, name):
+        self.targets.pop(name, None)
+
+    def plan(self, names=None):
+        return self._run(names, False)
+
+    def apply(self, names=None):
+        return self._run(names, True)
+
+    def _run(self, names, write):
+        if names is None:
+            names = [name for name in self.targets if name in self.fleet.devices]
+        funcs = {
+            name: self._getApplyFunc(self.targets.get(name, {}), write)
+            for name in names
+        }
+        return self.fleet.poll(funcs, names)
+
+    def _getApplyFunc(self, target, write):
+        def run(tapo):
+            return self._applyDevice(tapo, target, write)
+
+        return run
+
+    def _send(self, tapo, requests):
+        responses = tapo.executeFunction("multipleRequest", {"requests": requests})
+        # hubs do not keep the order of requests, match responses by method
+        byMethod = {}
+        for response in responses:
+            byMethod.setdefault(response.get("method"), []).append(response)
+        results = []
+        for request in requests:
+            if not byMethod.get(request["method"]):
+                results.append(Exception(f"No response for {request['method']}."))
+                continue
+            response = byMethod[request["method"]].pop(0)
+            if response.get("error_code", 0) != 0:
+                results.append(
+                    ResponseException(
+                        response.get("error_code"),
+                        response,
+                        "Error: {}, Response: {}".format(
+                            tapo.getErrorMessage(response.get("error_code")),
+                            json.dumps(response),
+                        ),
+                    )
+                )
+            else:
+                results.append(response.get("result", {}))
+        return results
+
+    def _applyDevice(self, tapo, target, write):
+        result = {"changes": {}, "errors": {}, "applied": []}
+        if not target:
+            return result
+        settings = list(target)
+        responses = self._send(
+            tapo, [self.settings[setting].getRequest() for setting in settings]
+        )
+        for setting, response in zip(settings, responses):
+            if isinstance(response, Exception):
+                result["errors"][setting] = response
+                continue
+            try:
+                current = self.settings[setting].readValue(response)
+            except (KeyError, IndexError, TypeError):
+                result["errors"][setting] = Exception(
+                    f"Unexpected response for {setting}: {response}"
+                )
+                continue
+            changes = diffSettings(current, target[setting])
+            if changes:
+                result["changes"][setting] = changes
+        if not write or not result["changes"]:
+            return result
+
+        settings = list(result["changes"])
+        responses = self._send(
+            tapo,
+            [
+                self.settings[setting].setRequest(result["changes"][setting])
+                for setting in settings
+            ],
+        )
+        for setting, response in zip(settings, responses):
+            if isinstance(response, Exception):
+                result["errors"][setting] = response
+            else:
+                result["applied"].append(setting)
+        return result
@@ -0,0 +1,384 @@
+import asyncio
+import contextvars
+import inspect
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import Tapo
+from ..asyncHandler import AsyncHandler, _isLoopThread
+from ..const import (
+    FLEET_CONCURRENCY,
+    FLEET_HUB_CONCURRENCY,
+    FLEET_LOGIN_STAGGER_SECONDS,
+    FLEET_LOGIN_JITTER,
+    FLEET_RECONNECT_SECONDS,
+)
+from ..logger import Logger
+
+
+class FleetDevice:
+    PENDING = "pending"
+    CONNECTING = "connecting"
+    ONLINE = "online"
+    FAILED = "failed"
+    STOPPED = "stopped"
+
+    def __init__(self, name, host, user, password, hub, kwargs):
+        self.name = name
+        self.host = host
+        self.user = user
+        self.password = password
+        self.hub = hub
+        self.kwargs = kwargs
+        self.tapo = None
+        self.profile = None
+        self.state = self.PENDING
+        self.lastError = None
+        self.lastSuccess = None
+        self.failures = 0
+        self.polls = 0
+        self.nextConnect = 0
+
+    def getHealth(self):
+        return {
+            "state": self.state,
+            "hub": self.hub,
+            "lastError": None if self.lastError is None else str(self.lastError),
+            "lastSuccess": self.lastSuccess,
+            "failures": self.failures,
+            "polls": self.polls,
+            "profile": self.profile,
+        }
+
+
+class TapoFleet:
+    """
+    Owns many Tapo devices and talks to them from the pytapo event loop.
+
+    Logins on start are staggered and jittered, every call to a device is bounded by
+    a global concurrency limit and, for children of a hub, by a per hub limit.
+    Polls with coroutine functions or methods of Tapo with an async variant are
+    awaited on the loop. Logins and other blocking calls run in an executor of the
+    fleet sized to the global limit. Every start and poll counts its own progress.
+    """
+
+    def __init__(
+        self,
+        concurrency=FLEET_CONCURRENCY,
+        hubConcurrency=FLEET_HUB_CONCURRENCY,
+        loginStagger=FLEET_LOGIN_STAGGER_SECONDS,
+        loginJitter=FLEET_LOGIN_JITTER,
+        reconnectInterval=FLEET_RECONNECT_SECONDS,
+        loop=None,
+        hass=None,
+        printDebugInformation=False,
+        printWarnInformation=True,
+        tapoFactory=Tapo,
+    ):
+        self.concurrency = concurrency
+        self.hubConcurrency = hubConcurrency
+        self.loginStagger = loginStagger
+        self.loginJitter = loginJitter
+        self.reconnectInterval = reconnectInterval
+        self.tapoFactory = tapoFactory
+        self.logger = Logger(printDebugInformation, printWarnInformation)
+        self.devices = {}
+        # progress of the operation started last, all running ones are in _operations
+        self.progress = {"operation": None, "total": 0, "done": 0, "failed": 0}
+        self.asyncHandler = AsyncHandler(hass)
+        self._loop = loop
+        self._executor = None
+        self._operations = []
+        self._semaphore = None
+        self._hubSemaphores = {}
+        self._lock = threading.Lock()
+
+    def addDevice(self, name, host, user, password, hub=None, **kwargs):
+        with self._lock:
+            if name in self.devices:
+                raise Exception(f"Device {name} is already part of the fleet.")
+            if hub is None and kwargs.get("childID") is not None:
+                hub = host
+            self.devices[name] = FleetDevice(name, host, user, password, hub, kwargs)
+        return self.devices[name]
+
+    def removeDevice(self, name):
+        self.stopDevice(name)
+        with self._lock:
+            del self.devices[name]
+
+    def getDevice(self, name):
+        device = self.devices[name]
+        if device.tapo is None:
+            raise Exception(f"Device {name} is not connected.")
+        return device.tapo
+
+    # sync interface, runs on the event loop
+
+    def start(self, names=None):
+        return self._run(self.startAsync(names))
+
+    def poll(self, func, names=None):
+        return self._run(self.pollAsync(func, names))
+
+    def startDevice(self, name):
+        return self._run(self.startDeviceAsync(name))
+
+    def getRecordingsRange(self, start_date="20000101", end_date=None, names=None):
+        return self._run(self.getRecordingsRangeAsync(start_date, end_date, names))
+
+    # runs a coroutine of the async interface on the event loop without waiting
+    def schedule(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._getLoop())
+
+    def stopDevice(self, name):
+        device = self.devices[name]
+        device.state = FleetDevice.STOPPED
+        tapo = device.tapo
+        device.tapo = None
+        if tapo is not None:
+            self._closeTapo(name, tapo)
+
+    def close(self):
+        for name in list(self.devices):
+            self.stopDevice(name)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    # async interface
+
+    async def startAsync(self, names=None):
+        devices = self._getDevices(names)
+        progress = self._startProgress("login", len(devices))
+        offsets = self._getLoginOffsets(len(devices))
+        try:
+            await asyncio.gather(
+                *(
+                    self._connect(device, offset, progress)
+                    for device, offset in zip(devices, offsets)
+                )
+            )
+        finally:
+            self._operations.remove(progress)
+        return {**self.getHealth(), "progress": dict(progress)}
+
+    async def startDeviceAsync(self, name):
+        device = self.devices[name]
+        device.state = FleetDevice.PENDING
+        device.nextConnect = 0
+        return await self._connect(device)
+
+    async def pollAsync(self, func, names=None):
+        devices = [
+            device
+            for device in self._getDevices(names)
+            if device.state != FleetDevice.STOPPED
+        ]
+        progress = self._startProgress("poll", len(devices))
+        now = time.monotonic()
+        # failed devices reconnect during polls, spread out like on start
+        reconnecting = [
+            device
+            for device in devices
+            if device.tapo is None and device.nextConnect <= now
+        ]
+        offsets = dict(
+            zip(
+                (device.name for device in reconnecting),
+                self._getLoginOffsets(len(reconnecting)),
+            )
+        )
+        # func is called with the Tapo of every device or is the name of a Tapo
+        # method, it can also be a dict of those per device name
+        try:
+            results = await asyncio.gather(
+                *(
+                    self._poll(
+                        device,
+                        func[device.name] if isinstance(func, dict) else func,
+                        progress,
+                        offsets.get(device.name),
+                    )
+                    for device in devices
+                )
+            )
+        finally:
+            self._operations.remove(progress)
+        return dict(zip((device.name for device in devices), results))
+
+    # batched recordings searches of every device, within the fleet limits
+    async def getRecordingsRangeAsync(
+        self, start_date="20000101", end_date=None, names=None
+    ):
+        return await self.pollAsync(
+            lambda tapo: tapo.getRecordingsRange(start_date, end_date), names
+        )
+
+    def getHealth(self):
+        devices = list(self.devices.values())
+        states = {}
+        for device in devices:
+            states[device.state] = states.get(device.state, 0) + 1
+        return {
+            "total": len(devices),
+            "states": states,
+            "progress": dict(self.progress),
+            "devices": {device.name: device.getHealth() for device in devices},
+        }
+
+    def getProgress(self):
+        return dict(self.progress)
+
+    # progress of every start and poll still running
+    def getOperations(self):
+        return [dict(progress) for progress in self._operations]
+
+    def _getDevices(self, names):
+        with self._lock:
+            if names is None:
+                return list(self.devices.values())
+            return [self.devices[name] for name in names]
+
+    def _getLoginOffsets(self, count):
+        return [
+            max(0, index + random.uniform(-self.loginJitter, self.loginJitter))
+            * self.loginStagger
+            for index in range(count)
+        ]
+
+    def _startProgress(self, operation, total):
+        progress = {"operation": operation, "total": total, "done": 0, "failed": 0}
+        self._operations.append(progress)
+        self.progress = progress
+        return progress
+
+    def _finishProgress(self, progress, failed):
+        if progress is None:
+            return
+        progress["done"] += 1
+        if failed:
+            progress["failed"] += 1
+
+    def _getSemaphores(self, device):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        semaphores = [self._semaphore]
+        if device.hub is not None:
+            if device.hub not in self._hubSemaphores:
+                self._hubSemaphores[device.hub] = asyncio.Semaphore(self.hubConcurrency)
+            # hub first, so waiting children do not hold global slots
+            semaphores.insert(0, self._hubSemaphores[device.hub])
+        return semaphores
+
+    async def _limited(self, device, func, *args):
+        semaphores = self._getSemaphores(device)
+        for semaphore in semaphores:
+            await semaphore.acquire()
+        try:
+            if inspect.iscoroutinefunction(func):
+                return await func(*args)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix="pytapo-fleet"
+                )
+            context = contextvars.copy_context()
+            return await asyncio.wrap_future(
+                self._executor.submit(context.run, func, *args)
+            )
+        finally:
+            for semaphore in reversed(semaphores):
+                semaphore.release()
+
+    def _createTapo(self, device):
+        kwargs = dict(device.kwargs)
+        if device.profile is not None:
+            # reconnects skip detecting protocol of the device again
+            kwargs.setdefault("isKLAP", device.profile["isKLAP"])
+            kwargs.setdefault("KLAPVersion", device.profile["KLAPVersion"])
+            kwargs.setdefault("transportMethod", device.profile["transportMethod"])
+            kwargs.setdefault("playerID", device.profile["playerID"])
+            kwargs.setdefault("capabilities", device.profile.get("capabilities"))
+        tapo = self.tapoFactory(device.host, device.user, device.password, **kwargs)
+        device.profile = tapo.getProfile()
+        return tapo
+
+    def _closeTapo(self, name, tapo):
+        try:
+            tapo.close()
+        except Exception as err:
+            self.logger.debugLog(f"Failed to close {name}: {err}")
+
+    async def _connect(self, device, offset=0, progress=None):
+        if device.state == FleetDevice.STOPPED:
+            return False
+        if offset:
+            await asyncio.sleep(offset)
+        device.state = FleetDevice.CONNECTING
+        try:
+            tapo = await self._limited(device, self._createTapo, device)
+        except Exception as err:
+            self.logger.debugLog(f"Fleet: failed to connect to {device.name}: {err}")
+            device.state = FleetDevice.FAILED
+            device.lastError = err
+            device.failures += 1
+            device.nextConnect = time.monotonic() + self.reconnectInterval
+            self._finishProgress(progress, True)
+            return False
+        if device.state == FleetDevice.STOPPED:
+            # stopped while logging in
+            self._closeTapo(device.name, tapo)
+            self._finishProgress(progress, True)
+            return False
+        device.tapo = tapo
+        device.state = FleetDevice.ONLINE
+        device.lastError = None
+        device.failures = 0
+        device.lastSuccess = time.time()
+        self._finishProgress(progress, False)
+        return True
+
+    async def _poll(self, device, func, progress, reconnectOffset=None):
+        if device.tapo is None:
+            if reconnectOffset is None or not await self._connect(
+                device, reconnectOffset
+            ):
+                self._finishProgress(progress, True)
+                return device.lastError
+        try:
+            if isinstance(func, str):
+                method = getattr(device.tapo, func + "Async", None)
+                if not inspect.iscoroutinefunction(method):
+                    method = getattr(device.tapo, func)
+                result = await self._limited(device, method)
+            else:
+                result = await self._limited(device, func, device.tapo)
+        except Exception as err:
+            device.lastError = err
+            device.failures += 1
+            device.state = FleetDevice.FAILED
+            self._finishProgress(progress, True)
+            return err
+        device.polls += 1
+        device.failures = 0
+        device.lastError = None
+        device.lastSuccess = time.time()
+        device.state = FleetDevice.ONLINE
+        self._finishProgress(progress, False)
+        return result
+
+    def _getLoop(self):
+        if self._loop is not None:
+            return self._loop
+        return self.asyncHandler.getLoop()
+
+    def _run(self, coroutine):
+        if _isLoopThread(self._getLoop()):
+            coroutine.close()
+            raise Exception(
+                "Sync fleet calls cannot be made from its event loop thread, "
+                "await the async interface instead."
+            )
+        return self.schedule(coroutine).result()
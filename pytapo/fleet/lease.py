@@ -0,0 +1,303 @@
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from ..const import LEASE_TTL_SECONDS
+
+
+class LeaseBackend(ABC):
+    """
+    Storage for time limited camera ownership leases shared by collector nodes.
+
+    acquire both takes a free or expired lease and renews one the owner already
+    holds. Nodes announce themselves with heartbeat so peers can tell who is alive.
+    """
+
+    @abstractmethod
+    def acquire(self, resource, owner, ttl):
+        pass
+
+    @abstractmethod
+    def release(self, resource, owner):
+        pass
+
+    @abstractmethod
+    def getOwner(self, resource):
+        pass
+
+    @abstractmethod
+    def heartbeat(self, node, ttl):
+        pass
+
+    @abstractmethod
+    def removeNode(self, node):
+        pass
+
+    @abstractmethod
+    def getNodes(self):
+        pass
+
+
+class MemoryLeaseBackend(LeaseBackend):
+    def __init__(self):
+        self.leases = {}
+        self.nodes = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, resource, owner, ttl):
+        with self._lock:
+            now = time.time()
+            lease = self.leases.get(resource)
+            if lease is not None and lease[0] != owner and lease[1] > now:
+                return False
+            self.leases[resource] = (owner, now + ttl)
+            return True
+
+    def release(self, resource, owner):
+        with self._lock:
+            lease = self.leases.get(resource)
+            if lease is not None and lease[0] == owner:
+                del self.leases[resource]
+
+    def getOwner(self, resource):
+        with self._lock:
+            lease = self.leases.get(resource)
+            if lease is None or lease[1] <= time.time():
+                return None
+            return lease[0]
+
+    def heartbeat(self, node, ttl):
+        with self._lock:
+            self.nodes[node] = time.time() + ttl
+
+    def removeNode(self, node):
+        with self._lock:
+            self.nodes.pop(node, None)
+
+    def getNodes(self):
+        with self._lock:
+            now = time.time()
+            return sorted(node for node, expires in self.nodes.items() if expires > now)
+
+
+class SQLiteLeaseBackend(LeaseBackend):
+    """
+    Leases stored in a SQLite file, for several processes on a single host.
+
+    Every change runs in an immediate transaction so the database lock serializes
+    competing nodes.
+    """
+
+    def __init__(self, path, timeout=10):
+        self.path = path
+        self._connection = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._transaction() as cursor:
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS leases "
+                "(resource TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS nodes "
+                "(node TEXT PRIMARY KEY, expires REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection.cursor()
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def acquire(self, resource, owner, ttl):
+        with self._transaction() as cursor:
+            now = time.time()
+            cursor.execute(
+                "INSERT INTO leases (resource, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(resource) DO UPDATE SET owner = excluded.owner, "
+                "expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+                (resource, owner, now + ttl, now),
+            )
+            return cursor.rowcount > 0
+
+    def release(self, resource, owner):
+        with self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM leases WHERE resource = ? AND owner = ?",
+                (resource, owner),
+            )
+
+    def getOwner(self, resource):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT owner FROM leases WHERE resource = ? AND expires > ?",
+                (resource, time.time()),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def heartbeat(self, node, ttl):
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO nodes (node, expires) VALUES (?, ?) "
+                "ON CONFLICT(node) DO UPDATE SET expires = excluded.expires",
+                (node, time.time() + ttl),
+            )
+
+    def removeNode(self, node):
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM nodes WHERE node = ?", (node,))
+
+    def getNodes(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT node FROM nodes WHERE expires > ? ORDER BY node",
+                (time.time(),),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# rendezvous hashing, only devices of a joining or leaving node change owner
+def getPreferredNode(resource, nodes):
+    return max(
+        nodes,
+        key=lambda node: hashlib.md5(f"{node}:{resource}".encode("utf8")).digest(),
+    )
+
+
+class LeaseCoordinator:
+    """
+    Decides which node of a cluster polls which camera.
+
+    Each node keeps leases on the cameras it owns and renews them while alive.
+    Cameras go to the live node preferred by rendezvous hashing, so when a node joins
+    it takes over its share and when a node dies its leases expire and its cameras
+    are picked up by the remaining nodes.
+    """
+
+    def __init__(self, fleet, backend, nodeID=None, ttl=LEASE_TTL_SECONDS):
+        self.fleet = fleet
+        self.backend = backend
+        self.nodeID = nodeID if nodeID is not None else str(uuid.uuid4())
+        self.ttl = ttl
+        self.renewInterval = ttl / 3
+        self.devices = {}
+        self.owned = set()
+        self._stopEvent = threading.Event()
+        self._thread = None
+        # logins of every step still running, all are cancelled on stop
+        self._starting = set()
+        self._lock = threading.Lock()
+
+    def addDevice(self, name, host, user, password, **kwargs):
+        self.devices[name] = (host, user, password, kwargs)
+
+    def removeDevice(self, name):
+        with self._lock:
+            self.devices.pop(name, None)
+            owned = name in self.owned
+            self.owned.discard(name)
+        if owned:
+            self._releaseDevices([name])
+
+    def step(self):
+        taken = []
+        dropped = []
+        released = []
+        with self._lock:
+            self.backend.heartbeat(self.nodeID, self.ttl)
+            nodes = self.backend.getNodes()
+            if self.nodeID not in nodes:
+                nodes.append(self.nodeID)
+            for name in list(self.devices):
+                preferred = getPreferredNode(name, nodes)
+                if preferred != self.nodeID:
+                    # hand over to the preferred node, it acquires on its next step
+                    if name in self.owned:
+                        self.owned.discard(name)
+                        released.append(name)
+                    continue
+                if self.backend.acquire(name, self.nodeID, self.ttl):
+                    if name not in self.owned:
+                        self._takeDevice(name)
+                        taken.append(name)
+                elif name in self.owned:
+                    # lease was lost, someone else polls the camera now
+                    self.owned.discard(name)
+                    dropped.append(name)
+            owned = set(self.owned)
+        # closing sessions blocks, it is done outside the lock
+        self._dropDevices(dropped)
+        self._releaseDevices(released)
+        # logins run on the fleet loop, slow cameras do not delay lease renewals
+        if taken:
+            starting = self.fleet.schedule(self.fleet.startAsync(taken))
+            with self._lock:
+                self._starting.add(starting)
+            starting.add_done_callback(self._onStarted)
+        return owned
+
+    def start(self):
+        self._stopEvent.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="pytapo-lease-coordinator", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopEvent.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            starting = list(self._starting)
+            self._starting.clear()
+            owned = list(self.owned)
+            self.owned.clear()
+        for future in starting:
+            future.cancel()
+        self._releaseDevices(owned)
+        self.backend.removeNode(self.nodeID)
+
+    def _run(self):
+        while not self._stopEvent.is_set():
+            try:
+                self.step()
+            except Exception as err:
+                self.fleet.logger.warnLog(f"Lease coordination failed: {err}")
+            self._stopEvent.wait(self.renewInterval)
+
+    def _takeDevice(self, name):
+        host, user, password, kwargs = self.devices[name]
+        self.owned.add(name)
+        if name not in self.fleet.devices:
+            self.fleet.addDevice(name, host, user, password, **kwargs)
+
+    def _onStarted(self, future):
+        with self._lock:
+            self._starting.discard(future)
+
+    def _dropDevices(self, names):
+        for name in names:
+            if name in self.fleet.devices:
+                self.fleet.removeDevice(name)
+
+    def _releaseDevices(self, names):
+        # close the sessions first so the new owner is not evicted
+        self._dropDevices(names)
+        for name in names:
+            self.backend.release(name, self.nodeID)
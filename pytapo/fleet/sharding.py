@@ -0,0 +1,276 @@
+import bisect
+import hashlib
+import itertools
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ..const import FLEET_CONCURRENCY, FLEET_HASH_REPLICAS
+
+
+class HashRing:
+    def __init__(self, nodes=(), replicas=FLEET_HASH_REPLICAS):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.addNode(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(
+            hashlib.md5(str(value).encode("utf8")).digest()[:8], "big"
+        )
+
+    def addNode(self, node):
+        for replica in range(self.replicas):
+            key = self._hash(f"{node}#{replica}")
+            self._nodes[key] = node
+            bisect.insort(self._keys, key)
+
+    def removeNode(self, node):
+        for replica in range(self.replicas):
+            key = self._hash(f"{node}#{replica}")
+            if self._nodes.pop(key, None) is not None:
+                self._keys.remove(key)
+
+    def getNode(self, key):
+        if not self._keys:
+            raise Exception("Hash ring has no nodes.")
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+# runs in the worker process
+def _workerMain(connection, fleetKwargs):
+    from .fleet import TapoFleet
+
+    fleet = TapoFleet(**fleetKwargs)
+    executor = ThreadPoolExecutor(
+        max_workers=fleetKwargs.get("concurrency", FLEET_CONCURRENCY),
+        thread_name_prefix="pytapo-shard",
+    )
+    sendLock = threading.Lock()
+
+    def reply(requestID, ok, value):
+        try:
+            payload = pickle.dumps((requestID, ok, value))
+        except Exception:
+            # result or exception cannot cross process boundary
+            payload = pickle.dumps((requestID, False, Exception(repr(value))))
+        with sendLock:
+            connection.send_bytes(payload)
+
+    def handle(requestID, command, args):
+        try:
+            reply(requestID, True, _handleCommand(fleet, command, args))
+        except Exception as err:
+            reply(requestID, False, err)
+
+    while True:
+        try:
+            requestID, command, args = pickle.loads(connection.recv_bytes())
+        except EOFError:
+            break
+        if command == "close":
+            fleet.close()
+            reply(requestID, True, None)
+            break
+        executor.submit(handle, requestID, command, args)
+    executor.shutdown(wait=False)
+    connection.close()
+
+
+def _callMethod(method, args, kwargs):
+    def call(tapo):
+        return getattr(tapo, method)(*args, **kwargs)
+
+    return call
+
+
+def _handleCommand(fleet, command, args):
+    if command == "add":
+        name, host, user, password, hub, profile, kwargs = args
+        device = fleet.addDevice(name, host, user, password, hub, **kwargs)
+        device.profile = profile
+        return None
+    elif command == "start":
+        return fleet.start(args)
+    elif command == "startDevice":
+        return fleet.startDevice(args)
+    elif command == "stopDevice":
+        return fleet.stopDevice(args)
+    elif command == "remove":
+        return fleet.removeDevice(args)
+    elif command == "call":
+        name, method, callArgs, callKwargs = args
+        return getattr(fleet.getDevice(name), method)(*callArgs, **callKwargs)
+    elif command == "poll":
+        method, callArgs, callKwargs, names = args
+        return fleet.poll(_callMethod(method, callArgs, callKwargs), names)
+    elif command == "health":
+        return fleet.getHealth()
+    elif command == "profiles":
+        return {name: device.profile for name, device in fleet.devices.items()}
+    raise Exception(f"Unknown fleet command: {command}.")
+
+
+class _Worker:
+    def __init__(self, index, context, fleetKwargs):
+        self.index = index
+        self.connection, childConnection = context.Pipe()
+        self.process = context.Process(
+            target=_workerMain,
+            args=(childConnection, fleetKwargs),
+            name=f"pytapo-shard-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        childConnection.close()
+        self.pending = {}
+        self._ids = itertools.count()
+        self._sendLock = threading.Lock()
+        self._reader = threading.Thread(
+            target=self._read, name=f"pytapo-shard-reader-{index}", daemon=True
+        )
+        self._reader.start()
+
+    def request(self, command, args=None):
+        future = Future()
+        with self._sendLock:
+            requestID = next(self._ids)
+            self.pending[requestID] = future
+            try:
+                self.connection.send_bytes(pickle.dumps((requestID, command, args)))
+            except Exception:
+                del self.pending[requestID]
+                raise
+        return future
+
+    def _read(self):
+        while True:
+            try:
+                requestID, ok, value = pickle.loads(self.connection.recv_bytes())
+            except (EOFError, OSError):
+                break
+            future = self.pending.pop(requestID, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+        for future in list(self.pending.values()):
+            if not future.done():
+                future.set_exception(
+                    Exception(f"Fleet worker {self.index} exited unexpectedly.")
+                )
+        self.pending.clear()
+
+
+class ShardedFleet:
+    """
+    Spreads devices over worker processes, each running its own TapoFleet.
+
+    Devices are assigned to workers by consistent hashing of their name and all
+    calls are routed to the owning worker over a pipe. Devices can be added with a
+    profile from getProfiles() so workers skip detecting them again.
+    """
+
+    def __init__(self, workers=None, replicas=FLEET_HASH_REPLICAS, **fleetKwargs):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # fork is unsafe with threads and event loops of the parent
+        context = multiprocessing.get_context("spawn")
+        self.workers = [
+            _Worker(index, context, fleetKwargs) for index in range(workers)
+        ]
+        self.ring = HashRing(range(workers), replicas)
+        self.devices = {}
+
+    def addDevice(self, name, host, user, password, hub=None, profile=None, **kwargs):
+        if name in self.devices:
+            raise Exception(f"Device {name} is already part of the fleet.")
+        worker = self.workers[self.ring.getNode(name)]
+        worker.request(
+            "add", (name, host, user, password, hub, profile, kwargs)
+        ).result()
+        self.devices[name] = worker.index
+        return worker.index
+
+    def removeDevice(self, name):
+        self._getWorker(name).request("remove", name).result()
+        del self.devices[name]
+
+    def start(self):
+        return self._mergeHealth(self._broadcast("start"))
+
+    def startDevice(self, name):
+        return self._getWorker(name).request("startDevice", name).result()
+
+    def stopDevice(self, name):
+        return self._getWorker(name).request("stopDevice", name).result()
+
+    def call(self, name, method, *args, **kwargs):
+        return self._getWorker(name).request("call", (name, method, args, kwargs))
+
+    def execute(self, name, method, *args, **kwargs):
+        return self.call(name, method, *args, **kwargs).result()
+
+    def poll(self, method, *args, names=None, **kwargs):
+        if names is None:
+            futures = self._broadcast("poll", (method, args, kwargs, None))
+        else:
+            byWorker = {}
+            for name in names:
+                byWorker.setdefault(self.devices[name], []).append(name)
+            futures = [
+                self.workers[index].request("poll", (method, args, kwargs, workerNames))
+                for index, workerNames in byWorker.items()
+            ]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def getHealth(self):
+        return self._mergeHealth(self._broadcast("health"))
+
+    def getProfiles(self):
+        profiles = {}
+        for future in self._broadcast("profiles"):
+            profiles.update(future.result())
+        return profiles
+
+    def close(self):
+        for future in self._broadcast("close"):
+            try:
+                future.result(timeout=30)
+            except Exception:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.connection.close()
+
+    def _getWorker(self, name):
+        if name not in self.devices:
+            raise Exception(f"Device {name} is not part of the fleet.")
+        return self.workers[self.devices[name]]
+
+    def _broadcast(self, command, args=None):
+        return [worker.request(command, args) for worker in self.workers]
+
+    def _mergeHealth(self, futures):
+        health = {"total": 0, "states": {}, "devices": {}, "workers": []}
+        for future in futures:
+            workerHealth = future.result()
+            health["total"] += workerHealth["total"]
+            for state, count in workerHealth["states"].items():
+                health["states"][state] = health["states"].get(state, 0) + count
+            health["devices"].update(workerHealth["devices"])
+            health["workers"].append(workerHealth["progress"])
+        return health
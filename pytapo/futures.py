@@ -0,0 +1,44 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from .const import SUBMIT_MAX_WORKERS
+from .error import TapoTimeoutException
+
+_executor = None
+_executorLock = threading.Lock()
+
+
+def getSubmitExecutor():
+    global _executor
+    with _executorLock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=SUBMIT_MAX_WORKERS, thread_name_prefix="pytapo-submit"
+            )
+        return _executor
+
+
+def gather(futures, timeout=None):
+    """
+    Waits for a list or dict of futures and returns their results in the same shape.
+
+    Failed calls are returned as their exception. Calls still running when timeout
+    runs out are returned as TapoTimeoutException and left running.
+    """
+    if isinstance(futures, dict):
+        return dict(zip(futures, gather(list(futures.values()), timeout)))
+    end = None if timeout is None else time.monotonic() + timeout
+    results = []
+    for future in futures:
+        remaining = None if end is None else max(0, end - time.monotonic())
+        try:
+            results.append(future.result(remaining))
+        except TimeoutError:
+            if future.done():
+                results.append(future.exception())
+            else:
+                results.append(TapoTimeoutException(timeout, "gather"))
+        except Exception as err:
+            results.append(err)
+    return results
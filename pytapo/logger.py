@@ -9,6 +9,11 @@ class Logger:
         elif callable(self.printDebugInformation):
             self.printDebugInformation(msg)
 
+    def isDebugEnabled(self):
+        return self.printDebugInformation is True or callable(
+            self.printDebugInformation
+        )
+
     def warnLog(self, msg):
         if self.printWarnInformation is True:
             print(f"WARNING: {msg}")
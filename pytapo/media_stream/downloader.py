@@ -59,7 +59,9 @@ class Downloader:
     async def _get_audio_sample_rate(self):
         try:
             loop = asyncio.get_event_loop()
-            audio_config = await loop.run_in_executor(None, self.tapo.getAudioConfig)
+            audio_config = await loop.run_in_executor(
+                None, self.tapo.getAudioConfig, True
+            )
             rate = (
                 audio_config.get("audio_config", {})
                 .get("microphone", {})
@@ -136,13 +138,13 @@ class Downloader:
                     mediaSession.set_window_size(50)
                 else:
                     mediaSession.set_window_size(self.window_size)
-                async with mediaSession:
+                async with self.tapo.userIDPool.lease() as userIDLease, mediaSession:
                     payload = {
                         "type": "request",
                         "seq": 1,
                         "params": {
                             "playback": {
-                                "client_id": self.tapo.getUserID(),
+                                "client_id": userIDLease.userID,
                                 "channels": [0, 1],
                                 "scale": "1/1",
                                 "start_time": str(self.startTime),
@@ -223,6 +225,12 @@ class Downloader:
                             try:
                                 json_data = json.loads(resp.plaintext.decode())
 
+                                if userIDLease.expireOnError(json_data):
+                                    # a new user ID is leased for the retry
+                                    self.tapo.logger.debugLog(
+                                        "User ID was rejected by the device."
+                                    )
+                                    break
                                 if (
                                     "type" in json_data
                                     and json_data["type"] == "notification"
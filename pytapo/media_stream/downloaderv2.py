@@ -84,7 +84,9 @@ class DownloaderV2:
 
         try:
             loop = asyncio.get_event_loop()
-            audio_config = await loop.run_in_executor(None, self.tapo.getAudioConfig)
+            audio_config = await loop.run_in_executor(
+                None, self.tapo.getAudioConfig, True
+            )
             microphone = (
                 audio_config.get("audio_config", {}).get("microphone", {})
             )
@@ -285,13 +287,13 @@ class DownloaderV2:
         mediaSession.set_window_size(self.window_size)
         self.currentAction = "Streaming"
 
-        async with mediaSession:
+        async with self.tapo.userIDPool.lease() as userIDLease, mediaSession:
             payload = {
                 "type": "request",
                 "seq": 1,
                 "params": {
                     "playback": {
-                        "client_id": self.tapo.getUserID(),
+                        "client_id": userIDLease.userID,
                         "channels": [0, 1],
                         "scale": "1/1",
                         "start_time": str(self.startTime),
@@ -307,6 +309,15 @@ class DownloaderV2:
                 if not self.running:
                     break
 
+                if resp.mimetype == "application/json":
+                    try:
+                        if userIDLease.expireOnError(json.loads(resp.plaintext)):
+                            self.tapo.logger.debugLog(
+                                "User ID was rejected by the device."
+                            )
+                            break
+                    except ValueError:
+                        pass
                 if resp.mimetype != "video/mp2t":
                     continue
 
@@ -121,7 +121,9 @@ class Streamer:
 
         try:
             loop = asyncio.get_event_loop()
-            audio_config = await loop.run_in_executor(None, self.tapo.getAudioConfig)
+            audio_config = await loop.run_in_executor(
+                None, self.tapo.getAudioConfig, True
+            )
             microphone = audio_config.get("audio_config", {}).get("microphone", {})
             encode_type = str(microphone.get("encode_type", "")).lower()
             if "ulaw" in encode_type:
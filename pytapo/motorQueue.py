@@ -0,0 +1,230 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from .const import (
+    MOTOR_MIN_INTERVAL_SECONDS,
+    MOTOR_MAX_INTERVAL_SECONDS,
+    MOTOR_BUSY_RETRIES,
+)
+
+
+class MotorQueue:
+    """
+    Latest-wins command channel for PTZ motor.
+
+    Only one command is ever pending. Relative moves submitted while another relative
+    move is pending are merged into a single move, steps are counted per axis and
+    sent one per interval. Any other command replaces the pending one. Replaced
+    (superseded) calls resolve immediately with False.
+    """
+
+    def __init__(
+        self,
+        tapo,
+        minInterval=MOTOR_MIN_INTERVAL_SECONDS,
+        maxInterval=MOTOR_MAX_INTERVAL_SECONDS,
+        busyRetries=MOTOR_BUSY_RETRIES,
+    ):
+        self.tapo = tapo
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.busyRetries = busyRetries
+        self.interval = minInterval
+        self._condition = threading.Condition()
+        self._pending = None
+        self._lastSent = 0
+        self._thread = None
+        self._closed = False
+
+    def moveMotor(self, x, y):
+        return self._submit("move", (int(x), int(y)))
+
+    def moveMotorStep(self, angle):
+        if not (0 <= angle < 360):
+            raise Exception("Angle must be in a range 0 <= angle < 360")
+        # steps counted per axis of the angle, negative towards angle + 180
+        return self._submit("step", {angle % 180: 1 if angle < 180 else -1})
+
+    def setPreset(self, presetID):
+        if not str(presetID) in self.tapo.presets:
+            self.tapo.getPresets()
+            if not str(presetID) in self.tapo.presets:
+                raise Exception("Preset {} is not set in the app".format(str(presetID)))
+        return self._submit("preset", (str(presetID),))
+
+    def setCruise(self, enabled, coord=False):
+        if coord not in ["x", "y"] and coord is not False:
+            raise Exception("Invalid coord parameter. Can be 'x' or 'y'.")
+        return self._submit("cruise", (enabled, coord))
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            if self._pending is not None:
+                self._resolveSuperseded(self._pending)
+                self._pending = None
+            self._condition.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+    def _submit(self, kind, args):
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise Exception("Motor queue is closed.")
+            self._enqueue({"kind": kind, "args": args, "futures": [future], "busy": 0})
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="pytapo-motor-queue", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return future
+
+    # must be called with self._condition held
+    def _enqueue(self, command):
+        pending = self._pending
+        if (
+            pending is not None
+            and pending["kind"] == command["kind"]
+            and command["kind"] in ("move", "step")
+        ):
+            if command["kind"] == "step":
+                counts = dict(pending["args"])
+                for axis, count in command["args"].items():
+                    counts[axis] = counts.get(axis, 0) + count
+                pending["args"] = counts
+            else:
+                pending["args"] = (
+                    pending["args"][0] + command["args"][0],
+                    pending["args"][1] + command["args"][1],
+                )
+            pending["futures"].extend(command["futures"])
+            pending["busy"] = max(pending["busy"], command["busy"])
+            return
+        if pending is not None:
+            self._resolveSuperseded(pending)
+        self._pending = command
+
+    def _resolveSuperseded(self, command):
+        for future in command["futures"]:
+            if not future.done():
+                future.set_result(False)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._pending is None:
+                    return
+                wait = self._lastSent + self.interval - time.monotonic()
+                if wait > 0:
+                    # newer commands arriving meanwhile are merged or replace pending
+                    self._condition.wait(wait)
+                    continue
+                command = self._pending
+                self._pending = None
+                self._lastSent = time.monotonic()
+            self._send(command)
+
+    def _getRequest(self, command):
+        kind = command["kind"]
+        args = command["args"]
+        if kind == "move":
+            return (
+                "motorMove",
+                {"motor": {"move": {"x_coord": str(args[0]), "y_coord": str(args[1])}}},
+            )
+        elif kind == "step":
+            return (
+                "relativeMove",
+                {"motor": {"movestep": {"direction": str(_getStep(args)[0])}}},
+            )
+        elif kind == "preset":
+            return ("motorMoveToPreset", {"preset": {"goto_preset": {"id": args[0]}}})
+        enabled, coord = args
+        if enabled and coord is not False:
+            return ("cruiseMove", {"motor": {"cruise": {"coord": coord}}})
+        return ("cruiseStop", {"motor": {"cruise_stop": {}}})
+
+    def _send(self, command):
+        if (command["kind"] == "move" and command["args"] == (0, 0)) or (
+            command["kind"] == "step" and _getStep(command["args"]) is None
+        ):
+            # merged moves cancelled each other out
+            self._resolveSuperseded(command)
+            return
+        method, params = self._getRequest(command)
+        try:
+            # retry=True skips executeFunction's stop cruise and retry, busy motor is handled here
+            result = self.tapo.executeFunction(method, params, retry=True)
+        except Exception as err:
+            if getattr(err, "errorCode", None) == -64303:
+                self._onBusy(command, err)
+                return
+            for future in command["futures"]:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        self.interval = max(self.minInterval, self.interval / 2)
+        if command["kind"] == "step" and self._takeStep(command):
+            return
+        for future in command["futures"]:
+            if not future.done():
+                future.set_result(result)
+
+    def _onBusy(self, command, err):
+        self.interval = min(self.maxInterval, self.interval * 2)
+        self.tapo.logger.debugLog(
+            f"Motor busy, slowing down motor queue to {self.interval}s."
+        )
+        command["busy"] += 1
+        if command["busy"] > self.busyRetries:
+            for future in command["futures"]:
+                if not future.done():
+                    future.set_exception(err)
+            return
+        if command["busy"] == 1 and command["kind"] != "cruise":
+            # a running cruise keeps the motor busy until it is stopped
+            try:
+                self.tapo.setCruise(False, retry=True)
+            except Exception as cruiseErr:
+                self.tapo.logger.debugLog(f"Failed to stop cruise: {cruiseErr}")
+        self._requeue(command)
+
+    # puts command back ahead of newer ones, relative moves are merged into it
+    def _requeue(self, command):
+        with self._condition:
+            if self._pending is None:
+                self._pending = command
+            elif self._pending["kind"] == command["kind"] and command["kind"] in (
+                "move",
+                "step",
+            ):
+                pending = self._pending
+                self._pending = command
+                self._enqueue(pending)
+            else:
+                self._resolveSuperseded(command)
+
+    # True while steps of the command are left, they are sent after the interval
+    def _takeStep(self, command):
+        counts = dict(command["args"])
+        axis = _getStep(counts)[1]
+        counts[axis] += -1 if counts[axis] > 0 else 1
+        command["args"] = counts
+        if _getStep(counts) is None:
+            return False
+        self._requeue(command)
+        return True
+
+
+# direction and axis of the next step of merged steps, None when none are left
+def _getStep(counts):
+    for axis, count in counts.items():
+        if count:
+            return (axis if count > 0 else axis + 180), axis
+    return None
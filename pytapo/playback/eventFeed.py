@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime
+
+from ..const import (
+    EVENT_PAGE_SIZE,
+    EVENT_MAX_PAGES,
+    EVENT_POLL_SECONDS,
+    EVENT_LOOKBACK_SECONDS,
+)
+from ..futures import getSubmitExecutor
+
+
+def getEventID(event):
+    return (event.get("start_time"), event.get("alarm_type"))
+
+
+class EventFeed:
+    """
+    Detection events of a camera, each new event returned exactly once.
+
+    The feed keeps a cursor made of the latest start time seen and the IDs of the
+    events starting at that time. Every poll only asks for events from the cursor
+    on, pages through search_detection_list until it is exhausted and drops events
+    that were already returned. Times in the cursor are camera times, returned
+    events are corrected to local time like in getEvents.
+
+    When a poll stops at EVENT_MAX_PAGES the cursor stays where it was, the events
+    returned so far are remembered and the next polls only search up to the oldest
+    fetched event, whichever order the camera lists them in.
+    """
+
+    def __init__(
+        self,
+        tapo,
+        startTime=None,
+        pageSize=EVENT_PAGE_SIZE,
+        interval=EVENT_POLL_SECONDS,
+        lookback=EVENT_LOOKBACK_SECONDS,
+    ):
+        self.tapo = tapo
+        self.pageSize = pageSize
+        self.interval = interval
+        self.lookback = lookback
+        self.cursorTime = startTime
+        self.cursorIDs = set()
+        self.returnedIDs = set()
+        self.searchEnd = None
+        self._pending = []
+
+    def _getCameraTime(self, timeCorrection):
+        return int(datetime.timestamp(datetime.now())) - timeCorrection
+
+    def poll(self):
+        timeCorrection = self.tapo.getTimeCorrection()
+        if timeCorrection is False:
+            raise Exception("Failed to get correct camera time.")
+        now = self._getCameraTime(timeCorrection)
+        if self.cursorTime is None:
+            self.cursorTime = now - self.lookback
+        endTime = now + 60 if self.searchEnd is None else self.searchEnd
+        events = []
+        truncated = False
+        for page in range(EVENT_MAX_PAGES):
+            startIndex = page * self.pageSize
+            found = self.tapo.searchDetectionList(
+                self.cursorTime, endTime, startIndex, startIndex + self.pageSize - 1
+            )
+            events.extend(found)
+            if len(found) < self.pageSize:
+                break
+        else:
+            truncated = True
+            self.tapo.logger.warnLog(
+                f"More than {EVENT_MAX_PAGES} pages of events, the rest is fetched "
+                "on the next poll."
+            )
+
+        newEvents = []
+        seen = set()
+        for event in sorted(events, key=lambda event: event["start_time"]):
+            eventID = getEventID(event)
+            if (
+                event["start_time"] < self.cursorTime
+                or eventID in seen
+                or eventID in self.returnedIDs
+                or (
+                    event["start_time"] == self.cursorTime and eventID in self.cursorIDs
+                )
+            ):
+                continue
+            seen.add(eventID)
+            newEvents.append(event)
+
+        self.returnedIDs.update(seen)
+        if truncated:
+            # unfetched events are older or newer than the fetched ones, the oldest
+            # fetched time is searched again and its events dropped by returnedIDs
+            self.searchEnd = min(event["start_time"] for event in events)
+        elif self.returnedIDs:
+            # event IDs start with the start time
+            latest = max(eventID[0] for eventID in self.returnedIDs)
+            if latest != self.cursorTime:
+                self.cursorTime = latest
+                self.cursorIDs = set()
+            self.cursorIDs.update(
+                eventID for eventID in self.returnedIDs if eventID[0] == latest
+            )
+            self.returnedIDs = set()
+            self.searchEnd = None
+
+        nowTS = now + timeCorrection
+        return [
+            self.tapo._correctEvent(event, timeCorrection, nowTS) for event in newEvents
+        ]
+
+    def getCursor(self):
+        return {
+            "time": self.cursorTime,
+            "ids": list(self.cursorIDs),
+            "returned": list(self.returnedIDs),
+            "end": self.searchEnd,
+        }
+
+    def setCursor(self, cursor):
+        self.cursorTime = cursor["time"]
+        self.cursorIDs = set(tuple(eventID) for eventID in cursor["ids"])
+        self.returnedIDs = set(tuple(eventID) for eventID in cursor.get("returned", []))
+        self.searchEnd = cursor.get("end")
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._pending:
+            self._pending = await asyncio.wrap_future(
+                getSubmitExecutor().submit(self.poll)
+            )
+            if not self._pending:
+                await asyncio.sleep(self.interval)
+        return self._pending.pop(0)
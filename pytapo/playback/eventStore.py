@@ -0,0 +1,245 @@
+import bisect
+import heapq
+import json
+import mmap
+import os
+import struct
+import threading
+
+from ..const import EVENT_STORE_RUN_SIZE
+
+# start time, end time, alarm type, camera
+RECORD = struct.Struct("<qqII")
+# start time, record number
+INDEX_ENTRY = struct.Struct("<qI")
+
+
+class _IndexView:
+    def __init__(self, buffer, count):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        return INDEX_ENTRY.unpack_from(self.buffer, position * INDEX_ENTRY.size)[0]
+
+
+class EventStore:
+    """
+    Append only local store of detection events of many cameras.
+
+    Events are kept as fixed width records in events.dat, in the order they were
+    added. index.dat holds (start time, record) entries sorted by time and is
+    memory mapped, so range scans and counts binary search it without loading
+    anything. New events starting after the last indexed one are appended to it.
+    Older ones go to run.dat, a small sorted run searched next to the index,
+    which is merged into the index once it holds EVENT_STORE_RUN_SIZE entries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._dataPath = os.path.join(path, "events.dat")
+        self._indexPath = os.path.join(path, "index.dat")
+        self._runPath = os.path.join(path, "run.dat")
+        self._camerasPath = os.path.join(path, "cameras.json")
+        self._lock = threading.RLock()
+        self.cameras = []
+        if os.path.exists(self._camerasPath):
+            with open(self._camerasPath) as file:
+                self.cameras = json.load(file)
+        self._cameraIDs = {camera: i for i, camera in enumerate(self.cameras)}
+        open(self._dataPath, "ab").close()
+        open(self._indexPath, "ab").close()
+        open(self._runPath, "ab").close()
+        self._data = open(self._dataPath, "r+b")
+        self._dataMap = None
+        self._indexMap = None
+        self._runMap = None
+        self._mapFiles()
+        if self._indexCount + self._runCount > self._recordCount:
+            # run was already merged into the index when the merge was interrupted
+            self._unmapFiles()
+            open(self._runPath, "wb").close()
+            self._mapFiles()
+        # events written before an interrupted index update
+        indexed = self._indexCount + self._runCount
+        if indexed < self._recordCount:
+            self._addToIndex(range(indexed, self._recordCount))
+
+    def __len__(self):
+        return self._recordCount
+
+    def _unmapFiles(self):
+        for buffer in (self._dataMap, self._indexMap, self._runMap):
+            if buffer is not None:
+                buffer.close()
+        self._dataMap = None
+        self._indexMap = None
+        self._runMap = None
+
+    def _mapFiles(self):
+        self._unmapFiles()
+        size = os.path.getsize(self._dataPath)
+        self._recordCount = size // RECORD.size
+        self._dataMap = (
+            mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        )
+        self._indexMap, self._indexCount = _mapIndex(self._indexPath)
+        self._runMap, self._runCount = _mapIndex(self._runPath)
+
+    def _getCameraID(self, camera):
+        if camera not in self._cameraIDs:
+            self._cameraIDs[camera] = len(self.cameras)
+            self.cameras.append(camera)
+            with open(self._camerasPath + ".tmp", "w") as file:
+                json.dump(self.cameras, file)
+            os.replace(self._camerasPath + ".tmp", self._camerasPath)
+        return self._cameraIDs[camera]
+
+    def _getRecord(self, record):
+        return RECORD.unpack_from(self._dataMap, record * RECORD.size)
+
+    # (start time, record) entries of the index and the run within the range
+    def _findEntries(self, startTime, endTime):
+        return heapq.merge(
+            _getEntries(self._indexMap, self._indexCount, startTime, endTime),
+            _getEntries(self._runMap, self._runCount, startTime, endTime),
+        )
+
+    def _exists(self, cameraID, startTime, alarmType):
+        for _, record in self._findEntries(startTime, startTime):
+            record = self._getRecord(record)
+            if record[3] == cameraID and record[2] == alarmType:
+                return True
+        return False
+
+    def addEvents(self, camera, events):
+        with self._lock:
+            cameraID = self._getCameraID(camera)
+            first = self._recordCount
+            added = set()
+            records = []
+            for event in events:
+                key = (event["start_time"], event.get("alarm_type", 0))
+                if key in added or self._exists(cameraID, *key):
+                    continue
+                added.add(key)
+                records.append(
+                    RECORD.pack(
+                        event["start_time"], event["end_time"], key[1], cameraID
+                    )
+                )
+            if not records:
+                return 0
+            self._data.seek(0, os.SEEK_END)
+            self._data.write(b"".join(records))
+            self._data.flush()
+            self._mapFiles()
+            self._addToIndex(range(first, first + len(records)))
+            return len(records)
+
+    def _addToIndex(self, records):
+        newEntries = sorted((self._getRecord(record)[0], record) for record in records)
+        if (
+            self._indexCount == 0
+            or newEntries[0][0] >= _readEntry(self._indexMap, self._indexCount - 1)[0]
+        ):
+            self._unmapFiles()
+            with open(self._indexPath, "ab") as file:
+                file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in newEntries))
+        elif self._runCount + len(newEntries) < EVENT_STORE_RUN_SIZE:
+            runEntries = list(_getEntries(self._runMap, self._runCount))
+            self._unmapFiles()
+            _writeIndex(self._runPath, heapq.merge(runEntries, newEntries))
+        else:
+            # run is full, merged into the index in one pass
+            self._writeMerged(newEntries)
+            self._unmapFiles()
+            os.replace(self._indexPath + ".tmp", self._indexPath)
+            open(self._runPath, "wb").close()
+        self._mapFiles()
+
+    def _writeMerged(self, newEntries):
+        with open(self._indexPath + ".tmp", "wb") as file:
+            for entry in heapq.merge(
+                _getEntries(self._indexMap, self._indexCount),
+                _getEntries(self._runMap, self._runCount),
+                newEntries,
+            ):
+                file.write(INDEX_ENTRY.pack(*entry))
+
+    def _scan(self, startTime, endTime, cameras, types):
+        cameraIDs = None
+        if cameras is not None:
+            cameraIDs = {
+                self._cameraIDs[camera]
+                for camera in cameras
+                if camera in self._cameraIDs
+            }
+        for _, record in self._findEntries(startTime, endTime):
+            record = self._getRecord(record)
+            if cameraIDs is not None and record[3] not in cameraIDs:
+                continue
+            if types is not None and record[2] not in types:
+                continue
+            yield record
+
+    def getEvents(self, startTime, endTime, cameras=None, types=None):
+        with self._lock:
+            return [
+                {
+                    "camera": self.cameras[cameraID],
+                    "start_time": eventStart,
+                    "end_time": eventEnd,
+                    "alarm_type": alarmType,
+                }
+                for eventStart, eventEnd, alarmType, cameraID in self._scan(
+                    startTime, endTime, cameras, types
+                )
+            ]
+
+    def countByType(self, startTime, endTime, cameras=None):
+        with self._lock:
+            counts = {}
+            for record in self._scan(startTime, endTime, cameras, None):
+                counts[record[2]] = counts.get(record[2], 0) + 1
+            return counts
+
+    def close(self):
+        with self._lock:
+            self._unmapFiles()
+            self._data.close()
+
+
+def _mapIndex(path):
+    size = os.path.getsize(path)
+    if not size:
+        return None, 0
+    with open(path, "rb") as file:
+        return (
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ),
+            size // INDEX_ENTRY.size,
+        )
+
+
+def _readEntry(buffer, position):
+    return INDEX_ENTRY.unpack_from(buffer, position * INDEX_ENTRY.size)
+
+
+def _getEntries(buffer, count, startTime=None, endTime=None):
+    if buffer is None:
+        return
+    view = _IndexView(buffer, count)
+    start = 0 if startTime is None else bisect.bisect_left(view, startTime)
+    end = count if endTime is None else bisect.bisect_right(view, endTime)
+    for position in range(start, end):
+        yield _readEntry(buffer, position)
+
+
+def _writeIndex(path, entries):
+    with open(path + ".tmp", "wb") as file:
+        file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in entries))
+    os.replace(path + ".tmp", path)
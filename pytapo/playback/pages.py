@@ -0,0 +1,35 @@
+import asyncio
+import contextvars
+
+from ..futures import getSubmitExecutor
+
+
+async def iterPages(fetch, pageSize):
+    """
+    Yields the entries returned by fetch(startIndex, endIndex) page by page.
+
+    The next page is requested in the submit executor while the caller processes
+    the current one. Only one page is held at a time and nothing more is requested
+    once the caller stops iterating.
+    """
+
+    def submit(startIndex):
+        context = contextvars.copy_context()
+        return getSubmitExecutor().submit(
+            context.run, fetch, startIndex, startIndex + pageSize - 1
+        )
+
+    startIndex = 0
+    pending = submit(startIndex)
+    try:
+        while pending is not None:
+            page = await asyncio.wrap_future(pending)
+            pending = None
+            if len(page) >= pageSize:
+                startIndex += pageSize
+                pending = submit(startIndex)
+            for entry in page:
+                yield entry
+    finally:
+        if pending is not None:
+            pending.cancel()
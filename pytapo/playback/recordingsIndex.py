@@ -0,0 +1,119 @@
+import json
+import sqlite3
+import threading
+
+from ..const import RECORDINGS_RECHECK_DAYS
+
+
+class RecordingsIndex:
+    """
+    Local SQLite index of the recordings of a camera.
+
+    sync asks the camera which days have recordings and searches only days that
+    are not indexed yet plus the most recent ones, which may still be recording.
+    Days the camera no longer has are dropped. Queries for segments, gaps and the
+    segment covering a time are answered locally. Times are camera times, as
+    returned by getRecordings. Segments spanning midnight are stored under every
+    day that reported them and returned once, so re-indexing or dropping one of
+    those days does not lose them.
+    """
+
+    def __init__(self, tapo, path, recheckDays=RECORDINGS_RECHECK_DAYS):
+        self.tapo = tapo
+        self.recheckDays = recheckDays
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS days (date TEXT PRIMARY KEY, segments INTEGER)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS segments (date TEXT NOT NULL, "
+                "start INTEGER NOT NULL, end INTEGER NOT NULL, data TEXT NOT NULL, "
+                "PRIMARY KEY (date, start, end))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS segments_end ON segments (end)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS segments_start ON segments (start)"
+            )
+
+    def getDays(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT date FROM days ORDER BY date"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def _getDaysToSync(self, cameraDays, knownDays):
+        # latest indexed days may have grown since they were searched
+        recent = (
+            set(sorted(knownDays)[-self.recheckDays :]) if self.recheckDays else set()
+        )
+        return [day for day in cameraDays if day not in knownDays or day in recent]
+
+    def sync(self, startDate="20000101"):
+        cameraDays = self.tapo.getRecordingDays(startDate)
+        knownDays = set(self.getDays())
+        removed = sorted(knownDays - set(cameraDays))
+        if removed:
+            with self._lock, self._connection:
+                for day in removed:
+                    self._removeDay(day)
+        synced = self.tapo.getRecordingsForDays(
+            self._getDaysToSync(cameraDays, knownDays)
+        )
+        for day, recordings in synced.items():
+            self.storeDay(day, recordings)
+        return {"synced": list(synced), "removed": removed}
+
+    def _removeDay(self, day):
+        self._connection.execute("DELETE FROM segments WHERE date = ?", (day,))
+        self._connection.execute("DELETE FROM days WHERE date = ?", (day,))
+
+    def storeDay(self, day, recordings):
+        rows = []
+        for recording in recordings:
+            for segment in recording.values():
+                rows.append(
+                    (day, segment["startTime"], segment["endTime"], json.dumps(segment))
+                )
+        with self._lock, self._connection:
+            self._removeDay(day)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO segments (date, start, end, data) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._connection.execute(
+                "INSERT INTO days (date, segments) VALUES (?, ?)", (day, len(rows))
+            )
+
+    def getSegments(self, startTime, endTime):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT data, MIN(date) FROM segments WHERE start <= ? AND end >= ? "
+                "GROUP BY start, end ORDER BY start",
+                (endTime, startTime),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def getSegmentAt(self, time):
+        segments = self.getSegments(time, time)
+        return segments[0] if segments else None
+
+    def getGaps(self, startTime, endTime):
+        gaps = []
+        position = startTime
+        for segment in self.getSegments(startTime, endTime):
+            if segment["startTime"] > position:
+                gaps.append((position, segment["startTime"]))
+            position = max(position, segment["endTime"])
+        if position < endTime:
+            gaps.append((position, endTime))
+        return gaps
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
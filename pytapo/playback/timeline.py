@@ -0,0 +1,120 @@
+import bisect
+from array import array
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class RecordingTimeline:
+    """
+    Recording segments of a camera as two sorted arrays of start and end times.
+
+    Uses NumPy arrays and vectorized queries when NumPy is installed and plain
+    typed arrays otherwise. Built straight from getRecordings results. A running
+    maximum of the end times lets queries bisect to the first segment that can
+    still overlap instead of scanning all earlier ones.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        order = sorted(range(len(starts)), key=starts.__getitem__)
+        starts = array("q", (starts[i] for i in order))
+        ends = array("q", (ends[i] for i in order))
+        # index of the latest ending segment among the first i + 1 segments
+        latest = array("q")
+        for i in range(len(ends)):
+            latest.append(i if i == 0 or ends[i] > ends[latest[-1]] else latest[-1])
+        maxEnds = array("q", (ends[i] for i in latest))
+        if numpy is not None:
+            self.starts = numpy.frombuffer(starts, dtype=numpy.int64)
+            self.ends = numpy.frombuffer(ends, dtype=numpy.int64)
+            self.latest = numpy.frombuffer(latest, dtype=numpy.int64)
+            self.maxEnds = numpy.frombuffer(maxEnds, dtype=numpy.int64)
+        else:
+            self.starts = starts
+            self.ends = ends
+            self.latest = latest
+            self.maxEnds = maxEnds
+
+    @classmethod
+    def fromRecordings(cls, recordings):
+        starts = array("q")
+        ends = array("q")
+        for recording in recordings:
+            for segment in recording.values():
+                starts.append(segment["startTime"])
+                ends.append(segment["endTime"])
+        return cls(starts, ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _countStartingBefore(self, time):
+        if numpy is not None:
+            return int(numpy.searchsorted(self.starts, time, side="right"))
+        return bisect.bisect_right(self.starts, time)
+
+    def _getCandidates(self, startTime, endTime):
+        # segments starting after endTime cannot overlap, nor can any before the
+        # first one where the running maximum of end times reaches startTime
+        hi = self._countStartingBefore(endTime)
+        if numpy is not None:
+            lo = int(numpy.searchsorted(self.maxEnds[:hi], startTime, side="left"))
+            indexes = lo + numpy.nonzero(self.ends[lo:hi] >= startTime)[0]
+            return self.starts[indexes], self.ends[indexes]
+        lo = bisect.bisect_left(self.maxEnds, startTime, 0, hi)
+        indexes = [i for i in range(lo, hi) if self.ends[i] >= startTime]
+        return [self.starts[i] for i in indexes], [self.ends[i] for i in indexes]
+
+    def getOverlapping(self, startTime, endTime):
+        starts, ends = self._getCandidates(startTime, endTime)
+        return [(int(start), int(end)) for start, end in zip(starts, ends)]
+
+    def getGaps(self, startTime, endTime):
+        starts, ends = self._getCandidates(startTime, endTime)
+        if len(starts) == 0:
+            return [(startTime, endTime)]
+        if numpy is not None:
+            runEnds = numpy.maximum.accumulate(numpy.minimum(ends, endTime))
+            previousEnds = numpy.concatenate(([startTime], runEnds[:-1]))
+            mask = starts > previousEnds
+            gaps = list(zip(previousEnds[mask].tolist(), starts[mask].tolist()))
+            lastEnd = int(runEnds[-1])
+        else:
+            gaps = []
+            lastEnd = startTime
+            for start, end in zip(starts, ends):
+                if start > lastEnd:
+                    gaps.append((lastEnd, start))
+                lastEnd = max(lastEnd, min(end, endTime))
+        if lastEnd < endTime:
+            gaps.append((lastEnd, endTime))
+        return gaps
+
+    def getCoverage(self, startTime, endTime):
+        if endTime <= startTime:
+            return 0
+        missing = sum(end - start for start, end in self.getGaps(startTime, endTime))
+        return 100 * (endTime - startTime - missing) / (endTime - startTime)
+
+    def getNearest(self, time):
+        if len(self.starts) == 0:
+            return None
+        covering = self.getOverlapping(time, time)
+        if covering:
+            return covering[0]
+        # closest segment starting after time or the one before it
+        index = self._countStartingBefore(time)
+        candidates = []
+        if index < len(self.starts):
+            candidates.append(index)
+        if index > 0:
+            candidates.append(int(self.latest[index - 1]))
+        best = min(
+            candidates,
+            key=lambda i: (
+                self.starts[i] - time if self.starts[i] > time else time - self.ends[i]
+            ),
+        )
+        return (int(self.starts[best]), int(self.ends[best]))
@@ -0,0 +1,230 @@
+import asyncio
+import random
+import ssl
+import threading
+from collections import Counter
+
+import requests
+
+from .error import TapoTimeoutException
+from .const import (
+    MAX_LOGIN_RETRIES,
+    RETRY_MAX_DELAY_SECONDS,
+    RETRY_JITTER,
+    RETRY_MAX_SERVER_DELAY_SECONDS,
+)
+from .transport.pytapo.const import (
+    RETRY_BACKOFF_SECONDS,
+    TRANSIENT_REQUEST_RETRIES,
+    RETRYABLE_ERROR_CODES,
+    AUTH_ERROR_CODES,
+)
+
+
+class RetryAction:
+    RETRY = "retry"
+    REAUTH = "reauth"
+    BACKOFF = "backoff"
+    FAIL_FAST = "fail_fast"
+    HONOUR_SERVER_DELAY = "honour_server_delay"
+
+
+# keys for failures which do not come with a device error code
+CONNECTION_ERROR = "connection_error"
+CONNECTION_RESET = "connection_reset"
+INVALID_RESPONSE = "invalid_response"
+DECRYPT_ERROR = "decrypt_error"
+TAG_ERROR = "tag_error"
+AUTHENTICATION_ERROR = "authentication_error"
+REQUEST_REJECTED = "request_rejected"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+# device error code missing from the table, raised by the transport
+DEVICE_ERROR = "device_error"
+UNKNOWN_ERROR = "unknown_error"
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        action,
+        maxRetries=MAX_LOGIN_RETRIES,
+        baseDelay=RETRY_BACKOFF_SECONDS,
+        maxDelay=RETRY_MAX_DELAY_SECONDS,
+        jitter=RETRY_JITTER,
+        clearSession=None,
+    ):
+        self.action = action
+        self.maxRetries = 0 if action == RetryAction.FAIL_FAST else maxRetries
+        self.baseDelay = baseDelay
+        self.maxDelay = maxDelay
+        self.jitter = jitter
+        if clearSession is None:
+            clearSession = action == RetryAction.REAUTH
+        self.clearSession = clearSession
+
+    def getDelay(self, attempt, serverDelay=None):
+        if self.action == RetryAction.RETRY:
+            return 0
+        if self.action == RetryAction.HONOUR_SERVER_DELAY and serverDelay is not None:
+            return serverDelay
+        if self.action == RetryAction.BACKOFF:
+            delay = min(self.maxDelay, self.baseDelay * (2**attempt))
+        else:
+            delay = self.baseDelay
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+class RetryDecision:
+    __slots__ = ("key", "action", "retry", "delay", "clearSession")
+
+    def __init__(self, key, action, retry, delay, clearSession):
+        self.key = key
+        self.action = action
+        self.retry = retry
+        self.delay = delay
+        self.clearSession = clearSession
+
+    def __repr__(self):
+        return (
+            f"RetryDecision(key={self.key}, action={self.action}, "
+            f"retry={self.retry}, delay={round(self.delay, 2)})"
+        )
+
+
+RETRY_POLICIES = {
+    **{code: RetryPolicy(RetryAction.REAUTH) for code in RETRYABLE_ERROR_CODES},
+    **{
+        code: RetryPolicy(RetryAction.FAIL_FAST, clearSession=True)
+        for code in AUTH_ERROR_CODES
+    },
+    -40209: RetryPolicy(RetryAction.FAIL_FAST),  # Invalid login credentials
+    -40411: RetryPolicy(RetryAction.FAIL_FAST),
+    -40404: RetryPolicy(  # DEVICE_BLOCKED, sends sec_left
+        RetryAction.HONOUR_SERVER_DELAY, maxDelay=RETRY_MAX_SERVER_DELAY_SECONDS
+    ),
+    -40109: RetryPolicy(RetryAction.BACKOFF),  # ONE_SECOND_REPEAT_REQUEST
+    -52405: RetryPolicy(RetryAction.BACKOFF),  # TOO_MANY_REQUEST
+    -52407: RetryPolicy(RetryAction.BACKOFF, baseDelay=2),  # TOO_MANY_CLIENT
+    -52419: RetryPolicy(RetryAction.BACKOFF, baseDelay=2),  # TOO_MANY_HTTPS_CLIENT
+    -64303: RetryPolicy(RetryAction.RETRY),  # MOTOR_BUSY, after stopping cruise
+    -71101: RetryPolicy(RetryAction.BACKOFF),  # USER_ID_FULL
+    # user ID needs to be renewed
+    -71103: RetryPolicy(RetryAction.REAUTH, baseDelay=0, clearSession=False),
+    -71105: RetryPolicy(RetryAction.REAUTH, baseDelay=0, clearSession=False),
+    -40105: RetryPolicy(RetryAction.FAIL_FAST),  # Method does not exist
+    -40106: RetryPolicy(RetryAction.FAIL_FAST),  # UNSUPPORTED_METHOD
+    -40101: RetryPolicy(RetryAction.FAIL_FAST),  # Parameter to set does not exist
+    -40211: RetryPolicy(RetryAction.FAIL_FAST),  # MISSING_NECESSARY_PARAMS
+    -64324: RetryPolicy(RetryAction.FAIL_FAST),  # Privacy mode is ON
+    -64302: RetryPolicy(RetryAction.FAIL_FAST),  # Preset ID not found
+    -64321: RetryPolicy(RetryAction.FAIL_FAST),  # Preset ID was deleted
+    -64304: RetryPolicy(RetryAction.FAIL_FAST),  # MOTOR_LOCKED_ROTOR
+    -64336: RetryPolicy(RetryAction.FAIL_FAST),  # MOTOR_PRIVATE_AREA
+    -64306: RetryPolicy(RetryAction.FAIL_FAST),  # PRESET_SATURATED
+    -63103: RetryPolicy(RetryAction.FAIL_FAST),  # DEVICE_NAME_EXCESSIVE
+    -52409: RetryPolicy(RetryAction.FAIL_FAST),  # SD_CARD_UNPLUGGED
+    -71114: RetryPolicy(RetryAction.FAIL_FAST),  # STORAGE_NOT_EXIST
+    -90404: RetryPolicy(RetryAction.FAIL_FAST),  # CAMERA_UPDATE_LOW_ENERGY
+    CONNECTION_ERROR: RetryPolicy(RetryAction.BACKOFF, clearSession=True),
+    CONNECTION_RESET: RetryPolicy(
+        RetryAction.BACKOFF, maxRetries=TRANSIENT_REQUEST_RETRIES
+    ),
+    INVALID_RESPONSE: RetryPolicy(RetryAction.REAUTH),
+    DECRYPT_ERROR: RetryPolicy(RetryAction.REAUTH),
+    TAG_ERROR: RetryPolicy(RetryAction.REAUTH),
+    AUTHENTICATION_ERROR: RetryPolicy(RetryAction.REAUTH),
+    REQUEST_REJECTED: RetryPolicy(RetryAction.FAIL_FAST),
+    DEADLINE_EXCEEDED: RetryPolicy(RetryAction.FAIL_FAST),
+    DEVICE_ERROR: RetryPolicy(RetryAction.REAUTH),
+    UNKNOWN_ERROR: RetryPolicy(RetryAction.REAUTH),
+}
+
+DEFAULT_RETRY_POLICY = RetryPolicy(RetryAction.FAIL_FAST)
+
+
+def getExceptionKey(err):
+    seen = set()
+    while err is not None and id(err) not in seen:
+        seen.add(id(err))
+        if isinstance(err, TapoTimeoutException):
+            return DEADLINE_EXCEEDED
+        # device is reachable, it just did not accept our handshake
+        if isinstance(err, (ssl.SSLError, requests.exceptions.SSLError)):
+            return UNKNOWN_ERROR
+        if isinstance(
+            err,
+            (
+                requests.ConnectionError,
+                requests.Timeout,
+                asyncio.TimeoutError,
+                ConnectionError,
+                OSError,
+            ),
+        ):
+            return CONNECTION_ERROR
+        # python-kasa connection errors do not inherit from OSError
+        if type(err).__name__ == "_ConnectionError":
+            return CONNECTION_ERROR
+        if type(err).__name__ == "AuthenticationError":
+            return AUTHENTICATION_ERROR
+        err = getattr(err, "__cause__", None) or getattr(err, "__context__", None)
+    return UNKNOWN_ERROR
+
+
+def normalizeErrorCode(errorCode):
+    try:
+        return int(errorCode)
+    except Exception:
+        return None
+
+
+class RetryPolicyEngine:
+    def __init__(self, policies=None):
+        self.policies = dict(RETRY_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self.counters = Counter()
+        self.keyCounters = Counter()
+        self._lock = threading.Lock()
+
+    def _normalizeKey(self, key):
+        code = normalizeErrorCode(key)
+        return key if code is None else code
+
+    def getPolicy(self, key, default=None):
+        key = self._normalizeKey(key)
+        if key in self.policies:
+            return self.policies[key]
+        return DEFAULT_RETRY_POLICY if default is None else default
+
+    def decide(self, key, attempt, serverDelay=None, default=None):
+        key = self._normalizeKey(key)
+        policy = self.getPolicy(key, default)
+        retry = policy.action != RetryAction.FAIL_FAST and attempt < policy.maxRetries
+        delay = policy.getDelay(attempt, serverDelay) if retry else 0
+        if retry:
+            action = policy.action
+        elif policy.action == RetryAction.FAIL_FAST:
+            action = RetryAction.FAIL_FAST
+        else:
+            action = "exhausted"
+        if (
+            retry
+            and policy.action == RetryAction.HONOUR_SERVER_DELAY
+            and delay > policy.maxDelay
+        ):
+            # not worth waiting for, let the caller know right away
+            retry = False
+            delay = 0
+            action = RetryAction.FAIL_FAST
+        with self._lock:
+            self.counters[action] += 1
+            self.keyCounters[(str(key), action)] += 1
+        return RetryDecision(key, action, retry, delay, policy.clearSession)
+
+    def getStatistics(self):
+        with self._lock:
+            keys = {}
+            for (key, action), count in self.keyCounters.items():
+                keys.setdefault(key, {})[action] = count
+            return {"actions": dict(self.counters), "keys": keys}
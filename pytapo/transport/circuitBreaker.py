@@ -0,0 +1,99 @@
+import math
+import threading
+import time
+
+from ..error import CircuitOpenException, TemporarySuspensionException
+from .const import (
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_OPEN_SECONDS,
+    CIRCUIT_MAX_OPEN_SECONDS,
+)
+
+_circuitBreakers = {}
+_circuitBreakersLock = threading.Lock()
+
+
+def getCircuitBreaker(key):
+    with _circuitBreakersLock:
+        if key not in _circuitBreakers:
+            _circuitBreakers[key] = CircuitBreaker(key)
+        return _circuitBreakers[key]
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        host,
+        failureThreshold=CIRCUIT_FAILURE_THRESHOLD,
+        openSeconds=CIRCUIT_OPEN_SECONDS,
+        maxOpenSeconds=CIRCUIT_MAX_OPEN_SECONDS,
+    ):
+        self.host = host
+        self.failureThreshold = failureThreshold
+        self.openSeconds = openSeconds
+        self.maxOpenSeconds = maxOpenSeconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.suspended = False
+        self._nextOpenSeconds = openSeconds
+        self._openUntil = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def secondsLeft(self):
+        return max(0, self._openUntil - time.monotonic())
+
+    # raises when the circuit is open, returns True if the caller is the probe
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return False
+            secondsLeft = self._openUntil - time.monotonic()
+            if secondsLeft <= 0 and not self._probing:
+                self.state = self.HALF_OPEN
+                self._probing = True
+                return True
+            secondsLeft = math.ceil(max(secondsLeft, 0))
+            if self.suspended:
+                raise TemporarySuspensionException(secondsLeft)
+            raise CircuitOpenException(self.host, secondsLeft)
+
+    def onSuccess(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.suspended = False
+            self._probing = False
+            self._nextOpenSeconds = self.openSeconds
+
+    def onConnectionFailure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failureThreshold:
+                self._open(self._nextOpenSeconds, False)
+                self._nextOpenSeconds = min(
+                    self.maxOpenSeconds, self._nextOpenSeconds * 2
+                )
+
+    def onSuspension(self, secondsLeft=None):
+        with self._lock:
+            self._open(
+                self.openSeconds if secondsLeft is None else secondsLeft,
+                True,
+            )
+
+    def releaseProbe(self):
+        with self._lock:
+            if self._probing:
+                self._probing = False
+                self.state = self.OPEN
+
+    def _open(self, seconds, suspended):
+        self.state = self.OPEN
+        self.suspended = suspended
+        self._probing = False
+        self._openUntil = time.monotonic() + seconds
@@ -1 +1,50 @@
 TRANSPORT_METHODS = ["kasa", "klap", "pytapo"]
+
+THROTTLE_ERROR_CODES = {
+    -40109,  # ONE_SECOND_REPEAT_REQUEST
+    -52405,  # TOO_MANY_REQUEST
+    -52407,  # TOO_MANY_CLIENT
+    -52419,  # TOO_MANY_HTTPS_CLIENT
+}
+
+# requests per second, shared by all Tapo instances talking to the same host
+RATE_LIMIT_INITIAL_RATE = 10
+RATE_LIMIT_MIN_RATE = 0.2
+RATE_LIMIT_MAX_RATE = 20
+RATE_LIMIT_BURST = 10
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_INCREASE = 0.1
+RATE_LIMIT_COOLDOWN_SECONDS = 1
+
+# consecutive connection failures after which requests to a host fail instantly
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_OPEN_SECONDS = 30
+CIRCUIT_MAX_OPEN_SECONDS = 300
+
+# device has no room for another session, pooled sessions are closed on these
+POOL_SHRINK_ERROR_CODES = {
+    -52407,  # TOO_MANY_CLIENT
+    -52419,  # TOO_MANY_HTTPS_CLIENT
+}
+
+# background keep alive, sessions are refreshed before the learned lifetime runs out
+KEEPALIVE_INTERVAL_SECONDS = 5
+KEEPALIVE_IDLE_SECONDS = 3
+KEEPALIVE_WARM_SECONDS = 45
+KEEPALIVE_SESSION_SECONDS = 1800
+KEEPALIVE_MIN_SESSION_SECONDS = 60
+KEEPALIVE_REFRESH_RATIO = 0.8
+KEEPALIVE_WARM_REQUEST = {
+    "method": "multipleRequest",
+    "params": {
+        "requests": [
+            {
+                "method": "getDeviceInfo",
+                "params": {"device_info": {"name": ["basic_info"]}},
+            }
+        ]
+    },
+}
+
+# threads for blocking calls of one transport, requests are serialized by its send lock
+TRANSPORT_EXECUTOR_WORKERS = 1
@@ -0,0 +1,82 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class TransportExecutor:
+    """
+    Bounded threads for the blocking calls of a single transport.
+
+    Keeps unreachable devices from filling the executor shared with the rest of the
+    application. Records how long calls waited for a free thread.
+    """
+
+    def __init__(self, maxWorkers, name):
+        self.maxWorkers = maxWorkers
+        self.name = name
+        self.calls = 0
+        self.queued = 0
+        self.running = 0
+        self.totalWait = 0
+        self.maxWait = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _getExecutor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.maxWorkers, thread_name_prefix=self.name
+                )
+            return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        # executor threads do not inherit context, deadline would be lost
+        context = contextvars.copy_context()
+        submitted = time.monotonic()
+        with self._lock:
+            self.queued += 1
+
+        def call():
+            wait = time.monotonic() - submitted
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+                self.calls += 1
+                self.totalWait += wait
+                self.maxWait = max(self.maxWait, wait)
+            try:
+                return context.run(func, *args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        future = self._getExecutor().submit(call)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancel():
+                # never started
+                with self._lock:
+                    self.queued -= 1
+            raise
+
+    def shutdown(self):
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def getStatistics(self):
+        with self._lock:
+            return {
+                "maxWorkers": self.maxWorkers,
+                "calls": self.calls,
+                "queued": self.queued,
+                "running": self.running,
+                "averageWait": self.totalWait / self.calls if self.calls else 0,
+                "maxWait": self.maxWait,
+            }
@@ -1,7 +1,11 @@
 import logging
+import re
 import ssl
 from contextlib import suppress
-from ...const import EncryptionMethod, MAX_LOGIN_RETRIES
+from ...const import EncryptionMethod
+from ...error import TemporarySuspensionException
+from ...deadline import asyncSleep
+from ...retryPolicy import AUTHENTICATION_ERROR, DEVICE_ERROR, getExceptionKey
 from kasa import Device, DeviceConfig, DeviceError, Discover, Credentials
 
 from kasa.deviceconfig import (
@@ -93,16 +97,9 @@ class Kasa:
             result = await proto.query(kasa_request)
         except AuthenticationError as err:
             self.debugLog(f"kasa query failed (auth): {err}")
-            if retry < MAX_LOGIN_RETRIES:
-                self.debugLog("Resetting transport and retrying request.")
-                reset = getattr(proto._transport, "reset", None)
-                if reset is not None:
-                    self.debugLog("Requesting reset.")
-                    await reset()
-                else:
-                    self.debugLog("Recreating connection.")
-                    await self.close()
-                return await self.send(request, retry + 1)
+            decision = self.retryPolicy.decide(AUTHENTICATION_ERROR, retry)
+            if decision.retry:
+                return await self._retryQuery(proto, request, retry, decision)
             await self.close()
             raise Exception("Invalid authentication data") from err
         except DeviceError as err:
@@ -117,17 +114,12 @@ class Kasa:
                     return raw_response
             if code == SmartErrorCode.DEVICE_BLOCKED:
                 await self.close()
-                raise Exception(f"Temporary Suspension: {str(err)}") from err
-            if retry < MAX_LOGIN_RETRIES:
-                self.debugLog("Resetting transport and retrying request.")
-                reset = getattr(proto._transport, "reset", None)
-                if reset is not None:
-                    self.debugLog("Requesting reset.")
-                    await reset()
-                else:
-                    self.debugLog("Recreating connection.")
-                    await self.close()
-                return await self.send(request, retry + 1)
+                raise self._suspensionException(err) from err
+            decision = self.retryPolicy.decide(
+                code, retry, default=self.retryPolicy.getPolicy(DEVICE_ERROR)
+            )
+            if decision.retry:
+                return await self._retryQuery(proto, request, retry, decision)
             await self.close()
             raise
         except Exception as err:
@@ -150,16 +142,9 @@ class Kasa:
                     )
                 self._kasa_ssl_fallback = True
                 self._apply_kasa_ssl_fallback_to_transport()
-            if retry < MAX_LOGIN_RETRIES:
-                self.debugLog("Resetting transport and retrying request.")
-                reset = getattr(proto._transport, "reset", None)
-                if reset is not None:
-                    self.debugLog("Requesting reset.")
-                    await reset()
-                else:
-                    self.debugLog("Recreating connection.")
-                    await self.close()
-                return await self.send(request, retry + 1)
+            decision = self.retryPolicy.decide(getExceptionKey(err), retry)
+            if decision.retry:
+                return await self._retryQuery(proto, request, retry, decision)
             await self.close()
             raise
         finally:
@@ -195,6 +180,20 @@ class Kasa:
         self.debugLog(f"Result: {converted}")
         return converted
 
+    async def _retryQuery(self, proto, request, retry, decision):
+        self.debugLog(
+            f"Resetting transport and retrying request ({decision.action}) in {decision.delay:.2f}s."
+        )
+        reset = getattr(proto._transport, "reset", None)
+        if reset is not None:
+            self.debugLog("Requesting reset.")
+            await reset()
+        else:
+            self.debugLog("Recreating connection.")
+            await self.close()
+        await asyncSleep(decision.delay, "retry backoff")
+        return await self.send(request, retry + 1)
+
     async def authenticate(self, retry=False):
         if self.dev is None:
             self.debugLog("Creating new Kasa-Tapo instance...")
@@ -309,9 +308,7 @@ class Kasa:
                             )
                             await self.close()
                             if code == SmartErrorCode.DEVICE_BLOCKED:
-                                raise Exception(
-                                    f"Temporary Suspension: {str(err)}"
-                                ) from err
+                                raise self._suspensionException(err) from err
                             raise
                         except Exception as err:
                             if dev is not None:
@@ -396,6 +393,14 @@ class Kasa:
         else:
             self.debugLog("kasa connection_type: <unavailable>")
 
+    def _suspensionException(self, err):
+        # python-kasa reports it as "Device blocked for N seconds"
+        match = re.search(r"(\d+) seconds", str(err))
+        return TemporarySuspensionException(
+            int(match.group(1)) if match else None,
+            f"Temporary Suspension: {str(err)}",
+        )
+
     def _is_kasa_ssl_handshake_failure(self, err):
         for ex in self._iter_exception_chain(err):
             msg = str(ex).lower()
@@ -508,6 +513,13 @@ class Kasa:
             )
         return SmartDevice(host=config.host, config=config, protocol=protocol)
 
+    def hasSession(self):
+        return self.dev is not None
+
+    async def refreshSession(self):
+        await self.close()
+        await self.authenticate()
+
     async def close(self):
         try:
             if self.dev and getattr(self.dev, "protocol", None):
@@ -0,0 +1,149 @@
+import time
+
+from .const import (
+    KEEPALIVE_INTERVAL_SECONDS,
+    KEEPALIVE_IDLE_SECONDS,
+    KEEPALIVE_WARM_SECONDS,
+    KEEPALIVE_SESSION_SECONDS,
+    KEEPALIVE_MIN_SESSION_SECONDS,
+    KEEPALIVE_REFRESH_RATIO,
+)
+
+
+class SessionKeepAlive:
+    """
+    Keeps the session of a transport usable while it is idle.
+
+    The session lifetime is learned from sessions the device expired, the session
+    is then refreshed shortly before the lifetime runs out. Idle connections are kept
+    open with a cheap request, so interactive calls do not pay for logging in or
+    connecting again.
+    """
+
+    REFRESH = "refresh"
+    WARM = "warm"
+
+    def __init__(
+        self,
+        transport,
+        warmRequest=None,
+        interval=KEEPALIVE_INTERVAL_SECONDS,
+        idle=KEEPALIVE_IDLE_SECONDS,
+        warmInterval=KEEPALIVE_WARM_SECONDS,
+        sessionLifetime=KEEPALIVE_SESSION_SECONDS,
+    ):
+        self.transport = transport
+        self.warmRequest = warmRequest
+        self.interval = interval
+        self.idle = idle
+        self.warmInterval = warmInterval
+        self.sessionLifetime = sessionLifetime
+        self.learnedLifetime = None
+        self.sessionStartedAt = None
+        self.lastActivity = time.monotonic()
+        self.sessions = 0
+        self.expiries = 0
+        self.refreshes = 0
+        self.warms = 0
+        self._loop = None
+        self._handle = None
+        self._stopped = True
+
+    def onSessionStarted(self):
+        self.sessionStartedAt = time.monotonic()
+        self.sessions += 1
+
+    def onActivity(self):
+        self.lastActivity = time.monotonic()
+
+    def onSessionExpired(self):
+        if self.sessionStartedAt is None:
+            return
+        age = max(
+            time.monotonic() - self.sessionStartedAt, KEEPALIVE_MIN_SESSION_SECONDS
+        )
+        self.sessionStartedAt = None
+        self.expiries += 1
+        if self.learnedLifetime is None or age < self.learnedLifetime:
+            self.learnedLifetime = age
+            self.sessionLifetime = age
+            self.transport.debugLog(f"Learned session lifetime of {age:.0f}s.")
+
+    def getAction(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if now - self.lastActivity < self.idle:
+            # never compete with requests in flight
+            return None
+        if not self.transport.hasSession():
+            # the session was dropped, log in again before it is needed
+            return self.REFRESH if self.sessions > 0 else None
+        if (
+            self.sessionStartedAt is not None
+            and now - self.sessionStartedAt
+            >= self.sessionLifetime * KEEPALIVE_REFRESH_RATIO
+        ):
+            return self.REFRESH
+        if (
+            self.warmRequest is not None
+            and now - self.lastActivity >= self.warmInterval
+        ):
+            return self.WARM
+        return None
+
+    async def step(self):
+        action = self.getAction()
+        if action == self.REFRESH:
+            self.transport.debugLog("Keep alive: refreshing session.")
+            self.refreshes += 1
+            await self.transport.refreshSession()
+        elif action == self.WARM:
+            self.transport.debugLog("Keep alive: warming connection.")
+            self.warms += 1
+            await self.transport.send(self.warmRequest)
+        return action
+
+    # runs on the loop of the transport, no thread per device
+    def start(self):
+        self._loop = self.transport.asyncHandler.getLoop()
+        self._stopped = False
+        self._loop.call_soon_threadsafe(self._schedule)
+
+    def stop(self):
+        self._stopped = True
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._cancel)
+
+    def _schedule(self):
+        if not self._stopped:
+            self._handle = self._loop.call_later(self.interval, self._tick)
+
+    def _cancel(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _tick(self):
+        self._handle = None
+        if self.getAction() is None:
+            self._schedule()
+        else:
+            self._loop.create_task(self._run())
+
+    async def _run(self):
+        try:
+            await self.step()
+        except Exception as err:
+            self.transport.debugLog(f"Keep alive failed: {err}")
+        finally:
+            self._schedule()
+
+    def getStatistics(self):
+        return {
+            "sessionLifetime": self.sessionLifetime,
+            "learnedLifetime": self.learnedLifetime,
+            "sessions": self.sessions,
+            "expiries": self.expiries,
+            "refreshes": self.refreshes,
+            "warms": self.warms,
+        }
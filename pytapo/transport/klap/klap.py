@@ -5,6 +5,8 @@ from kasa.exceptions import (
 from kasa import DeviceConfig, Credentials
 from kasa.transports import KlapTransportV2, KlapTransport
 from ...const import EncryptionMethod
+from ...deadline import asyncSleep
+from ...retryPolicy import RetryAction, REQUEST_REJECTED, getExceptionKey
 
 
 class Klap:
@@ -87,10 +89,15 @@ class Klap:
                 or "Response status is 400, Request was" in str(err)
                 or "Server disconnected" in str(err)
             ):
+                decision = self.retryPolicy.decide(REQUEST_REJECTED, retry)
+            else:
+                decision = self.retryPolicy.decide(getExceptionKey(err), retry)
+            if decision.action == RetryAction.FAIL_FAST:
                 raise Exception("PyTapo KLAP Error #6: " + str(err))
 
-            self.debugLog("Retrying request... Error: " + str(err))
-            if retry < 5:
+            if decision.retry:
+                self.debugLog("Retrying request... Error: " + str(err))
+                await asyncSleep(decision.delay, "retry backoff")
                 await self.authenticate()
                 return await self.send(request, retry + 1)
             else:
@@ -102,6 +109,19 @@ class Klap:
     def getEncryptionMethod():
         return EncryptionMethod.SHA256
 
+    def hasSession(self):
+        return self.klapTransport is not None
+
+    async def refreshSession(self):
+        transport = self.klapTransport
+        self.klapTransport = None
+        if transport is not None:
+            try:
+                await transport.close()
+            except Exception as err:
+                self.debugLog(f"Failed to close KLAP transport: {err}")
+        await self.authenticate()
+
     async def close(self):
         await self.klapTransport.close()
 
@@ -0,0 +1,204 @@
+import asyncio
+import threading
+
+from ..deadline import getDeadline
+from ..error import TapoTimeoutException
+from .const import POOL_SHRINK_ERROR_CODES
+from .rateLimiter import getThrottleErrorCode
+
+
+class PooledSession:
+    def __init__(self, transport, asyncHandler, primary=False):
+        self.transport = transport
+        self.asyncHandler = asyncHandler
+        self.primary = primary
+        self.busy = False
+        self.requests = 0
+
+    def close(self):
+        self.transport.shutdown()
+        return self.asyncHandler.executeAsyncExecutorJob(self.transport.close)
+
+    async def closeAsync(self):
+        self.transport.shutdown()
+        await self.transport.close()
+
+
+class TransportPool:
+    """
+    Independently authenticated sessions to a single device.
+
+    Every session has its own stok, keys and seq so requests can be in flight at the
+    same time. Sessions are opened on demand up to maxSize, the limit is lowered
+    whenever the device reports it has too many clients.
+    """
+
+    def __init__(self, primary, createSession, maxSize, logger):
+        self.createSession = createSession
+        self.maxSize = max(1, maxSize)
+        self.logger = logger
+        self.sessions = [primary]
+        self.waits = 0
+        self.shrinks = 0
+        self._condition = threading.Condition()
+        self._opening = 0
+        # futures of coroutines waiting in acquireAsync, woken like the condition
+        self._asyncWaiters = []
+
+    def acquire(self):
+        deadline = getDeadline()
+        create = False
+        with self._condition:
+            while True:
+                session, create = self._take()
+                if session is not None:
+                    return session
+                if create:
+                    break
+                self.waits += 1
+                if deadline is None:
+                    self._condition.wait()
+                else:
+                    remaining = deadline.remaining()
+                    if remaining <= 0:
+                        raise TapoTimeoutException(deadline.timeout, "session pool")
+                    self._condition.wait(remaining)
+        if create:
+            return self._open()
+
+    # waits on the event loop instead of blocking a thread
+    async def acquireAsync(self):
+        deadline = getDeadline()
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                session, create = self._take()
+                if session is not None:
+                    return session
+                if create:
+                    break
+                self.waits += 1
+                waiter = loop.create_future()
+                self._asyncWaiters.append(waiter)
+            try:
+                if deadline is None:
+                    await waiter
+                else:
+                    remaining = deadline.remaining()
+                    if remaining <= 0:
+                        raise TapoTimeoutException(deadline.timeout, "session pool")
+                    try:
+                        await asyncio.wait_for(waiter, remaining)
+                    except asyncio.TimeoutError:
+                        raise TapoTimeoutException(deadline.timeout, "session pool")
+            except BaseException:
+                with self._condition:
+                    if waiter in self._asyncWaiters:
+                        self._asyncWaiters.remove(waiter)
+                    else:
+                        # woken while giving up, pass it on
+                        self._notify()
+                raise
+        return self._open()
+
+    def _take(self):
+        session = next((s for s in self.sessions if not s.busy), None)
+        if session is not None:
+            session.busy = True
+            session.requests += 1
+            return session, False
+        if len(self.sessions) + self._opening < self.maxSize:
+            self._opening += 1
+            return None, True
+        return None, False
+
+    def _open(self):
+        try:
+            session = self.createSession()
+        except BaseException:
+            with self._condition:
+                self._opening -= 1
+                self._notify()
+            raise
+        session.busy = True
+        session.requests += 1
+        with self._condition:
+            self._opening -= 1
+            self.sessions.append(session)
+        self.logger.debugLog(
+            f"Opened pooled session {len(self.sessions)}/{self.maxSize}."
+        )
+        return session
+
+    # wakes one sync and one async waiter, the one losing the race waits again
+    def _notify(self):
+        self._condition.notify()
+        while self._asyncWaiters:
+            waiter = self._asyncWaiters.pop(0)
+            if not waiter.done():
+                waiter.get_loop().call_soon_threadsafe(_wake, waiter)
+                break
+
+    def release(self, session, response=None, err=None):
+        if self._release(session, response, err):
+            try:
+                session.close()
+            except Exception as closeErr:
+                self.logger.debugLog(f"Failed to close pooled session: {closeErr}")
+
+    async def releaseAsync(self, session, response=None, err=None):
+        if self._release(session, response, err):
+            try:
+                await session.closeAsync()
+            except Exception as closeErr:
+                self.logger.debugLog(f"Failed to close pooled session: {closeErr}")
+
+    # True when the session was dropped from the pool and has to be closed
+    def _release(self, session, response=None, err=None):
+        code = None
+        if err is not None:
+            code = getattr(err, "errorCode", None)
+        elif response is not None:
+            code = getThrottleErrorCode(response)
+        with self._condition:
+            session.busy = False
+            closeSession = False
+            if code in POOL_SHRINK_ERROR_CODES and len(self.sessions) > 1:
+                self.shrinks += 1
+                self.maxSize = max(1, len(self.sessions) - 1)
+                if not session.primary and session in self.sessions:
+                    self.sessions.remove(session)
+                    closeSession = True
+            self._notify()
+        if closeSession:
+            self.logger.debugLog(
+                f"Device reported too many clients ({code}), "
+                f"shrinking session pool to {self.maxSize}."
+            )
+        return closeSession
+
+    def close(self):
+        with self._condition:
+            sessions = [s for s in self.sessions if not s.primary]
+            self.sessions = [s for s in self.sessions if s.primary]
+        for session in sessions:
+            try:
+                session.close()
+            except Exception as err:
+                self.logger.debugLog(f"Failed to close pooled session: {err}")
+
+    def getStatistics(self):
+        with self._condition:
+            return {
+                "size": len(self.sessions),
+                "maxSize": self.maxSize,
+                "busy": sum(1 for s in self.sessions if s.busy),
+                "waits": self.waits,
+                "shrinks": self.shrinks,
+                "requests": [s.requests for s in self.sessions],
+            }
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
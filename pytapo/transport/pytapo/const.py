@@ -21,3 +21,20 @@ AUTH_ERROR_CODES = {
     1003,  # TRANSPORT_UNKNOWN_CREDENTIALS_ERROR
     -40412,  # HOMEKIT_LOGIN_FAIL
 }
+
+# base64 characters decrypted at a time, multiple of 64 so chunks end on AES blocks
+STREAM_DECODE_CHUNK_SIZE = 65536
+# smaller responses are decrypted and parsed at once, which is faster
+STREAM_DECODE_MIN_SIZE = 16 * 1024 * 1024
+# lists in decrypted responses that are parsed one element at a time
+STREAMED_LIST_KEYS = {
+    "responses",
+    "search_video_results",
+    "search_results",
+    "search_detection_list",
+}
+# lists whose elements are passed to the caller inside streamElements
+STREAMED_ELEMENT_KEYS = {
+    "search_video_results",
+    "search_detection_list",
+}
@@ -1,21 +1,24 @@
 import base64
-import asyncio
-import time
 import requests
 import json
 import hashlib
 import copy
-from ...const import EncryptionMethod, MAX_LOGIN_RETRIES, CONNECTION_TIMEOUT
+from ...const import EncryptionMethod, CONNECTION_TIMEOUT
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad, unpad
+from Crypto.Util.Padding import pad
 from .TlsAdapter import TlsAdapter
+from .streamDecode import decodeResponse
 from ...media_stream._utils import generate_nonce
 from ...asyncHandler import AsyncHandler
-from .const import (
-    RETRY_BACKOFF_SECONDS,
-    TRANSIENT_REQUEST_RETRIES,
-    RETRYABLE_ERROR_CODES,
-    AUTH_ERROR_CODES,
+from ...error import TemporarySuspensionException, ResponseException
+from ...deadline import sleep, asyncSleep, clampTimeout
+from ...retryPolicy import (
+    CONNECTION_ERROR,
+    CONNECTION_RESET,
+    INVALID_RESPONSE,
+    DECRYPT_ERROR,
+    TAG_ERROR,
+    DEVICE_ERROR,
 )
 
 # Todo: retry timeout errors?
@@ -72,10 +75,6 @@ class pyTapo:
         )
         self.session = False
         self.isSecureConnectionCached = None
-        self._send_lock = None
-        self._send_lock_loop = None
-        self._send_lock_owner = None
-        self._send_lock_depth = 0
 
     async def send(self, request, retry=0):
         self.debugLog(f"send called, retry: {retry}")
@@ -111,32 +110,40 @@ class pyTapo:
                         raise err
                 if not authValid:
                     return await self._retry_or_return(
-                        request, retry, "Auth invalid on getTag", None
+                        request, retry, "Auth invalid on getTag", None, TAG_ERROR
                     )
                 self.seq += 1
 
             try:
-                res = await self._requestAsync(
+                responseData = await self._run_blocking(
+                    self._requestJSON,
                     "POST",
                     url,
                     data=json.dumps(fullRequest),
                     headers=self.headers,
                     verify=False,
                 )
-                responseData = res.json()
             except requests.RequestException as err:
-                return await self._retry_on_exception(request, retry, err)
+                return await self._retry_on_exception(
+                    request, retry, err, CONNECTION_ERROR
+                )
             except ValueError as err:
-                return await self._retry_on_exception(request, retry, err)
+                return await self._retry_on_exception(
+                    request, retry, err, INVALID_RESPONSE
+                )
             if (
                 secure_connection
                 and "result" in responseData
                 and "response" in responseData["result"]
             ):
-                encryptedResponse = responseData["result"]["response"]
-                encryptedResponse = base64.b64decode(responseData["result"]["response"])
                 try:
-                    responseJSON = json.loads(self._decryptResponse(encryptedResponse))
+                    # decrypting large responses would stall other devices on the loop
+                    responseJSON = await self._run_blocking(
+                        decodeResponse,
+                        self.lsk,
+                        self.ivb,
+                        responseData["result"]["response"],
+                    )
                 except Exception as err:
                     if (
                         str(err) == "Padding is incorrect."
@@ -152,17 +159,24 @@ class pyTapo:
 
             if not authValid:
                 return await self._retry_or_return(
-                    request, retry, "Auth invalid during decrypt", responseJSON
+                    request,
+                    retry,
+                    "Auth invalid during decrypt",
+                    responseJSON,
+                    DECRYPT_ERROR,
                 )
-            if self._has_top_error_code(responseJSON, RETRYABLE_ERROR_CODES):
+            errorCode = self._get_top_error_code(responseJSON)
+            if errorCode:
                 return await self._retry_or_return(
-                    request, retry, "Retryable error code detected", responseJSON
+                    request,
+                    retry,
+                    f"Error code {errorCode} detected",
+                    responseJSON,
+                    errorCode,
                 )
-            if self._has_top_error_code(responseJSON, AUTH_ERROR_CODES):
-                self.debugLog("Authentication error code detected, clearing session.")
-                await self._clearSession()
 
-            self.debugLog(f"Raw response: {responseJSON}")
+            if self.isDebugEnabled():
+                self.debugLog(f"Raw response: {responseJSON}")
 
             return responseJSON
         finally:
@@ -171,12 +185,13 @@ class pyTapo:
     async def _requestAsync(self, method, url, **kwargs):
         return await self._run_blocking(self._request, method, url, **kwargs)
 
+    # parsed in the executor thread as well, off the loop
+    def _requestJSON(self, method, url, **kwargs):
+        return self._request(method, url, **kwargs).json()
+
+    # requests is blocking, keep the event loop free for other devices
     async def _run_blocking(self, func, *args, **kwargs):
-        if self.asyncHandler is None or self.asyncHandler.hass is None:
-            return func(*args, **kwargs)
-        return await self.asyncHandler.hass.async_add_executor_job(
-            lambda: func(*args, **kwargs)
-        )
+        return await self.executor.run(func, *args, **kwargs)
 
     async def authenticate(self, retry=False):
         await self._acquire_send_lock()
@@ -190,6 +205,18 @@ class pyTapo:
     def getEncryptionMethod(self):
         return self.passwordEncryptionMethod
 
+    def hasSession(self):
+        return bool(self.stok)
+
+    async def refreshSession(self):
+        await self._acquire_send_lock()
+        try:
+            # keep the http session, only the stok is renewed
+            self.stok = False
+            await self.authenticate()
+        finally:
+            await self._release_send_lock()
+
     async def close(self):
         await self._clearSession()
 
@@ -220,84 +247,64 @@ class pyTapo:
         except Exception:
             return None
 
-    def _ensure_send_lock(self):
-        loop = asyncio.get_running_loop()
-        if self._send_lock is None or self._send_lock_loop != loop:
-            self._send_lock = asyncio.Lock()
-            self._send_lock_loop = loop
-            self._send_lock_owner = None
-            self._send_lock_depth = 0
-        return self._send_lock
-
-    async def _acquire_send_lock(self):
-        lock = self._ensure_send_lock()
-        task = asyncio.current_task()
-        if self._send_lock_owner == task or (
-            task is None and self._send_lock_owner is None and self._send_lock_depth > 0
-        ):
-            self._send_lock_depth += 1
-            return
-        await lock.acquire()
-        self._send_lock_owner = task
-        self._send_lock_depth = 1
-
-    async def _release_send_lock(self):
-        task = asyncio.current_task()
-        if not (
-            self._send_lock_owner == task
-            or (
-                task is None
-                and self._send_lock_owner is None
-                and self._send_lock_depth > 0
-            )
-        ):
-            return
-        self._send_lock_depth -= 1
-        if self._send_lock_depth <= 0:
-            self._send_lock_owner = None
-            if self._send_lock is not None:
-                self._send_lock.release()
-
-    def _has_top_error_code(self, response, error_codes):
+    def _get_top_error_code(self, response):
         if not isinstance(response, dict):
-            return False
-        code = self._normalize_error_code(response.get("error_code"))
-        return code in error_codes if code is not None else False
+            return None
+        return self._normalize_error_code(response.get("error_code"))
 
-    async def _retry_or_return(self, request, retry, reason, response):
-        if retry >= MAX_LOGIN_RETRIES:
-            self.debugLog(
-                f"{reason}, giving up after {retry}/{MAX_LOGIN_RETRIES} retries."
-            )
+    def _get_server_delay(self, response):
+        if not isinstance(response, dict):
+            return None
+        for data in (response.get("data"), (response.get("result") or {}).get("data")):
+            if isinstance(data, dict) and "sec_left" in data:
+                return data["sec_left"]
+        return None
+
+    async def _retry_or_return(self, request, retry, reason, response, key):
+        decision = self.retryPolicy.decide(key, retry, self._get_server_delay(response))
+        if decision.clearSession:
+            if key in (-40401, DECRYPT_ERROR):
+                self.onSessionExpired()
+            await self._clearSession()
+        if not decision.retry:
+            self.debugLog(f"{reason}, not retrying ({decision.action}).")
             return response
         self.debugLog(f"Response: {response}")
         self.debugLog(
-            f"{reason}, clearing session and retrying: {retry + 1}/{MAX_LOGIN_RETRIES}"
+            f"{reason}, retrying ({decision.action}) in {decision.delay:.2f}s: {retry + 1}"
         )
-        await self._clearSession()
-        await asyncio.sleep(RETRY_BACKOFF_SECONDS)
+        await asyncSleep(decision.delay, "retry backoff")
         return await self.send(request, retry + 1)
 
-    async def _retry_on_exception(self, request, retry, err):
-        if retry >= MAX_LOGIN_RETRIES:
+    async def _retry_on_exception(self, request, retry, err, key):
+        decision = self.retryPolicy.decide(key, retry)
+        if not decision.retry:
             raise err
         self.debugLog(
-            f"Request failed ({err}), clearing session and retrying: {retry + 1}/{MAX_LOGIN_RETRIES}"
+            f"Request failed ({err}), retrying ({decision.action}) in {decision.delay:.2f}s: {retry + 1}"
         )
-        await self._clearSession()
-        await asyncio.sleep(RETRY_BACKOFF_SECONDS)
+        if decision.clearSession:
+            await self._clearSession()
+        await asyncSleep(decision.delay, "retry backoff")
         return await self.send(request, retry + 1)
 
+    def _retry_refresh_stok(self, key, loginRetryCount, reason, default=None):
+        decision = self.retryPolicy.decide(key, loginRetryCount, default=default)
+        if not decision.retry:
+            return False
+        self.debugLog(
+            f"{reason}, retrying ({decision.action}) in {decision.delay:.2f}s: {loginRetryCount + 1}."
+        )
+        if decision.clearSession:
+            self._clearSessionSync()
+        sleep(decision.delay, "login retry backoff")
+        return True
+
     def _encryptRequest(self, request):
         cipher = AES.new(self.lsk, AES.MODE_CBC, self.ivb)
         ct_bytes = cipher.encrypt(pad(request, AES.block_size))
         return ct_bytes
 
-    def _decryptResponse(self, response):
-        cipher = AES.new(self.lsk, AES.MODE_CBC, self.ivb)
-        pt = cipher.decrypt(response)
-        return unpad(pt, AES.block_size)
-
     def _getTag(self, request):
         tag = (
             hashlib.sha256(
@@ -348,64 +355,71 @@ class pyTapo:
             session = requests.session()
             session.mount("https://", TlsAdapter())
 
-        # Redaction of confidential data for logging purposes
-        redactedKwargs = copy.deepcopy(kwargs)
-        if self.redactConfidentialInformation:
-            if "data" in redactedKwargs:
-                redactedKwargsData = json.loads(redactedKwargs["data"])
-                if "params" in redactedKwargsData:
+        # logged copies are only built and parsed when debug logging is on
+        debugEnabled = self.isDebugEnabled()
+        if debugEnabled:
+            # Redaction of confidential data for logging purposes
+            redactedKwargs = copy.deepcopy(kwargs)
+            if self.redactConfidentialInformation:
+                if "data" in redactedKwargs:
+                    redactedKwargsData = json.loads(redactedKwargs["data"])
+                    if "params" in redactedKwargsData:
+                        if (
+                            "password" in redactedKwargsData["params"]
+                            and redactedKwargsData["params"]["password"] != ""
+                        ):
+                            redactedKwargsData["params"]["password"] = "REDACTED"
+                        if (
+                            "digest_passwd" in redactedKwargsData["params"]
+                            and redactedKwargsData["params"]["digest_passwd"] != ""
+                        ):
+                            redactedKwargsData["params"]["digest_passwd"] = "REDACTED"
+                        if (
+                            "cnonce" in redactedKwargsData["params"]
+                            and redactedKwargsData["params"]["cnonce"] != ""
+                        ):
+                            redactedKwargsData["params"]["cnonce"] = "REDACTED"
+                    redactedKwargs["data"] = redactedKwargsData
+                if "headers" in redactedKwargs:
+                    redactedKwargsHeaders = redactedKwargs["headers"]
                     if (
-                        "password" in redactedKwargsData["params"]
-                        and redactedKwargsData["params"]["password"] != ""
+                        "Tapo_tag" in redactedKwargsHeaders
+                        and redactedKwargsHeaders["Tapo_tag"] != ""
                     ):
-                        redactedKwargsData["params"]["password"] = "REDACTED"
+                        redactedKwargsHeaders["Tapo_tag"] = "REDACTED"
                     if (
-                        "digest_passwd" in redactedKwargsData["params"]
-                        and redactedKwargsData["params"]["digest_passwd"] != ""
+                        "Host" in redactedKwargsHeaders
+                        and redactedKwargsHeaders["Host"] != ""
                     ):
-                        redactedKwargsData["params"]["digest_passwd"] = "REDACTED"
+                        redactedKwargsHeaders["Host"] = "REDACTED"
                     if (
-                        "cnonce" in redactedKwargsData["params"]
-                        and redactedKwargsData["params"]["cnonce"] != ""
+                        "Referer" in redactedKwargsHeaders
+                        and redactedKwargsHeaders["Referer"] != ""
                     ):
-                        redactedKwargsData["params"]["cnonce"] = "REDACTED"
-                redactedKwargs["data"] = redactedKwargsData
-            if "headers" in redactedKwargs:
-                redactedKwargsHeaders = redactedKwargs["headers"]
-                if (
-                    "Tapo_tag" in redactedKwargsHeaders
-                    and redactedKwargsHeaders["Tapo_tag"] != ""
-                ):
-                    redactedKwargsHeaders["Tapo_tag"] = "REDACTED"
-                if (
-                    "Host" in redactedKwargsHeaders
-                    and redactedKwargsHeaders["Host"] != ""
-                ):
-                    redactedKwargsHeaders["Host"] = "REDACTED"
-                if (
-                    "Referer" in redactedKwargsHeaders
-                    and redactedKwargsHeaders["Referer"] != ""
-                ):
-                    redactedKwargsHeaders["Referer"] = "REDACTED"
-                redactedKwargs["headers"] = redactedKwargsHeaders
-        self.debugLog("New request:")
-        self.debugLog(redactedKwargs)
-        kwargs.setdefault("timeout", CONNECTION_TIMEOUT)
+                        redactedKwargsHeaders["Referer"] = "REDACTED"
+                    redactedKwargs["headers"] = redactedKwargsHeaders
+            self.debugLog("New request:")
+            self.debugLog(redactedKwargs)
+        kwargs["timeout"] = clampTimeout(
+            kwargs.get("timeout", CONNECTION_TIMEOUT), "HTTP request"
+        )
         try:
             response = session.request(method, url, **kwargs)
         except requests.RequestException as err:
             if self.reuseSession is False:
                 session.close()
-            if (
-                transientRetryCount < TRANSIENT_REQUEST_RETRIES
-                and self._isTransientConnectionReset(err)
-            ):
+            if self._isTransientConnectionReset(err):
+                decision = self.retryPolicy.decide(
+                    CONNECTION_RESET, transientRetryCount
+                )
+                if not decision.retry:
+                    raise
                 transientRetryCount += 1
                 self.debugLog(
-                    f"Transient connection error ({err}), retrying request: {transientRetryCount}/{TRANSIENT_REQUEST_RETRIES}."
+                    f"Transient connection error ({err}), retrying request: {transientRetryCount}."
                 )
                 self._resetHttpSession()
-                time.sleep(RETRY_BACKOFF_SECONDS)
+                sleep(decision.delay, "connection reset backoff")
                 return self._request(
                     method,
                     url,
@@ -414,35 +428,38 @@ class pyTapo:
                 )
             raise
         self.debugLog(f"Response status code: {response.status_code}")
-        try:
-            loadJson = json.loads(response.text)
-            if self.redactConfidentialInformation:
-                if "result" in loadJson:
-                    if (
-                        "stok" in loadJson["result"]
-                        and loadJson["result"]["stok"] != ""
-                    ):
-                        loadJson["result"]["stok"] = "REDACTED"
-                    if "data" in loadJson["result"]:
-                        if (
-                            "key" in loadJson["result"]["data"]
-                            and loadJson["result"]["data"]["key"] != ""
-                        ):
-                            loadJson["result"]["data"]["key"] = "REDACTED"
-                        if (
-                            "nonce" in loadJson["result"]["data"]
-                            and loadJson["result"]["data"]["nonce"] != ""
-                        ):
-                            loadJson["result"]["data"]["nonce"] = "REDACTED"
+        if debugEnabled:
+            try:
+                loadJson = json.loads(response.text)
+                if self.redactConfidentialInformation:
+                    if "result" in loadJson:
                         if (
-                            "device_confirm" in loadJson["result"]["data"]
-                            and loadJson["result"]["data"]["device_confirm"] != ""
+                            "stok" in loadJson["result"]
+                            and loadJson["result"]["stok"] != ""
                         ):
-                            loadJson["result"]["data"]["device_confirm"] = "REDACTED"
-            self.debugLog("Response:")
-            self.debugLog(loadJson)
-        except Exception as err:
-            self.debugLog("Failed to load json:" + str(err))
+                            loadJson["result"]["stok"] = "REDACTED"
+                        if "data" in loadJson["result"]:
+                            if (
+                                "key" in loadJson["result"]["data"]
+                                and loadJson["result"]["data"]["key"] != ""
+                            ):
+                                loadJson["result"]["data"]["key"] = "REDACTED"
+                            if (
+                                "nonce" in loadJson["result"]["data"]
+                                and loadJson["result"]["data"]["nonce"] != ""
+                            ):
+                                loadJson["result"]["data"]["nonce"] = "REDACTED"
+                            if (
+                                "device_confirm" in loadJson["result"]["data"]
+                                and loadJson["result"]["data"]["device_confirm"] != ""
+                            ):
+                                loadJson["result"]["data"][
+                                    "device_confirm"
+                                ] = "REDACTED"
+                self.debugLog("Response:")
+                self.debugLog(loadJson)
+            except Exception as err:
+                self.debugLog("Failed to load json:" + str(err))
 
         if self.reuseSession is False:
             response.close()
@@ -588,14 +605,16 @@ class pyTapo:
             )
             self.debugLog("Status code: " + str(res.status_code))
         except (requests.RequestException, ValueError) as err:
-            if loginRetryCount < MAX_LOGIN_RETRIES:
-                loginRetryCount += 1
-                self.debugLog(
-                    f"Request failed ({err}), retrying: {loginRetryCount}/{MAX_LOGIN_RETRIES}."
-                )
-                self._clearSessionSync()
-                time.sleep(RETRY_BACKOFF_SECONDS)
-                return self._refreshStok(loginRetryCount)
+            if self._retry_refresh_stok(
+                (
+                    CONNECTION_ERROR
+                    if isinstance(err, requests.RequestException)
+                    else INVALID_RESPONSE
+                ),
+                loginRetryCount,
+                f"Request failed ({err})",
+            ):
+                return self._refreshStok(loginRetryCount + 1)
             raise err
 
         if res.status_code == 401:
@@ -613,14 +632,12 @@ class pyTapo:
         try:
             responseData = res.json()
         except ValueError as err:
-            if loginRetryCount < MAX_LOGIN_RETRIES:
-                loginRetryCount += 1
-                self.debugLog(
-                    f"Invalid JSON response ({err}), retrying: {loginRetryCount}/{MAX_LOGIN_RETRIES}."
-                )
-                self._clearSessionSync()
-                time.sleep(RETRY_BACKOFF_SECONDS)
-                return self._refreshStok(loginRetryCount)
+            if self._retry_refresh_stok(
+                INVALID_RESPONSE,
+                loginRetryCount,
+                f"Invalid JSON response ({err})",
+            ):
+                return self._refreshStok(loginRetryCount + 1)
             raise err
         if self._isSecureConnection():
             self.debugLog("Processing secure response.")
@@ -668,14 +685,16 @@ class pyTapo:
                         )
                         responseData = res.json()
                     except (requests.RequestException, ValueError) as err:
-                        if loginRetryCount < MAX_LOGIN_RETRIES:
-                            loginRetryCount += 1
-                            self.debugLog(
-                                f"Request failed ({err}), retrying: {loginRetryCount}/{MAX_LOGIN_RETRIES}."
-                            )
-                            self._clearSessionSync()
-                            time.sleep(RETRY_BACKOFF_SECONDS)
-                            return self._refreshStok(loginRetryCount)
+                        if self._retry_refresh_stok(
+                            (
+                                CONNECTION_ERROR
+                                if isinstance(err, requests.RequestException)
+                                else INVALID_RESPONSE
+                            ),
+                            loginRetryCount,
+                            f"Request failed ({err})",
+                        ):
+                            return self._refreshStok(loginRetryCount + 1)
                         raise err
                     if (
                         "result" in responseData
@@ -702,13 +721,11 @@ class pyTapo:
                             "error_code" in responseData
                             and responseData["error_code"] == -40413
                         )
-                        and loginRetryCount < MAX_LOGIN_RETRIES
-                    ):
-                        loginRetryCount += 1
-                        self.debugLog(
-                            f"Incorrect device_confirm value, retrying: {loginRetryCount}/{MAX_LOGIN_RETRIES}."
+                        and self._retry_refresh_stok(
+                            -40413, loginRetryCount, "Incorrect device_confirm value"
                         )
-                        return self._refreshStok(loginRetryCount)
+                    ):
+                        return self._refreshStok(loginRetryCount + 1)
                     else:
                         self.debugLog(
                             "Incorrect device_confirm value, raising Exception."
@@ -724,8 +741,8 @@ class pyTapo:
             and "sec_left" in responseData["result"]["data"]
             and responseData["result"]["data"]["sec_left"] > 0
         ):
-            raise Exception(
-                f"Temporary Suspension: Try again in {str(responseData['result']['data']['sec_left'])} seconds"
+            raise TemporarySuspensionException(
+                responseData["result"]["data"]["sec_left"]
             )
         if (
             "data" in responseData
@@ -734,9 +751,7 @@ class pyTapo:
             and responseData["data"]["code"] == -40404
             and responseData["data"]["sec_left"] > 0
         ):
-            raise Exception(
-                f"Temporary Suspension: Try again in {str(responseData['data']['sec_left'])} seconds"
-            )
+            raise TemporarySuspensionException(responseData["data"]["sec_left"])
 
         if self._responseIsOK(res):
             self.debugLog("Saving stok.")
@@ -745,23 +760,21 @@ class pyTapo:
         error_code = (
             responseData.get("error_code") if isinstance(responseData, dict) else None
         )
-        if self.retryStok and loginRetryCount < MAX_LOGIN_RETRIES:
-            if error_code in RETRYABLE_ERROR_CODES or (
-                error_code is not None
-                and error_code not in AUTH_ERROR_CODES
-                and error_code != -40411
-            ):
-                loginRetryCount += 1
-                self.debugLog(
-                    f"Unexpected response ({error_code}), retrying: {loginRetryCount}/{MAX_LOGIN_RETRIES}."
-                )
-                self._clearSessionSync()
-                time.sleep(RETRY_BACKOFF_SECONDS)
-                return self._refreshStok(loginRetryCount)
+        if (
+            self.retryStok
+            and error_code is not None
+            and self._retry_refresh_stok(
+                error_code,
+                loginRetryCount,
+                f"Unexpected response ({error_code})",
+                self.retryPolicy.getPolicy(DEVICE_ERROR),
+            )
+        ):
+            return self._refreshStok(loginRetryCount + 1)
         self.debugLog(
             f"Unexpected response ({error_code}), raising Exception: {responseData}"
         )
-        raise Exception("Invalid authentication data")
+        raise ResponseException(error_code, responseData, "Invalid authentication data")
 
     def _getHostURL(self):
         return "https://{host}/stok={stok}/ds".format(
@@ -774,5 +787,8 @@ class pyTapo:
     def debugLog(self, msg: str):
         pass
 
+    def isDebugEnabled(self):
+        return False
+
     def warnLog(self, msg: str):
         pass
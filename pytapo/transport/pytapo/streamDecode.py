@@ -0,0 +1,253 @@
+import base64
+import codecs
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import unpad
+
+from .const import (
+    STREAM_DECODE_CHUNK_SIZE,
+    STREAM_DECODE_MIN_SIZE,
+    STREAMED_LIST_KEYS,
+    STREAMED_ELEMENT_KEYS,
+)
+
+# whole strings, the closing quote is missing when they continue in the next chunk
+_TOKEN = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)(")?|[{}\[\],:]', re.DOTALL)
+_SPACE = re.compile(r"\s*")
+# longer strings are never looked at as keys
+_MAX_KEY_LENGTH = 256
+# set while a caller takes list elements of responses as they are decoded
+_elementSink = ContextVar("pytapo_element_sink", default=None)
+
+
+@contextmanager
+def streamElements(onElement):
+    """
+    Passes elements of STREAMED_ELEMENT_KEYS lists of responses received inside
+    the block to onElement(key, element), the lists in the responses are empty.
+    """
+    token = _elementSink.set(onElement)
+    try:
+        yield
+    finally:
+        _elementSink.reset(token)
+
+
+def decodeResponse(lsk, ivb, encoded):
+    onElement = _elementSink.get()
+    if onElement is None and len(encoded) < STREAM_DECODE_MIN_SIZE:
+        # json.loads is faster, streaming only pays off for memory
+        cipher = AES.new(lsk, AES.MODE_CBC, ivb)
+        return json.loads(
+            unpad(cipher.decrypt(base64.b64decode(encoded)), AES.block_size)
+        )
+    if onElement is None:
+        return decodeChunks(decryptChunks(lsk, ivb, encoded))
+    return decodeChunks(
+        decryptChunks(lsk, ivb, encoded), STREAMED_ELEMENT_KEYS, onElement
+    )
+
+
+def decryptChunks(lsk, ivb, encoded, chunkSize=STREAM_DECODE_CHUNK_SIZE):
+    """
+    Yields the decrypted text of a base64 encoded securePassthrough response.
+
+    Base64 decoding, AES-CBC decryption and UTF-8 decoding are done chunk by chunk,
+    the last block is held back until the padding can be removed.
+    """
+    cipher = AES.new(lsk, AES.MODE_CBC, ivb)
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    held = b""
+    for start in range(0, len(encoded), chunkSize):
+        plain = held + cipher.decrypt(
+            base64.b64decode(encoded[start : start + chunkSize])
+        )
+        held = plain[-AES.block_size :]
+        yield decoder.decode(plain[: -AES.block_size])
+    yield decoder.decode(unpad(held, AES.block_size), final=True)
+
+
+class _Frame:
+    def __init__(self):
+        self.parts = []
+
+
+class StreamDecoder:
+    """
+    Incremental JSON decoder fed with text chunks.
+
+    Elements of lists stored under one of keys are parsed one at a time as soon
+    as they are complete, their text is dropped right after. Everything else is
+    small and parsed when the document is closed. With onElement, elements are
+    passed to it instead of being kept and their lists are left empty.
+
+    A streamed list is replaced by [list id] in the text parsed later. Every
+    list under one of keys in that text is such a placeholder, real ones were
+    all streamed, so they cannot be confused with values of the response.
+    """
+
+    def __init__(self, keys=STREAMED_LIST_KEYS, onElement=None):
+        self.keys = keys
+        self.onElement = onElement
+        self._nested = re.compile(
+            '"(?:' + "|".join(re.escape(key) for key in keys) + r')"\s*:\s*\['
+        )
+        # keys repeated in every element are shared, like json.loads does for one call
+        self._memo = {}
+        self._decoder = json.JSONDecoder(object_pairs_hook=self._makeObject)
+        self._frameDecoder = json.JSONDecoder(object_pairs_hook=self._makeFrameObject)
+        self._frames = [_Frame()]
+        # open streamed lists: (list id, key, depth of their elements)
+        self._open = []
+        self._lists = {}
+        self._depth = 0
+        self._lastString = None
+        self._key = None
+        self._afterColon = False
+        self._elementStart = False
+        self._rest = ""
+
+    def feed(self, text):
+        buffer = self._rest + text
+        self._rest = ""
+        start = 0
+        position = 0
+        while True:
+            if self._elementStart:
+                position = start = self._readElements(buffer, position)
+                if self._elementStart:
+                    break
+                continue
+            match = _TOKEN.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            token = match.group()
+            if token[0] == '"':
+                if match.group(2) is None:
+                    # string continues in the next chunk
+                    self._rest = buffer[match.start() :]
+                    position = match.start()
+                    break
+                position = match.end()
+                if match.end() - match.start() > _MAX_KEY_LENGTH:
+                    self._lastString = None
+                elif "\\" in match.group(1):
+                    self._lastString = json.loads(match.group())
+                else:
+                    self._lastString = match.group(1)
+                self._afterColon = False
+                continue
+            position = match.end()
+            if token == ":":
+                self._afterColon = True
+                self._key = self._lastString
+            elif token == "[" and self._afterColon and self._key in self.keys:
+                self._frames[-1].parts.append(buffer[start : match.start()])
+                self._openList()
+                start = position
+            elif token in "{[":
+                self._depth += 1
+                self._afterColon = False
+            elif self._open and self._depth == self._open[-1][2] and token in ",]":
+                self._frames[-1].parts.append(buffer[start : match.start()])
+                self._finishElement()
+                if token == "]":
+                    self._closeList()
+                else:
+                    self._elementStart = True
+                start = position
+            else:
+                if token in "}]":
+                    self._depth -= 1
+                self._afterColon = False
+        self._frames[-1].parts.append(buffer[start:position])
+
+    # complete elements are parsed straight from the buffer, the rest is scanned
+    def _readElements(self, buffer, position):
+        while True:
+            position = _SPACE.match(buffer, position).end()
+            if position == len(buffer):
+                return position
+            if buffer[position] == "]":
+                self._closeList()
+                return position + 1
+            try:
+                element, end = self._decoder.raw_decode(buffer, position)
+            except ValueError:
+                break
+            separator = _SPACE.match(buffer, end).end()
+            if (
+                separator == len(buffer)
+                or buffer[separator] not in ",]"
+                or self._nested.search(buffer, position, end)
+            ):
+                break
+            self._addElement(element)
+            position = separator + 1
+            if buffer[separator] == "]":
+                self._closeList()
+                return position
+        self._elementStart = False
+        return position
+
+    def _makeObject(self, pairs):
+        memo = self._memo
+        return {memo.setdefault(key, key): value for key, value in pairs}
+
+    def _makeFrameObject(self, pairs):
+        memo = self._memo
+        data = {}
+        for key, value in pairs:
+            if key in self.keys and isinstance(value, list):
+                value = self._lists.pop(value[0])
+            data[memo.setdefault(key, key)] = value
+        return data
+
+    def _openList(self):
+        listID = len(self._lists)
+        self._lists[listID] = []
+        self._frames[-1].parts.append(f"[{listID}]")
+        self._depth += 1
+        self._afterColon = False
+        self._elementStart = True
+        self._open.append((listID, self._key, self._depth))
+        self._frames.append(_Frame())
+
+    def _finishElement(self):
+        frame = self._frames.pop()
+        self._frames.append(_Frame())
+        text = "".join(frame.parts)
+        if not text.strip():
+            return
+        self._addElement(self._frameDecoder.decode(text))
+
+    def _addElement(self, element):
+        listID, key, _ = self._open[-1]
+        if self.onElement is not None:
+            self.onElement(key, element)
+        else:
+            self._lists[listID].append(element)
+
+    def _closeList(self):
+        self._frames.pop()
+        self._open.pop()
+        self._depth -= 1
+        self._afterColon = False
+        self._elementStart = False
+
+    def close(self):
+        if self._rest or self._open or self._depth:
+            raise ValueError("Incomplete JSON document.")
+        return self._frameDecoder.decode("".join(self._frames[0].parts))
+
+
+def decodeChunks(chunks, keys=STREAMED_LIST_KEYS, onElement=None):
+    decoder = StreamDecoder(keys, onElement)
+    for chunk in chunks:
+        decoder.feed(chunk)
+    return decoder.close()
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+
+from .const import (
+    THROTTLE_ERROR_CODES,
+    RATE_LIMIT_INITIAL_RATE,
+    RATE_LIMIT_MIN_RATE,
+    RATE_LIMIT_MAX_RATE,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_DECREASE_FACTOR,
+    RATE_LIMIT_INCREASE,
+    RATE_LIMIT_COOLDOWN_SECONDS,
+)
+
+_rateLimiters = {}
+_rateLimitersLock = threading.Lock()
+
+
+def getRateLimiter(key):
+    with _rateLimitersLock:
+        if key not in _rateLimiters:
+            _rateLimiters[key] = RateLimiter()
+        return _rateLimiters[key]
+
+
+def getThrottleErrorCode(response):
+    if not isinstance(response, dict):
+        return None
+    codes = [response.get("error_code")]
+    result = response.get("result")
+    if isinstance(result, dict) and isinstance(result.get("responses"), list):
+        codes.extend(
+            item.get("error_code")
+            for item in result["responses"]
+            if isinstance(item, dict)
+        )
+    for code in codes:
+        try:
+            code = int(code)
+        except Exception:
+            continue
+        if code in THROTTLE_ERROR_CODES:
+            return code
+    return None
+
+
+class RateLimiter:
+    """
+    Token bucket with additive increase and multiplicative decrease of its rate.
+
+    Thread safe, so a single limiter can be shared by transports running on different
+    event loops. Tokens are reserved ahead of time and callers sleep until their
+    token becomes available.
+    """
+
+    def __init__(
+        self,
+        rate=RATE_LIMIT_INITIAL_RATE,
+        minRate=RATE_LIMIT_MIN_RATE,
+        maxRate=RATE_LIMIT_MAX_RATE,
+        burst=RATE_LIMIT_BURST,
+    ):
+        self.rate = rate
+        self.minRate = minRate
+        self.maxRate = maxRate
+        self.maxBurst = burst
+        self.burst = min(burst, max(1, rate))
+        self.tokens = self.burst
+        self.throttledCount = 0
+        self._updatedAt = time.monotonic()
+        self._decreasedAt = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updatedAt) * self.rate
+            )
+            self._updatedAt = now
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+    def onThrottle(self):
+        with self._lock:
+            self.throttledCount += 1
+            now = time.monotonic()
+            # one response from the device can be observed by several queued requests
+            if now - self._decreasedAt < RATE_LIMIT_COOLDOWN_SECONDS:
+                return False
+            self._decreasedAt = now
+            self.rate = max(self.minRate, self.rate * RATE_LIMIT_DECREASE_FACTOR)
+            self.burst = min(self.maxBurst, max(1, self.rate))
+            self.tokens = min(self.tokens, 0)
+            return True
+
+    def onSuccess(self):
+        with self._lock:
+            self.rate = min(self.maxRate, self.rate + RATE_LIMIT_INCREASE)
+            self.burst = min(self.maxBurst, max(1, self.rate))
+
+    def observe(self, response):
+        code = getThrottleErrorCode(response)
+        if code is None:
+            self.onSuccess()
+        else:
+            self.onThrottle()
+        return code
+
+    def observeException(self, err):
+        # ResponseException has errorCode, errors of other libraries error_code
+        code = getattr(err, "errorCode", getattr(err, "error_code", None))
+        try:
+            code = int(code)
+        except Exception:
+            return None
+        if code in THROTTLE_ERROR_CODES:
+            self.onThrottle()
+            return code
+        return None
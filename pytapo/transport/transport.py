@@ -2,14 +2,29 @@ import ssl
 import asyncio
 import hashlib
 import inspect
+from contextvars import ContextVar
 from .kasa.kasa import Kasa
 from .klap.klap import Klap
 from .pytapo.pytapo import pyTapo
-from .const import TRANSPORT_METHODS
+from .const import (
+    TRANSPORT_METHODS,
+    KEEPALIVE_WARM_REQUEST,
+    TRANSPORT_EXECUTOR_WORKERS,
+)
+from .executor import TransportExecutor
+from .keepAlive import SessionKeepAlive
+from .rateLimiter import getRateLimiter
+from .circuitBreaker import getCircuitBreaker
 from ..logger import Logger
+from ..error import TemporarySuspensionException, TapoTimeoutException
+from ..deadline import waitFor
+from ..retryPolicy import RetryPolicyEngine, getExceptionKey, CONNECTION_ERROR
 from contextlib import suppress
 from typing import Any
 
+# set while a call is guarded by the circuit breaker, so internal retries are not counted twice
+_circuitBreakerActive = ContextVar("pytapo_circuit_breaker_active", default=False)
+
 
 class Transport(Kasa, Klap, pyTapo):
 
@@ -21,6 +36,10 @@ class Transport(Kasa, Klap, pyTapo):
         password: str,
         logger: Logger,
         method="kasa",
+        rateLimit=True,
+        circuitBreaker=True,
+        retryPolicy: RetryPolicyEngine = None,
+        keepAlive=False,
         **kwargs: Any,
     ):
         if method not in TRANSPORT_METHODS:
@@ -29,6 +48,26 @@ class Transport(Kasa, Klap, pyTapo):
         self.method = method
         self.host = host
         self.controlPort = controlPort
+        self.asyncHandler = kwargs.get("asyncHandler")
+        self.keepAlive = None
+        self.executor = TransportExecutor(
+            TRANSPORT_EXECUTOR_WORKERS, f"pytapo-{host}:{controlPort}"
+        )
+        # reentrant per task, requests of all backends to one session are serialized
+        self._send_lock = None
+        self._send_lock_loop = None
+        self._send_lock_owner = None
+        self._send_lock_depth = 0
+        self.rateLimiter = (
+            getRateLimiter(f"{host}:{controlPort}") if rateLimit else None
+        )
+        self.circuitBreaker = (
+            getCircuitBreaker(f"{host}:{controlPort}") if circuitBreaker else None
+        )
+
+        self.retryPolicy = (
+            retryPolicy if retryPolicy is not None else RetryPolicyEngine()
+        )
 
         backend_cls = {"kasa": Kasa, "klap": Klap, "pytapo": pyTapo}[self.method]
         self.transport = backend_cls
@@ -39,11 +78,167 @@ class Transport(Kasa, Klap, pyTapo):
 
         backend_cls.__init__(self, host, controlPort, user, password, **allowed)
 
+        if keepAlive:
+            # klap connections are closed after every request, nothing to keep warm
+            self.keepAlive = SessionKeepAlive(
+                self, None if method == "klap" else KEEPALIVE_WARM_REQUEST
+            )
+            self.keepAlive.start()
+
     async def authenticate(self, retry=False):
-        return await self.transport.authenticate(self, retry)
+        hadSession = self.keepAlive is not None and self.hasSession()
+        result = await waitFor(
+            self._guardCircuit(self._authenticateLocked, retry), "authentication"
+        )
+        if self.keepAlive is not None and not hadSession and self.hasSession():
+            self.keepAlive.onSessionStarted()
+        return result
 
     async def send(self, request, retry=0):
-        return await self.transport.send(self, request, retry)
+        if self.keepAlive is not None:
+            self.keepAlive.onActivity()
+        try:
+            return await waitFor(
+                self._guardCircuit(self._sendLocked, request, retry), "request"
+            )
+        finally:
+            if self.keepAlive is not None:
+                self.keepAlive.onActivity()
+
+    def hasSession(self):
+        return self.transport.hasSession(self)
+
+    async def refreshSession(self):
+        await self.transport.refreshSession(self)
+
+    # device rejected the session, the keep alive learns its lifetime from this
+    def onSessionExpired(self):
+        if self.keepAlive is not None:
+            self.keepAlive.onSessionExpired()
+
+    # stops background work, the transport can still be used afterwards
+    def shutdown(self):
+        if self.keepAlive is not None:
+            self.keepAlive.stop()
+        self.executor.shutdown()
+
+    def getExecutorStatistics(self):
+        return self.executor.getStatistics()
+
+    async def _authenticateLocked(self, retry=False):
+        await self._acquire_send_lock()
+        try:
+            return await self.transport.authenticate(self, retry)
+        finally:
+            await self._release_send_lock()
+
+    async def _sendLocked(self, request, retry=0):
+        await self._acquire_send_lock()
+        try:
+            return await self._sendRateLimited(request, retry)
+        finally:
+            await self._release_send_lock()
+
+    def _ensure_send_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._send_lock is None or self._send_lock_loop != loop:
+            self._send_lock = asyncio.Lock()
+            self._send_lock_loop = loop
+            self._send_lock_owner = None
+            self._send_lock_depth = 0
+        return self._send_lock
+
+    async def _acquire_send_lock(self):
+        lock = self._ensure_send_lock()
+        task = asyncio.current_task()
+        if self._send_lock_owner == task or (
+            task is None and self._send_lock_owner is None and self._send_lock_depth > 0
+        ):
+            self._send_lock_depth += 1
+            return
+        await lock.acquire()
+        self._send_lock_owner = task
+        self._send_lock_depth = 1
+
+    async def _release_send_lock(self):
+        task = asyncio.current_task()
+        if not (
+            self._send_lock_owner == task
+            or (
+                task is None
+                and self._send_lock_owner is None
+                and self._send_lock_depth > 0
+            )
+        ):
+            return
+        self._send_lock_depth -= 1
+        if self._send_lock_depth <= 0:
+            self._send_lock_owner = None
+            if self._send_lock is not None:
+                self._send_lock.release()
+
+    async def _guardCircuit(self, job, *args):
+        if self.circuitBreaker is None or _circuitBreakerActive.get():
+            return await job(*args)
+        isProbe = self.circuitBreaker.allow()
+        if isProbe:
+            self.debugLog(f"Circuit half open, probing {self.host}.")
+        token = _circuitBreakerActive.set(True)
+        try:
+            result = await job(*args)
+        except TemporarySuspensionException as err:
+            self.circuitBreaker.onSuspension(err.secondsLeft)
+            raise
+        except TapoTimeoutException:
+            # caller ran out of time, says nothing about the device
+            self.circuitBreaker.releaseProbe()
+            raise
+        except Exception as err:
+            if self._isConnectionFailure(err):
+                self.circuitBreaker.onConnectionFailure()
+                if self.circuitBreaker.state == self.circuitBreaker.OPEN:
+                    self.warnLog(
+                        f"{self.host} is unreachable, failing requests instantly for "
+                        f"{round(self.circuitBreaker.secondsLeft())} seconds."
+                    )
+            else:
+                # device answered, it is reachable
+                self.circuitBreaker.onSuccess()
+            raise
+        except BaseException:
+            self.circuitBreaker.releaseProbe()
+            raise
+        finally:
+            _circuitBreakerActive.reset(token)
+        self.circuitBreaker.onSuccess()
+        return result
+
+    def _isConnectionFailure(self, err):
+        return getExceptionKey(err) == CONNECTION_ERROR
+
+    async def _sendRateLimited(self, request, retry=0):
+        if self.rateLimiter is None:
+            return await self.transport.send(self, request, retry)
+        delay = await self.rateLimiter.acquire()
+        if delay > 0:
+            self.debugLog(f"Rate limited, waited {delay:.2f}s before sending.")
+        try:
+            response = await self.transport.send(self, request, retry)
+        except Exception as err:
+            code = self.rateLimiter.observeException(err)
+            if code is not None:
+                self._logThrottle(code)
+            raise
+        code = self.rateLimiter.observe(response)
+        if code is not None:
+            self._logThrottle(code)
+        return response
+
+    def _logThrottle(self, code):
+        self.debugLog(
+            f"Device throttled request ({code}), "
+            f"rate limit is now {self.rateLimiter.rate:.2f} requests/s."
+        )
 
     def getEncryptionMethod(self):
         return self.transport.getEncryptionMethod(self)
@@ -54,6 +249,9 @@ class Transport(Kasa, Klap, pyTapo):
     def debugLog(self, msg):
         self.logger.debugLog(msg)
 
+    def isDebugEnabled(self):
+        return self.logger.isDebugEnabled()
+
     def warnLog(self, msg):
         self.logger.warnLog(msg)
 
@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError
+
+from .const import (
+    USER_ID_POOL_SIZE,
+    USER_ID_POOL_PROBE_SECONDS,
+    USER_ID_FULL_ERROR_CODES,
+    USER_ID_EXPIRED_ERROR_CODES,
+)
+from .error import TapoTimeoutException
+from .futures import getSubmitExecutor
+
+
+class UserIDLease:
+    """
+    User ID borrowed from a UserIDPool for one playback or search session.
+
+    Works with both with and async with. Call expire or expireOnError when the
+    device rejected the ID (-71103, -71105), it is then dropped instead of being
+    returned.
+    """
+
+    def __init__(self, pool, timeout=None):
+        self.pool = pool
+        self.timeout = timeout
+        self.userID = None
+        self.expired = False
+
+    def expire(self):
+        self.expired = True
+
+    def expireOnError(self, response):
+        if not isinstance(response, dict):
+            return self.expired
+        errorCode = response.get("error_code")
+        if errorCode is None and isinstance(response.get("params"), dict):
+            errorCode = response["params"].get("error_code")
+        if errorCode in USER_ID_EXPIRED_ERROR_CODES:
+            self.expire()
+        return self.expired
+
+    def __enter__(self):
+        self.userID = self.pool.acquire(self.timeout)
+        return self
+
+    def __exit__(self, *exc):
+        self._return()
+
+    async def __aenter__(self):
+        self.userID = await self.pool.acquireAsync(self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._return()
+
+    def _return(self):
+        if self.expired:
+            self.pool.discard(self.userID)
+        else:
+            self.pool.release(self.userID)
+        self.userID = None
+
+
+class UserIDPool:
+    """
+    User IDs of one device shared by concurrent playback sessions.
+
+    New IDs are requested from the device until maxSize is reached or the device
+    reports it has no free ID, the pool then shrinks to the number of IDs it holds
+    and tries to grow again after USER_ID_POOL_PROBE_SECONDS. Callers waiting for
+    an ID are served in the order they asked.
+    """
+
+    def __init__(self, tapo, maxSize=USER_ID_POOL_SIZE):
+        self.tapo = tapo
+        self.maxSize = maxSize
+        self.limit = maxSize
+        self._lock = threading.Lock()
+        self._idle = []
+        self._leased = 0
+        self._creating = 0
+        self._waiters = deque()
+        self._limitedAt = None
+        self.statistics = {"created": 0, "discarded": 0, "waited": 0, "full": 0}
+
+    def lease(self, timeout=None):
+        return UserIDLease(self, timeout)
+
+    def acquire(self, timeout=None):
+        future = self._enqueue()
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            self._abandon(future)
+            raise TapoTimeoutException(timeout, "user ID lease")
+
+    async def acquireAsync(self, timeout=None):
+        future = self._enqueue()
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)), timeout
+            )
+        except asyncio.TimeoutError:
+            self._abandon(future)
+            raise TapoTimeoutException(timeout, "user ID lease")
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+    def release(self, userID):
+        with self._lock:
+            self._leased -= 1
+            self._idle.append(userID)
+            self._dispatch()
+
+    def discard(self, userID):
+        with self._lock:
+            self._leased -= 1
+            self.statistics["discarded"] += 1
+            self._dispatch()
+
+    def getStatistics(self):
+        with self._lock:
+            return {
+                **self.statistics,
+                "limit": self.limit,
+                "idle": len(self._idle),
+                "leased": self._leased,
+                "waiting": len(self._waiters),
+            }
+
+    def _enqueue(self):
+        future = Future()
+        with self._lock:
+            self._waiters.append(future)
+            self._dispatch()
+            if not future.done():
+                self.statistics["waited"] += 1
+        return future
+
+    # caller gave up, an ID handed to it in the meantime goes back to the pool
+    def _abandon(self, future):
+        if not future.cancel():
+            future.add_done_callback(self._releaseResult)
+        with self._lock:
+            self._dispatch()
+
+    def _releaseResult(self, future):
+        if not future.cancelled() and future.exception() is None:
+            self.release(future.result())
+
+    def _count(self):
+        return self._leased + len(self._idle) + self._creating
+
+    def _dispatch(self):
+        if (
+            self._limitedAt is not None
+            and self.limit < self.maxSize
+            and time.monotonic() - self._limitedAt > USER_ID_POOL_PROBE_SECONDS
+        ):
+            self.limit += 1
+            self._limitedAt = None
+        while self._waiters:
+            if self._waiters[0].cancelled():
+                self._waiters.popleft()
+                continue
+            if self._idle:
+                future = self._waiters.popleft()
+                if future.set_running_or_notify_cancel():
+                    self._leased += 1
+                    future.set_result(self._idle.pop())
+            elif self._count() < self.limit:
+                future = self._waiters.popleft()
+                self._creating += 1
+                getSubmitExecutor().submit(self._create, future)
+            else:
+                break
+
+    def _create(self, future):
+        try:
+            userID = self.tapo.requestUserID()
+        except Exception as err:
+            with self._lock:
+                self._creating -= 1
+                if (
+                    getattr(err, "errorCode", None) in USER_ID_FULL_ERROR_CODES
+                    and self._leased + len(self._idle) > 0
+                ):
+                    # device limit reached, wait for one of the IDs already held
+                    self.statistics["full"] += 1
+                    self.limit = self._leased + len(self._idle)
+                    self._limitedAt = time.monotonic()
+                    self._waiters.appendleft(future)
+                    self._dispatch()
+                    return
+                self._dispatch()
+            if future.set_running_or_notify_cancel():
+                future.set_exception(err)
+            return
+        with self._lock:
+            self._creating -= 1
+            self.statistics["created"] += 1
+            if future.set_running_or_notify_cancel():
+                self._leased += 1
+                future.set_result(userID)
+            else:
+                self._idle.append(userID)
+            self._dispatch()
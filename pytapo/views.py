@@ -0,0 +1,244 @@
+import sys
+
+
+def isOn(value):
+    return value == "on"
+
+
+def isNotOff(value):
+    return value != "off"
+
+
+def toInt(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Field:
+    """
+    Read only attribute of a view, decoded from the raw response on first access.
+
+    The decoded value is kept in the slot named like the field with a leading
+    underscore, which every view class declares in its __slots__.
+    """
+
+    def __init__(self, path, decode=None):
+        self.path = tuple(
+            sys.intern(key) if isinstance(key, str) else key for key in path
+        )
+        self.decode = decode
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = owner.__dict__["_" + name]
+
+    def __get__(self, view, owner=None):
+        if view is None:
+            return self
+        try:
+            return self.slot.__get__(view, owner)
+        except AttributeError:
+            value = view._read(self.path)
+            if value is not None and self.decode is not None:
+                value = self.decode(value)
+            self.slot.__set__(view, value)
+            view._pending -= 1
+            if view._pending == 0:
+                view._node = None
+            return value
+
+    def __set__(self, view, value):
+        raise AttributeError(f"{self.name} is read only.")
+
+
+class ResponseView:
+    """
+    Typed read only view over a part of a raw device response.
+
+    Missing values are returned as None. The response is released once every field
+    has been decoded, so a fully read view keeps only its decoded values. Until then
+    both are held, views that are read once in full cost more than the dict alone,
+    and raw is None afterwards.
+    """
+
+    __slots__ = ("_node", "_pending")
+    _fieldCount = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fieldCount = sum(
+            isinstance(value, Field)
+            for base in cls.__mro__
+            for value in vars(base).values()
+        )
+
+    def __init__(self, node):
+        self._node = node
+        self._pending = self._fieldCount
+
+    def _read(self, path):
+        node = self._node
+        for key in path:
+            if isinstance(node, dict):
+                node = node.get(key)
+            elif isinstance(node, list) and isinstance(key, int) and key < len(node):
+                node = node[key]
+            else:
+                return None
+            if node is None or node is False:
+                return None
+        return node
+
+    @property
+    def raw(self):
+        return self._node
+
+    def asDict(self):
+        return {
+            name: getattr(self, name)
+            for cls in reversed(type(self).__mro__)
+            for name, value in vars(cls).items()
+            if isinstance(value, Field)
+        }
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.asDict()})"
+
+
+class DetectionView(ResponseView):
+    __slots__ = ("_enabled", "_sensitivity", "_digitalSensitivity")
+
+    enabled = Field(("enabled",), isOn)
+    sensitivity = Field(("sensitivity",))
+    digitalSensitivity = Field(("digital_sensitivity",), toInt)
+
+
+class LEDView(ResponseView):
+    __slots__ = ("_enabled",)
+
+    enabled = Field(("enabled",), isOn)
+
+
+class PrivacyModeView(ResponseView):
+    __slots__ = ("_enabled",)
+
+    enabled = Field(("enabled",), isOn)
+
+
+class SDCardView(ResponseView):
+    __slots__ = (
+        "_status",
+        "_detectStatus",
+        "_type",
+        "_totalSpace",
+        "_freeSpace",
+        "_videoTotalSpace",
+        "_videoFreeSpace",
+        "_recordDuration",
+        "_writeProtect",
+    )
+
+    status = Field(("status",))
+    detectStatus = Field(("detect_status",))
+    type = Field(("type",))
+    totalSpace = Field(("total_space",))
+    freeSpace = Field(("free_space",))
+    videoTotalSpace = Field(("video_total_space",))
+    videoFreeSpace = Field(("video_free_space",))
+    recordDuration = Field(("record_duration",), toInt)
+    writeProtect = Field(("write_protect",), lambda value: value == "1")
+
+
+# reads several battery responses of getMost
+class BatteryView(ResponseView):
+    __slots__ = (
+        "_powerSave",
+        "_operatingMode",
+        "_chargingPrivacyMode",
+        "_showOnLiveView",
+        "_showPercentage",
+    )
+
+    powerSave = Field(
+        ("getBatteryPowerSave", 0, "battery", "power_save", "enabled"), isNotOff
+    )
+    operatingMode = Field(
+        ("getBatteryOperatingMode", 0, "battery", "operating", "mode")
+    )
+    chargingPrivacyMode = Field(
+        ("getChargingMode", 0, "battery", "charging_mode", "charging_privacy_mode"),
+        isOn,
+    )
+    showOnLiveView = Field(
+        ("getBatteryConfig", 0, "battery", "config", "show_on_liveview"), isOn
+    )
+    showPercentage = Field(
+        ("getBatteryConfig", 0, "battery", "config", "show_percentage"), isOn
+    )
+
+
+def _getSDCards(hdInfo):
+    return tuple(SDCardView(card) for entry in hdInfo for card in entry.values())
+
+
+class MostView(ResponseView):
+    """
+    View over the result of getMost, sub views are created when first accessed.
+    """
+
+    __slots__ = (
+        "_motionDetection",
+        "_personDetection",
+        "_vehicleDetection",
+        "_petDetection",
+        "_barkDetection",
+        "_meowDetection",
+        "_glassDetection",
+        "_tamperDetection",
+        "_lineCrossingDetection",
+        "_led",
+        "_privacyMode",
+        "_sdCards",
+        "_battery",
+    )
+
+    motionDetection = Field(
+        ("getDetectionConfig", 0, "motion_detection", "motion_det"), DetectionView
+    )
+    personDetection = Field(
+        ("getPersonDetectionConfig", 0, "people_detection", "detection"),
+        DetectionView,
+    )
+    vehicleDetection = Field(
+        ("getVehicleDetectionConfig", 0, "vehicle_detection", "detection"),
+        DetectionView,
+    )
+    petDetection = Field(
+        ("getPetDetectionConfig", 0, "pet_detection", "detection"), DetectionView
+    )
+    barkDetection = Field(
+        ("getBarkDetectionConfig", 0, "bark_detection", "detection"), DetectionView
+    )
+    meowDetection = Field(
+        ("getMeowDetectionConfig", 0, "meow_detection", "detection"), DetectionView
+    )
+    glassDetection = Field(
+        ("getGlassDetectionConfig", 0, "glass_detection", "detection"), DetectionView
+    )
+    tamperDetection = Field(
+        ("getTamperDetectionConfig", 0, "tamper_detection", "tamper_det"),
+        DetectionView,
+    )
+    lineCrossingDetection = Field(
+        ("getLinecrossingDetectionConfig", 0, "linecrossing_detection", "detection"),
+        DetectionView,
+    )
+    led = Field(("getLedStatus", 0, "led", "config"), LEDView)
+    privacyMode = Field(
+        ("getLensMaskConfig", 0, "lens_mask", "lens_mask_info"), PrivacyModeView
+    )
+    sdCards = Field(("getSdCardStatus", 0, "harddisk_manage", "hd_info"), _getSDCards)
+
+    battery = Field((), BatteryView)
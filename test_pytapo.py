@@ -841,3 +841,1489 @@ def test_reboot():
     tapo = Tapo(host, user, password)
     result = tapo.reboot()
     assert result["error_code"] == 0
+
+
+def test_motorQueue():
+    from pytapo.motorQueue import MotorQueue
+    from pytapo.logger import Logger
+    from pytapo.error import ResponseException
+
+    class TapoMock:
+        logger = Logger()
+        presets = {"1": "Home"}
+        calls = []
+
+        def executeFunction(self, method, params, retry=False):
+            self.calls.append((method, params))
+            return {"error_code": 0}
+
+    tapo = TapoMock()
+    queue = MotorQueue(tapo, minInterval=0.2)
+    first = queue.moveMotor(10, 0)
+    first.result(timeout=5)
+    merged = [queue.moveMotor(5, 5), queue.moveMotor(5, -10)]
+    superseded = queue.moveMotorStep(90)
+    latest = queue.setPreset(1)
+    assert superseded.result(timeout=5) is False
+    assert latest.result(timeout=5) == {"error_code": 0}
+    for future in merged:
+        assert future.result(timeout=5) is False
+    assert [call[0] for call in tapo.calls] == ["motorMove", "motorMoveToPreset"]
+
+    # steps are summed, opposite ones cancel out, the rest is sent one by one
+    tapo.calls.clear()
+    steps = [queue.moveMotorStep(angle) for angle in (90, 90, 270, 90, 90)]
+    for future in steps:
+        assert future.result(timeout=5) == {"error_code": 0}
+    assert (
+        tapo.calls
+        == [("relativeMove", {"motor": {"movestep": {"direction": "90"}}})] * 3
+    )
+    # orthogonal steps keep their distance
+    tapo.calls.clear()
+    steps = [queue.moveMotorStep(angle) for angle in (0, 90, 0, 90, 180)]
+    for future in steps:
+        assert future.result(timeout=5) == {"error_code": 0}
+    directions = [call[1]["motor"]["movestep"]["direction"] for call in tapo.calls]
+    assert directions == ["0", "90", "90"]
+    queue.close()
+
+    # closing Tapo closes its motor queue
+    from pytapo import Tapo
+
+    camera = Tapo.__new__(Tapo)
+    camera.parent = mock.MagicMock()
+    camera.motorQueue = MotorQueue(tapo)
+    camera.motorQueue.moveMotor(1, 0).result(timeout=5)
+    camera.close()
+    assert camera.motorQueue._closed and camera.motorQueue._thread is None
+
+    # busy motor stops a cruise once before the command is retried
+    class BusyTapoMock(TapoMock):
+        calls = []
+
+        def executeFunction(self, method, params, retry=False):
+            self.calls.append(method)
+            if method == "motorMove" and self.calls.count(method) == 1:
+                raise ResponseException(-64303, {"error_code": -64303}, "Busy")
+            return {"error_code": 0}
+
+        def setCruise(self, enabled, coord=False, retry=False):
+            return self.executeFunction("cruiseStop", {})
+
+    tapo = BusyTapoMock()
+    queue = MotorQueue(tapo, minInterval=0.05)
+    assert queue.moveMotor(10, 0).result(timeout=5) == {"error_code": 0}
+    assert tapo.calls == ["motorMove", "cruiseStop", "motorMove"]
+    queue.close()
+
+
+def test_rateLimiter():
+    from pytapo.transport.rateLimiter import RateLimiter, getRateLimiter
+
+    limiter = RateLimiter(rate=10, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() > 0
+
+    assert limiter.observe({"error_code": -52405}) == -52405
+    assert limiter.rate == 5
+    # second throttle within cooldown does not tighten again
+    limiter.observe({"result": {"responses": [{"error_code": -40109}]}})
+    assert limiter.rate == 5
+    assert limiter.observe({"error_code": 0}) is None
+    assert limiter.rate > 5
+
+    assert getRateLimiter("192.168.1.2:443") is getRateLimiter("192.168.1.2:443")
+
+    from pytapo.error import ResponseException
+
+    limiter = RateLimiter(rate=10, burst=2)
+    err = ResponseException(-52407, {"error_code": -52407}, "Error")
+    assert limiter.observeException(err) == -52407
+    assert limiter.rate == 5
+    assert limiter.observeException(ResponseException(-40401, {}, "Error")) is None
+
+
+def test_circuitBreaker():
+    from pytapo.transport.circuitBreaker import CircuitBreaker
+    from pytapo.error import CircuitOpenException, TemporarySuspensionException
+
+    breaker = CircuitBreaker("192.168.1.2:443", failureThreshold=2, openSeconds=0.2)
+    assert breaker.allow() is False
+    breaker.onConnectionFailure()
+    assert breaker.allow() is False
+    breaker.onConnectionFailure()
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+    time.sleep(0.25)
+    # single probe once the timer runs out
+    assert breaker.allow() is True
+    with pytest.raises(CircuitOpenException):
+        breaker.allow()
+    breaker.onSuccess()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.onSuspension(1800)
+    with pytest.raises(TemporarySuspensionException) as err:
+        breaker.allow()
+    assert "Temporary Suspension: Try again in 1800 seconds" == str(err.value)
+
+
+def test_retryPolicy():
+    from pytapo.retryPolicy import (
+        RetryPolicyEngine,
+        RetryAction,
+        CONNECTION_ERROR,
+        getExceptionKey,
+    )
+
+    engine = RetryPolicyEngine()
+    decision = engine.decide(-40401, 0)
+    assert decision.retry and decision.action == RetryAction.REAUTH
+    assert decision.clearSession
+    assert engine.decide("-40401", 1).retry is False
+    # permanent errors are never retried
+    assert engine.decide(-40106, 0).action == RetryAction.FAIL_FAST
+    assert engine.decide(-40404, 0, serverDelay=2).delay == 2
+    assert engine.decide(-40404, 0, serverDelay=1800).retry is False
+    assert engine.decide(-52405, 0).action == RetryAction.BACKOFF
+    assert getExceptionKey(ConnectionResetError()) == CONNECTION_ERROR
+
+    statistics = engine.getStatistics()
+    assert statistics["actions"][RetryAction.REAUTH] == 1
+    assert statistics["actions"]["exhausted"] == 1
+    assert statistics["keys"]["-40404"][RetryAction.FAIL_FAST] == 1
+
+
+def test_deadline():
+    import asyncio
+    from pytapo import Tapo
+    from pytapo.deadline import deadlineScope, getDeadline, sleep, waitFor
+    from pytapo.error import TapoTimeoutException
+
+    assert getDeadline() is None
+    with deadlineScope(0.2) as outer:
+        # looser inner budget does not extend the outer one
+        with deadlineScope(10) as inner:
+            assert inner is outer
+        with pytest.raises(TapoTimeoutException):
+            sleep(1)
+        with pytest.raises(TapoTimeoutException):
+            asyncio.run(waitFor(asyncio.sleep(1), "request"))
+    assert getDeadline() is None
+
+    # requests made by one public call share the deadline of Tapo(timeout=...)
+    tapo = Tapo.__new__(Tapo)
+    tapo.timeout = 0.2
+    tapo.isKLAP = True
+    tapo.timeCorrection = False
+    deadlines = []
+
+    def executeFunction(method, params, retry=False):
+        deadlines.append(getDeadline())
+        sleep(0.15, method)
+        return {"timestamp": int(time.time())}
+
+    tapo._executeFunction = executeFunction
+    with pytest.raises(TapoTimeoutException):
+        tapo.getEvents()
+    assert len(deadlines) == 2 and deadlines[0] is deadlines[1]
+    # its own timeout still replaces the one of Tapo
+    assert tapo.executeFunction("getDeviceInfo", {}, timeout=1)
+
+
+def test_transportPool():
+    import asyncio
+    from pytapo.transport.pool import TransportPool, PooledSession
+    from pytapo.error import ResponseException, TapoTimeoutException
+    from pytapo.deadline import deadlineScope
+    from pytapo.logger import Logger
+    from pytapo.asyncHandler import AsyncHandler
+
+    class TransportMock:
+        closed = False
+
+        def shutdown(self):
+            pass
+
+        async def close(self):
+            self.closed = True
+
+    def createSession():
+        return PooledSession(TransportMock(), AsyncHandler(None))
+
+    primary = PooledSession(TransportMock(), AsyncHandler(None), primary=True)
+    pool = TransportPool(primary, createSession, 3, Logger())
+    sessions = [pool.acquire(), pool.acquire(), pool.acquire()]
+    assert sessions[0] is primary
+    assert len(set(sessions)) == 3
+    pool.release(sessions[1])
+    assert pool.acquire() is sessions[1]
+
+    # device is out of client slots, pooled session is dropped and limit lowered
+    pool.release(
+        sessions[2], err=ResponseException(-52419, {"error_code": -52419}, "Error")
+    )
+    assert sessions[2].transport.closed
+    assert pool.maxSize == 2
+    assert pool.getStatistics()["size"] == 2
+
+    async def acquireReleased():
+        waiting = asyncio.ensure_future(pool.acquireAsync())
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        await pool.releaseAsync(sessions[0])
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(acquireReleased()) is sessions[0]
+    with pytest.raises(TapoTimeoutException):
+        with deadlineScope(0.05):
+            asyncio.run(pool.acquireAsync())
+
+    # waiter that timed out does not swallow the wakeup of the next one
+    async def acquireAfterTimeout():
+        with deadlineScope(0.05):
+            timedOut = asyncio.ensure_future(pool.acquireAsync())
+        waiting = asyncio.ensure_future(pool.acquireAsync())
+        with pytest.raises(TapoTimeoutException):
+            await timedOut
+        await pool.releaseAsync(sessions[0])
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(acquireAfterTimeout()) is sessions[0]
+
+
+def test_fleet():
+    import asyncio
+    import threading
+    from pytapo.fleet.fleet import TapoFleet
+
+    running = {"all": 0, "hub": 0, "maxAll": 0, "maxHub": 0}
+    lock = threading.Lock()
+
+    class TapoMock:
+        def __init__(self, host, user, password, childID=None):
+            if host == "offline":
+                raise Exception("Unreachable")
+            self.childID = childID
+
+        def getBasicInfo(self):
+            with lock:
+                running["all"] += 1
+                running["maxAll"] = max(running["maxAll"], running["all"])
+                if self.childID:
+                    running["hub"] += 1
+                    running["maxHub"] = max(running["maxHub"], running["hub"])
+            time.sleep(0.05)
+            with lock:
+                running["all"] -= 1
+                if self.childID:
+                    running["hub"] -= 1
+            return {"childID": self.childID}
+
+        def getProfile(self):
+            return {"childID": self.childID}
+
+    fleet = TapoFleet(
+        concurrency=3, hubConcurrency=1, loginStagger=0.01, tapoFactory=TapoMock
+    )
+    for i in range(6):
+        fleet.addDevice(f"camera{i}", f"192.168.1.{i}", "admin", "password")
+    for i in range(3):
+        fleet.addDevice(f"child{i}", "192.168.1.100", "admin", "pw", childID=str(i))
+    fleet.addDevice("offline", "offline", "admin", "password")
+
+    health = fleet.start()
+    assert health["states"] == {"online": 9, "failed": 1}
+    results = fleet.poll(lambda tapo: tapo.getBasicInfo())
+    assert results["child1"] == {"childID": "1"}
+    assert str(results["offline"]) == "Unreachable"
+    assert running["maxAll"] <= 3
+    assert running["maxHub"] == 1
+    assert fleet.getProgress() == {
+        "operation": "poll",
+        "total": 10,
+        "done": 10,
+        "failed": 1,
+    }
+
+    # coroutine functions are awaited on the event loop under the same limits
+    async def getBasicInfoAsync(tapo):
+        running["all"] += 1
+        running["maxAll"] = max(running["maxAll"], running["all"])
+        await asyncio.sleep(0.05)
+        running["all"] -= 1
+        return threading.current_thread().name
+
+    running["maxAll"] = 0
+    results = fleet.poll(getBasicInfoAsync)
+    assert results["child1"] == "pytapo-loop"
+    assert running["maxAll"] == 3
+    # blocking calls get an executor sized to the fleet limit
+    assert fleet._executor._max_workers == 3
+
+    # concurrent operations count their own progress
+    async def getOperations(tapo):
+        await asyncio.sleep(0.05)
+        return fleet.getOperations()
+
+    async def pollBoth():
+        return await asyncio.gather(
+            fleet.pollAsync(getOperations, ["camera0", "camera1"]),
+            fleet.pollAsync(getOperations, ["camera2"]),
+        )
+
+    first, second = fleet.schedule(pollBoth()).result()
+    totals = sorted(progress["total"] for progress in first["camera0"])
+    assert totals == [1, 2]
+    assert fleet.getOperations() == []
+    fleet.addDevice("camera6", "192.168.1.6", "admin", "password")
+    assert fleet.start(["camera6", "offline"])["progress"] == {
+        "operation": "login",
+        "total": 2,
+        "done": 2,
+        "failed": 1,
+    }
+    fleet.close()
+
+
+class ShardTapoMock:
+    def __init__(self, host, user, password, **kwargs):
+        self.host = host
+        self.kwargs = kwargs
+
+    def getProfile(self):
+        return {
+            "isKLAP": False,
+            "KLAPVersion": None,
+            "transportMethod": "pytapo",
+            "playerID": self.host,
+        }
+
+    def getBasicInfo(self):
+        return {"host": self.host, "pid": os.getpid(), "kwargs": self.kwargs}
+
+
+def test_shardedFleet():
+    from pytapo.fleet.sharding import HashRing, ShardedFleet
+
+    ring = HashRing(range(4))
+    owners = {f"camera{i}": ring.getNode(f"camera{i}") for i in range(200)}
+    assert len(set(owners.values())) == 4
+    # removing a node only moves devices it owned
+    ring.removeNode(3)
+    assert all(
+        ring.getNode(name) == owner for name, owner in owners.items() if owner != 3
+    )
+
+    fleet = ShardedFleet(workers=2, loginStagger=0, tapoFactory=ShardTapoMock)
+    try:
+        for i in range(6):
+            profile = {
+                "isKLAP": True,
+                "KLAPVersion": 2,
+                "transportMethod": "klap",
+                "playerID": "x",
+            }
+            fleet.addDevice(
+                f"camera{i}",
+                f"192.168.1.{i}",
+                "admin",
+                "password",
+                profile=profile if i == 0 else None,
+            )
+        assert fleet.start()["states"] == {"online": 6}
+        results = fleet.poll("getBasicInfo")
+        assert len({result["pid"] for result in results.values()}) == 2
+        # serialized profile skips detection
+        assert results["camera0"]["kwargs"]["isKLAP"] is True
+        assert fleet.execute("camera1", "getBasicInfo")["host"] == "192.168.1.1"
+        assert fleet.getProfiles()["camera2"]["playerID"] == "192.168.1.2"
+    finally:
+        fleet.close()
+
+
+def test_leaseCoordinator(tmp_path):
+    from pytapo.fleet.fleet import TapoFleet
+    from pytapo.fleet.lease import (
+        LeaseCoordinator,
+        MemoryLeaseBackend,
+        SQLiteLeaseBackend,
+    )
+
+    for backends in (
+        [MemoryLeaseBackend()] * 2,
+        [SQLiteLeaseBackend(str(tmp_path / "leases.db")) for i in range(2)],
+    ):
+        nodes = [
+            LeaseCoordinator(
+                TapoFleet(loginStagger=0, tapoFactory=ShardTapoMock),
+                backend,
+                nodeID=f"node{i}",
+                ttl=0.5,
+            )
+            for i, backend in enumerate(backends)
+        ]
+        for node in nodes:
+            for i in range(20):
+                node.addDevice(f"camera{i}", f"192.168.1.{i}", "admin", "password")
+
+        # first node owns everything until its peer joins
+        assert len(nodes[0].step()) == 20
+        nodes[1].step()
+        owned = nodes[0].step()
+        owned |= nodes[1].step()
+        assert len(owned) == 20
+        assert not nodes[0].owned & nodes[1].owned
+        assert set(nodes[1].fleet.devices) == nodes[1].owned
+
+        # node 0 dies, its leases expire and node 1 takes over
+        time.sleep(0.6)
+        assert len(nodes[1].step()) == 20
+        for node in nodes:
+            node.stop()
+            node.fleet.close()
+
+    # slow logins do not hold up lease renewals
+    class SlowTapoMock(ShardTapoMock):
+        def __init__(self, *args, **kwargs):
+            time.sleep(0.3)
+            super().__init__(*args, **kwargs)
+
+    node = LeaseCoordinator(
+        TapoFleet(loginStagger=0, tapoFactory=SlowTapoMock),
+        MemoryLeaseBackend(),
+        ttl=0.5,
+    )
+    for i in range(20):
+        node.addDevice(f"camera{i}", f"192.168.1.{i}", "admin", "password")
+    started = time.monotonic()
+    assert len(node.step()) == 20
+    assert time.monotonic() - started < 0.3
+    next(iter(node._starting)).result(5)
+    assert node.fleet.getHealth()["states"] == {"online": 20}
+    assert not node._starting
+    # stop cancels the logins of every step, not only the latest one
+    node.addDevice("camera20", "192.168.1.20", "admin", "password")
+    node.step()
+    node.addDevice("camera21", "192.168.1.21", "admin", "password")
+    node.step()
+    starting = list(node._starting)
+    assert len(starting) == 2
+    node.stop()
+    assert all(future.cancelled() for future in starting)
+    assert not node.owned and not node.fleet.devices
+    node.fleet.close()
+
+
+def test_childRequests():
+    from pytapo.capabilities import Capabilities
+    from pytapo.error import ResponseException
+    from pytapo.logger import Logger
+
+    sent = []
+
+    def performRequest(requestData, loginRetryCount=0, session=None):
+        sent.append(requestData)
+        responses = []
+        for request in requestData["params"]["requests"]:
+            childControl = request["params"]["childControl"]
+            if childControl["device_id"] == "offline":
+                responses.append({"method": "controlChild", "error_code": -40401})
+                continue
+            responseData = {
+                "result": {
+                    "responses": [
+                        {
+                            "method": childRequest["method"],
+                            "result": {},
+                            "error_code": 0,
+                        }
+                        for childRequest in childControl["request_data"]["params"][
+                            "requests"
+                        ]
+                    ]
+                },
+                "error_code": 0,
+            }
+            responses.append(
+                {
+                    "method": "controlChild",
+                    "result": {"response_data": responseData},
+                    "error_code": 0,
+                }
+            )
+        if len(responses) > 1 and dropResponse:
+            responses.pop()
+        return {"result": {"responses": responses}, "error_code": 0}
+
+    hub = Tapo.__new__(Tapo)
+    hub.childID = None
+    hub.timeout = None
+    hub.logger = Logger()
+    hub._performRequest = performRequest
+    children = []
+    for childID in ["child1", "child2", "offline"]:
+        child = Tapo.__new__(Tapo)
+        child.childID = childID
+        child.deviceType = "SMART.IPCAMERA"
+        child.logger = hub.logger
+        child.capabilities = Capabilities({"discovered": True})
+        children.append(child)
+
+    dropResponse = False
+    results = hub.getMostForChildren(children)
+    assert len(sent) == 1
+    assert len(sent[0]["params"]["requests"]) == 3
+    assert results["child1"]["getDeviceInfo"] == [{}]
+    assert isinstance(results["offline"], ResponseException)
+
+    # hub answered for fewer children, each child is requested separately
+    sent.clear()
+    dropResponse = True
+    results = hub.performChildRequests(
+        [
+            (child, {"method": "multipleRequest", "params": {"requests": []}})
+            for child in children
+        ]
+    )
+    assert len(sent) == 4
+    assert results[0] == {"result": {"responses": []}, "error_code": 0}
+    assert isinstance(results[2], ResponseException)
+
+
+def test_desiredState():
+    from pytapo.fleet.fleet import TapoFleet
+    from pytapo.fleet.desiredState import DesiredState
+
+    class TapoMock:
+        def __init__(self, host, user, password):
+            self.config = {
+                "led": {"config": {"enabled": "on"}},
+                "motion_detection": {
+                    "motion_det": {"enabled": "on", "digital_sensitivity": "50"}
+                },
+            }
+            self.calls = []
+
+        def executeFunction(self, method, params):
+            self.calls.append([request["method"] for request in params["requests"]])
+            responses = []
+            # answer in reverse order, like hubs do
+            for request in reversed(params["requests"]):
+                root = next(iter(request["params"]))
+                if request["method"].startswith("set"):
+                    for key, fields in request["params"][root].items():
+                        self.config[root][key].update(fields)
+                    responses.append({"method": request["method"], "error_code": 0})
+                else:
+                    responses.append(
+                        {
+                            "method": request["method"],
+                            "result": {root: json.loads(json.dumps(self.config[root]))},
+                            "error_code": 0,
+                        }
+                    )
+            return responses
+
+        def getErrorMessage(self, errorCode):
+            return str(errorCode)
+
+        def getProfile(self):
+            return {}
+
+    fleet = TapoFleet(loginStagger=0, tapoFactory=TapoMock)
+    for i in range(3):
+        fleet.addDevice(f"camera{i}", f"192.168.1.{i}", "admin", "password")
+    fleet.start()
+    state = DesiredState(fleet)
+    state.setTarget(["camera0", "camera1", "camera2"], {"led": {"enabled": False}})
+    state.setTarget("camera1", {"motionDetection": {"digital_sensitivity": 50}})
+
+    results = state.apply()
+    assert results["camera0"]["changes"] == {"led": {"enabled": False}}
+    assert results["camera1"]["applied"] == ["led"]
+    assert fleet.getDevice("camera1").config["led"]["config"]["enabled"] == "off"
+    assert fleet.getDevice("camera1").calls == [
+        ["getLedStatus", "getDetectionConfig"],
+        ["setLedStatus"],
+    ]
+
+    # unchanged configuration only reads
+    results = state.apply()
+    assert results["camera1"] == {"changes": {}, "errors": {}, "applied": []}
+    assert len(fleet.getDevice("camera1").calls) == 3
+    fleet.close()
+
+
+def test_keepAlive():
+    from pytapo.transport.keepAlive import SessionKeepAlive
+    from pytapo.asyncHandler import AsyncHandler
+
+    class TransportMock:
+        host = "192.168.1.1"
+        session = False
+        sent = 0
+
+        def hasSession(self):
+            return self.session
+
+        async def refreshSession(self):
+            self.session = True
+            keepAlive.onSessionStarted()
+
+        async def send(self, request):
+            self.sent += 1
+
+        def debugLog(self, msg):
+            pass
+
+    transport = TransportMock()
+    keepAlive = SessionKeepAlive(
+        transport, {"method": "get"}, idle=1, warmInterval=10, sessionLifetime=1000
+    )
+    now = keepAlive.lastActivity
+    # nothing to keep alive before the first login
+    assert keepAlive.getAction(now + 5) is None
+
+    transport.session = True
+    keepAlive.onSessionStarted()
+    assert keepAlive.getAction(now) is None
+    assert keepAlive.getAction(now + 20) == SessionKeepAlive.WARM
+    assert keepAlive.getAction(now + 900) == SessionKeepAlive.REFRESH
+
+    # device expired the session early, lifetime is learned from it
+    keepAlive.sessionStartedAt -= 300
+    keepAlive.onSessionExpired()
+    transport.session = False
+    assert 300 <= keepAlive.sessionLifetime < 310
+    keepAlive.lastActivity -= 5
+    assert AsyncHandler(None).executeAsyncExecutorJob(keepAlive.step) == "refresh"
+    assert transport.session
+    assert keepAlive.getAction(keepAlive.sessionStartedAt + 250) == "refresh"
+    assert keepAlive.getStatistics()["refreshes"] == 1
+
+    # refreshing a KLAP session closes the old transport
+    import asyncio
+    from pytapo.transport.klap.klap import Klap
+
+    class KlapTransportMock:
+        closed = False
+
+        async def close(self):
+            self.closed = True
+
+    async def authenticate(retry=False):
+        klap.klapTransport = KlapTransportMock()
+
+    klap = Klap.__new__(Klap)
+    old = klap.klapTransport = KlapTransportMock()
+    klap.authenticate = authenticate
+    asyncio.run(klap.refreshSession())
+    assert old.closed and klap.klapTransport is not old
+
+
+def test_submit():
+    from pytapo.futures import gather
+    from pytapo.error import TapoTimeoutException
+
+    tapo = Tapo.__new__(Tapo)
+    tapo.timeout = None
+    tapo.getSlow = lambda delay: time.sleep(delay) or delay
+    tapo.getFailing = lambda: 1 / 0
+
+    start = time.monotonic()
+    futures = {
+        "fast": tapo.submit("getSlow", 0.1),
+        "fast2": tapo.submit("getSlow", 0.1),
+        "failing": tapo.submit("getFailing"),
+        "slow": tapo.submit("getSlow", 5),
+    }
+    results = gather(futures, timeout=1)
+    assert time.monotonic() - start < 2
+    assert results["fast"] == 0.1 and results["fast2"] == 0.1
+    assert isinstance(results["failing"], ZeroDivisionError)
+    assert isinstance(results["slow"], TapoTimeoutException)
+
+    # request methods run on the event loop and go through the retry path
+    import asyncio
+    import threading
+    from pytapo.asyncHandler import AsyncHandler
+    from pytapo.capabilities import Capabilities
+    from pytapo.retryPolicy import RetryPolicyEngine
+    from pytapo.deadline import waitFor
+
+    sent = []
+
+    class TransportMock:
+        async def authenticate(self):
+            pass
+
+        async def send(self, request):
+            sent.append(threading.current_thread().name)
+            if len(sent) == 1:
+                return {"error_code": -40401}
+            await waitFor(asyncio.sleep(0.1), "request")
+            return {
+                "error_code": 0,
+                "result": {"responses": [{"method": "getSlow", "result": {}}]},
+            }
+
+        def onSessionExpired(self):
+            pass
+
+        async def close(self):
+            pass
+
+    tapo.transport = TransportMock()
+    tapo.transportPool = None
+    tapo.asyncHandler = AsyncHandler(None)
+    tapo.capabilities = Capabilities({"discovered": True})
+    tapo.retryPolicy = RetryPolicyEngine()
+    tapo.childID = None
+    tapo.isKLAP = False
+    assert tapo.submit("executeFunction", "getSlow", None).result() == {}
+    assert sent == ["pytapo-loop", "pytapo-loop"]
+    tapo._getMostRequest = lambda omit_methods, chn_id: {
+        "method": "multipleRequest",
+        "params": {"requests": [{"method": "getSlow"}]},
+    }
+    tapo._processMostResponse = lambda requestData, results, omit, chn_id: results
+    tapo.logger = mock.Mock()
+    assert tapo.submit("getMost").result()["error_code"] == 0
+    assert sent[-1] == "pytapo-loop"
+    # deadline counts from submit, not from when the request starts
+    with pytest.raises(TapoTimeoutException):
+        tapo.submitRequest({"method": "getSlow"}, timeout=0.05).result()
+
+
+def test_transportExecutor():
+    import asyncio
+    from pytapo.transport.executor import TransportExecutor
+
+    executor = TransportExecutor(1, "pytapo-test")
+
+    async def run():
+        return await asyncio.gather(*(executor.run(time.sleep, 0.1) for _ in range(3)))
+
+    asyncio.run(run())
+    statistics = executor.getStatistics()
+    assert statistics["calls"] == 3
+    assert statistics["queued"] == 0 and statistics["running"] == 0
+    # single thread, last call waited for both others
+    assert statistics["maxWait"] >= 0.15
+    executor.shutdown()
+
+
+def test_eventFeed(monkeypatch):
+    import asyncio
+    from pytapo import Tapo
+    from pytapo.playback import eventFeed
+    from pytapo.playback.eventFeed import EventFeed
+
+    now = int(time.time())
+    stored = [
+        {"start_time": now - 100, "end_time": now - 90, "alarm_type": 2},
+        {"start_time": now - 50, "end_time": now - 40, "alarm_type": 2},
+        {"start_time": now - 50, "end_time": now - 45, "alarm_type": 6},
+    ]
+    queries = []
+
+    class TapoMock:
+        newestFirst = False
+        _correctEvent = Tapo._correctEvent
+
+        def getTimeCorrection(self):
+            return 0
+
+        def searchDetectionList(self, startTime, endTime, startIndex, endIndex):
+            queries.append((startTime, startIndex, endIndex))
+            events = [
+                dict(event)
+                for event in stored
+                if startTime <= event["start_time"] <= endTime
+            ]
+            if self.newestFirst:
+                events.sort(key=lambda event: -event["start_time"])
+            return events[startIndex : endIndex + 1]
+
+    feed = EventFeed(TapoMock(), pageSize=2, interval=0.01)
+    assert len(feed.poll()) == 3
+    # three events need two pages
+    assert [query[1:] for query in queries] == [(0, 1), (2, 3)]
+    assert feed.cursorTime == now - 50
+    assert feed.poll() == []
+    assert queries[-1][0] == now - 50
+
+    stored.append({"start_time": now - 50, "end_time": now - 20, "alarm_type": 4})
+    stored.append({"start_time": now - 10, "end_time": now - 5, "alarm_type": 2})
+
+    async def collect():
+        iterator = feed.__aiter__()
+        return [await iterator.__anext__() for _ in range(2)]
+
+    events = asyncio.run(collect())
+    assert [event["alarm_type"] for event in events] == [4, 2]
+
+    # events past the page limit are not skipped when listed newest first
+    monkeypatch.setattr(eventFeed, "EVENT_MAX_PAGES", 2)
+    stored[:] = [
+        {"start_time": now - 100 + i, "end_time": now - 90 + i, "alarm_type": 2}
+        for i in range(7)
+    ]
+    tapo = TapoMock()
+    tapo.newestFirst = True
+    tapo.logger = mock.MagicMock()
+    feed = EventFeed(tapo, startTime=now - 200, pageSize=2)
+    times = []
+    for _ in range(5):
+        times += [event["start_time"] for event in feed.poll()]
+    assert sorted(times) == [now - 100 + i for i in range(7)]
+    assert feed.cursorTime == now - 94
+    assert feed.poll() == []
+
+
+def test_eventStore(tmp_path, monkeypatch):
+    from pytapo.playback.eventStore import EventStore
+
+    store = EventStore(str(tmp_path))
+    assert store.getEvents(0, 100) == []
+    events = [
+        {"start_time": 300, "end_time": 310, "alarm_type": 2},
+        {"start_time": 100, "end_time": 110, "alarm_type": 2},
+        {"start_time": 200, "end_time": 210, "alarm_type": 6},
+    ]
+    assert store.addEvents("front", events) == 3
+    # already stored events are skipped
+    assert store.addEvents("front", events[:2]) == 0
+    assert (
+        store.addEvents("back", [{"start_time": 150, "end_time": 160, "alarm_type": 2}])
+        == 1
+    )
+    assert [event["start_time"] for event in store.getEvents(100, 250)] == [
+        100,
+        150,
+        200,
+    ]
+    assert store.getEvents(100, 200, cameras=["back"])[0]["camera"] == "back"
+    assert store.countByType(0, 1000) == {2: 3, 6: 1}
+    store.close()
+
+    store = EventStore(str(tmp_path))
+    assert len(store) == 4
+    assert store.countByType(0, 1000, cameras=["front"]) == {2: 2, 6: 1}
+    store.close()
+
+    # newer events are appended, older ones go to the run until it is merged
+    import pytapo.playback.eventStore as eventStore
+
+    monkeypatch.setattr(eventStore, "EVENT_STORE_RUN_SIZE", 4)
+    store = EventStore(str(tmp_path))
+    store.addEvents("front", [{"start_time": 400, "end_time": 410}])
+    assert (store._indexCount, store._runCount) == (4, 1)
+    store.addEvents("front", [{"start_time": 50, "end_time": 60}])
+    store.addEvents("front", [{"start_time": 250, "end_time": 260}])
+    assert (store._indexCount, store._runCount) == (4, 3)
+    starts = [event["start_time"] for event in store.getEvents(0, 1000)]
+    assert starts == [50, 100, 150, 200, 250, 300, 400]
+    assert store.addEvents("front", [{"start_time": 250, "end_time": 260}]) == 0
+    store.addEvents("back", [{"start_time": 120, "end_time": 130}])
+    assert (store._indexCount, store._runCount) == (8, 0)
+    store.close()
+
+    store = EventStore(str(tmp_path))
+    assert [event["start_time"] for event in store.getEvents(0, 1000)] == [
+        50,
+        100,
+        120,
+        150,
+        200,
+        250,
+        300,
+        400,
+    ]
+    store.close()
+
+
+def test_recordingsIndex(tmp_path):
+    from pytapo.playback.recordingsIndex import RecordingsIndex
+
+    searched = []
+
+    class TapoMock:
+        days = ["20240101", "20240102", "20240103"]
+
+        def getRecordingDays(self, startDate):
+            return self.days
+
+        def getRecordingsForDays(self, days):
+            return {day: self.getRecordings(day) for day in days}
+
+        def getRecordings(self, date):
+            searched.append(date)
+            base = int(date) * 1000
+            return [
+                {"search_video_results_1": {"startTime": base, "endTime": base + 100}},
+                {
+                    "search_video_results_2": {
+                        "startTime": base + 200,
+                        "endTime": base + 300,
+                    }
+                },
+            ]
+
+    tapo = TapoMock()
+    index = RecordingsIndex(tapo, str(tmp_path / "recordings.db"), recheckDays=1)
+    assert index.sync()["synced"] == tapo.days
+    searched.clear()
+    # only the latest day is searched again
+    tapo.days = ["20240102", "20240103", "20240104"]
+    assert index.sync() == {"synced": ["20240103", "20240104"], "removed": ["20240101"]}
+    assert index.getDays() == tapo.days
+
+    base = 20240102000
+    assert index.getSegmentAt(base + 50)["endTime"] == base + 100
+    assert index.getSegmentAt(base + 150) is None
+    assert index.getGaps(base, base + 400) == [
+        (base + 100, base + 200),
+        (base + 300, base + 400),
+    ]
+    assert len(index.getSegments(base + 50, base + 250)) == 2
+
+    # segment over midnight reported by both days is kept once per day
+    overnight = {"startTime": base + 900, "endTime": base + 1100}
+    index.storeDay("20240102", [{"search_video_results_3": overnight}])
+    index.storeDay("20240103", [{"search_video_results_1": overnight}])
+    index.storeDay("20240102", [{"search_video_results_3": overnight}])
+    assert index.getSegments(base + 1000, base + 1000) == [overnight]
+    index.storeDay("20240102", [])
+    assert index.getSegmentAt(base + 1000) == overnight
+    index.close()
+
+
+def test_timeline(monkeypatch):
+    import random
+    from pytapo.playback import timeline
+
+    recordings = [
+        {"search_video_results_1": {"startTime": 300, "endTime": 400}},
+        {"search_video_results_2": {"startTime": 100, "endTime": 200}},
+        {"search_video_results_3": {"startTime": 150, "endTime": 250}},
+    ]
+    for numpy in (timeline.numpy, None):
+        monkeypatch.setattr(timeline, "numpy", numpy)
+        tl = timeline.RecordingTimeline.fromRecordings(recordings)
+        assert len(tl) == 3
+        assert tl.getOverlapping(180, 320) == [(100, 200), (150, 250), (300, 400)]
+        assert tl.getOverlapping(260, 290) == []
+        assert tl.getGaps(0, 500) == [(0, 100), (250, 300), (400, 500)]
+        assert tl.getGaps(260, 290) == [(260, 290)]
+        assert tl.getCoverage(100, 300) == 75
+        assert tl.getNearest(120) == (100, 200)
+        assert tl.getNearest(280) == (300, 400)
+        assert tl.getNearest(260) == (150, 250)
+        assert timeline.RecordingTimeline().getNearest(0) is None
+
+        # long segments early on must not hide later overlapping ones
+        random.seed(1)
+        starts = [random.randrange(10000) for _ in range(300)]
+        ends = [start + random.choice((5, 50, 5000)) for start in starts]
+        tl = timeline.RecordingTimeline(starts, ends)
+        for _ in range(100):
+            startTime = random.randrange(11000)
+            endTime = startTime + random.randrange(200)
+            assert sorted(tl.getOverlapping(startTime, endTime)) == sorted(
+                (start, end)
+                for start, end in zip(starts, ends)
+                if start <= endTime and end >= startTime
+            )
+
+
+def test_iterPages():
+    import asyncio
+
+    requested = []
+
+    def getRecordings(date, startIndex, endIndex):
+        requested.append((startIndex, endIndex))
+        return [
+            {f"search_video_results_{i}": {"startTime": i, "endTime": i + 1}}
+            for i in range(startIndex, min(endIndex + 1, 25))
+        ]
+
+    tapo = Tapo.__new__(Tapo)
+    tapo.getRecordings = getRecordings
+
+    async def collect(limit=None):
+        found = []
+        recordings = tapo.iterRecordings("20240101", pageSize=10)
+        async for recording in recordings:
+            found.append(recording)
+            if len(found) == limit:
+                break
+        await recordings.aclose()
+        return found
+
+    assert len(asyncio.run(collect())) == 25
+    assert requested == [(0, 9), (10, 19), (20, 29)]
+    requested.clear()
+    # at most the prefetched page is requested once the consumer breaks
+    assert len(asyncio.run(collect(5))) == 5
+    assert requested[0] == (0, 9) and len(requested) <= 2
+
+    with pytest.raises(Exception):
+        tapo.iterRecordings()
+
+    # pages decoded by the secure transport are streamed element by element
+    import base64
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import pad
+    from pytapo.transport.pytapo.streamDecode import decodeResponse
+
+    def getStreamedRecordings(date, startIndex, endIndex):
+        text = json.dumps(
+            {
+                "playback": {
+                    "search_video_results": getRecordings(date, startIndex, endIndex)
+                }
+            }
+        )
+        encoded = base64.b64encode(
+            AES.new(b"k" * 16, AES.MODE_CBC, b"i" * 16).encrypt(
+                pad(text.encode(), AES.block_size)
+            )
+        ).decode()
+        return decodeResponse(b"k" * 16, b"i" * 16, encoded)["playback"][
+            "search_video_results"
+        ]
+
+    tapo.getRecordings = getStreamedRecordings
+    found = asyncio.run(collect())
+    assert [next(iter(entry.values()))["startTime"] for entry in found] == list(
+        range(25)
+    )
+
+
+def test_getRecordingsRange():
+    from pytapo.error import ResponseException
+    from pytapo.userIDPool import UserIDPool
+
+    batches = []
+    userIDs = iter(["first", "second"])
+
+    def executeFunction(method, params, retry=False):
+        if method == "searchDateWithVideo":
+            return {
+                "playback": {
+                    "search_results": [
+                        {"search_results_1": {"date": "20240102"}},
+                        {"search_results_2": {"date": "20240101"}},
+                        {"search_results_3": {"date": "20240103"}},
+                    ]
+                }
+            }
+        requests = params["requests"]
+        batches.append([request["params"]["playback"] for request in requests])
+        responses = []
+        for request in requests:
+            search = request["params"]["playback"]["search_video_utility"]
+            if search["id"] == "first" and search["date"] != "20240101":
+                responses.append(
+                    {
+                        "method": request["method"],
+                        "params": request["params"],
+                        "error_code": -71103,
+                    }
+                )
+                continue
+            start = int(search["date"]) * 10
+            responses.append(
+                {
+                    "method": request["method"],
+                    "params": request["params"],
+                    "result": {
+                        "playback": {
+                            "search_video_results": [
+                                {"search_video_results_1": {"startTime": start + 5}},
+                                {"search_video_results_2": {"startTime": start}},
+                            ]
+                        }
+                    },
+                    "error_code": 0,
+                }
+            )
+        # hubs may answer in any order
+        return responses[::-1]
+
+    tapo = Tapo.__new__(Tapo)
+    tapo.childID = None
+    tapo.requestUserID = lambda: next(userIDs)
+    tapo.userIDPool = UserIDPool(tapo)
+    tapo.logger = mock.Mock()
+    tapo.retryPolicy = mock.Mock()
+    tapo.retryPolicy.decide.side_effect = lambda code, attempt: mock.Mock(
+        retry=attempt == 0
+    )
+    tapo.executeFunction = executeFunction
+
+    recordings = tapo.getRecordingsRange("20240101", "20240103", batchSize=2)
+    starts = [list(recording.values())[0]["startTime"] for recording in recordings]
+    assert starts == sorted(starts) and len(starts) == 6
+    # two batches, user ID renewed once for the expired day of the first one
+    assert len(batches) == 3
+    assert [len(batch) for batch in batches] == [2, 1, 1]
+    # searches borrow IDs from the pool, the rejected one was dropped
+    assert tapo.userIDPool.getStatistics()["discarded"] == 1
+    assert tapo.userIDPool.getStatistics()["leased"] == 0
+    found = tapo.getRecordingsForDays(["20240102", "20240103"])
+    assert found["20240102"][1]["search_video_results_2"]["startTime"] == 202401020
+
+    tapo.executeFunction = lambda method, params, retry=False: [
+        {"method": "searchVideoOfDay", "error_code": -40210}
+    ]
+    with pytest.raises(ResponseException):
+        tapo.getRecordingsForDays(["20240101"])
+
+
+def test_streamDecode():
+    import base64
+    from Crypto.Cipher import AES
+    from Crypto.Util.Padding import pad
+    import random
+    from pytapo.transport.pytapo.streamDecode import (
+        decodeChunks,
+        decodeResponse,
+        decryptChunks,
+        streamElements,
+    )
+
+    document = {
+        "result": {
+            "responses": [
+                {
+                    "method": "searchVideoOfDay",
+                    "result": {
+                        "playback": {
+                            "search_video_results": [
+                                {f"search_video_results_{i}": {"startTime": i}}
+                                for i in range(20)
+                            ]
+                        }
+                    },
+                    "error_code": 0,
+                },
+                {"method": "getLensMaskConfig", "result": {"text": 'a"],\\ ž'}},
+                {"method": "getAudioConfig", "result": {"search_results": []}},
+                # look like placeholders of streamed lists
+                {"method": "getLedStatus", "result": {"led": "\x000", "x": [0]}},
+            ]
+        },
+        "error_code": 0,
+    }
+    text = json.dumps(document, ensure_ascii=False, indent=1)
+    for size in (1, 7, 64, len(text)):
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert decodeChunks(chunks) == document
+
+    lsk, ivb = b"k" * 16, b"i" * 16
+    encoded = base64.b64encode(
+        AES.new(lsk, AES.MODE_CBC, ivb).encrypt(pad(text.encode(), AES.block_size))
+    ).decode()
+    assert decodeChunks(decryptChunks(lsk, ivb, encoded, 64)) == document
+    assert decodeResponse(lsk, ivb, encoded) == document
+    escaped = '{"search_\\u0072esults": [1, {"search_results": [[2]]}]}'
+    assert decodeChunks([escaped]) == json.loads(escaped)
+
+    elements = []
+    with streamElements(lambda key, element: elements.append(element)):
+        streamed = decodeResponse(lsk, ivb, encoded)
+    assert len(elements) == 20
+    assert streamed["result"]["responses"][0]["result"]["playback"] == {
+        "search_video_results": []
+    }
+
+    # same result as json.loads for random documents with streamed keys
+    randomGenerator = random.Random(1)
+
+    def randomValue(depth=0):
+        kind = randomGenerator.randrange(6 if depth < 3 else 3)
+        if kind == 0:
+            return randomGenerator.choice([None, True, 1, -2.5, "\x00", "\x001"])
+        if kind == 1:
+            return "".join(randomGenerator.choice('a"\\\x00[]:,{}ž') for i in range(3))
+        if kind == 2:
+            return randomGenerator.choice([[], {}, [0], [None]])
+        if kind == 3:
+            return [randomValue(depth + 1) for i in range(randomGenerator.randrange(4))]
+        keys = ["responses", "search_results", "result", "\x00", "a"]
+        return {
+            randomGenerator.choice(keys): randomValue(depth + 1)
+            for i in range(randomGenerator.randrange(4))
+        }
+
+    for i in range(300):
+        value = {"result": randomValue()}
+        text = json.dumps(value, ensure_ascii=bool(i % 2))
+        size = randomGenerator.randrange(1, 20)
+        chunks = [text[i : i + size] for i in range(0, len(text), size)]
+        assert decodeChunks(chunks) == json.loads(text)
+
+    with pytest.raises(ValueError):
+        decodeChunks([text[:-5]])
+
+
+def test_views():
+    from pytapo.views import DetectionView
+
+    data = {
+        "getDetectionConfig": [
+            {
+                "motion_detection": {
+                    "motion_det": {"enabled": "on", "digital_sensitivity": "60"}
+                }
+            }
+        ],
+        "getPersonDetectionConfig": [False],
+        "getLedStatus": [{"led": {"config": {"enabled": "off"}}}],
+        "getSdCardStatus": [
+            {
+                "harddisk_manage": {
+                    "hd_info": [
+                        {"hd_info_1": {"status": "normal", "write_protect": "0"}}
+                    ]
+                }
+            }
+        ],
+        "getBatteryPowerSave": [{"battery": {"power_save": {"enabled": "auto"}}}],
+    }
+    tapo = Tapo.__new__(Tapo)
+    tapo.getMost = lambda omit_methods=[], chn_id=None: data
+    view = tapo.getMostView()
+
+    assert isinstance(view.motionDetection, DetectionView)
+    # decoded on first access only
+    assert not hasattr(view.motionDetection, "_enabled")
+    assert view.motionDetection.enabled is True
+    assert view.motionDetection._enabled is True
+    assert view.motionDetection.digitalSensitivity == 60
+    assert view.motionDetection.sensitivity is None
+    assert view.personDetection is None
+    assert view.led.enabled is False
+    assert view.sdCards[0].status == "normal"
+    assert view.sdCards[0].writeProtect is False
+    assert view.battery.powerSave is True
+    assert view.battery.showPercentage is None
+    assert view.raw is data
+    assert view.led.asDict() == {"enabled": False}
+    # response is dropped once every field is decoded
+    assert view.led.raw is None
+    assert view.motionDetection.raw is None
+    assert view.motionDetection.enabled is True
+    assert view.battery.raw is data
+    view.battery.asDict()
+    assert view.battery.raw is None
+
+    with pytest.raises(AttributeError):
+        view.led.enabled = True
+    with pytest.raises(AttributeError):
+        view.something = 1
+
+
+def test_userIDPool():
+    import asyncio
+    import threading
+    from pytapo.error import ResponseException, TapoTimeoutException
+    from pytapo.userIDPool import UserIDPool
+
+    class TapoMock:
+        def __init__(self):
+            self.issued = 0
+
+        def requestUserID(self):
+            # device has room for two IDs
+            if self.issued == 2:
+                raise ResponseException(-71101, {}, "USER_ID_FULL")
+            self.issued += 1
+            return f"id{self.issued}"
+
+    tapo = TapoMock()
+    pool = UserIDPool(tapo, maxSize=4)
+    first = pool.acquire(1)
+    second = pool.acquire(1)
+    assert {first, second} == {"id1", "id2"}
+
+    # waiters are served in order once the device is full
+    served = []
+    waiters = []
+    for name in ("a", "b"):
+        waiter = threading.Thread(
+            target=lambda name=name: served.append((name, pool.acquire(5)))
+        )
+        waiter.start()
+        waiters.append(waiter)
+        while pool.getStatistics()["waiting"] < len(waiters):
+            time.sleep(0.01)
+    assert pool.getStatistics()["limit"] == 2
+    pool.release(first)
+    waiters[0].join(5)
+    # an expired ID is dropped and a new one requested for the next waiter
+    tapo.issued = 1
+    pool.discard(second)
+    waiters[1].join(5)
+    assert served == [("a", "id1"), ("b", "id2")]
+    assert pool.getStatistics()["discarded"] == 1
+
+    with pytest.raises(TapoTimeoutException):
+        pool.acquire(0.05)
+
+    async def leaseAsync():
+        async with pool.lease(1) as lease:
+            return lease.userID
+
+    pool.release("id1")
+    assert asyncio.run(leaseAsync()) == "id1"
+    assert pool.getStatistics()["idle"] == 1
+
+    empty = UserIDPool(TapoMock())
+    empty.tapo.issued = 2
+    with pytest.raises(ResponseException):
+        empty.acquire(1)
+
+
+def test_userIDPoolRejected():
+    from pytapo.userIDPool import UserIDPool
+
+    class TapoMock:
+        def __init__(self):
+            self.issued = 0
+
+        def requestUserID(self):
+            self.issued += 1
+            return f"id{self.issued}"
+
+    pool = UserIDPool(TapoMock(), maxSize=1)
+    with pool.lease(1) as lease:
+        assert lease.userID == "id1"
+        assert not lease.expireOnError({"type": "notification", "params": {}})
+        assert lease.expireOnError(
+            {"type": "response", "params": {"error_code": -71103}}
+        )
+    # rejected ID is not handed out again
+    with pool.lease(1) as lease:
+        assert lease.userID == "id2"
+    with pool.lease(1) as lease:
+        assert lease.userID == "id2"
+    assert pool.getStatistics()["discarded"] == 1
+
+
+def test_capabilities():
+    from pytapo.capabilities import Capabilities
+    from pytapo.error import ResponseException
+    from pytapo.retryPolicy import RetryPolicyEngine
+    from pytapo.deadline import waitFor
+
+    sent = []
+
+    def performRequest(requestData):
+        requests = requestData["params"]["requests"]
+        sent.append([request["method"] for request in requests])
+        return {
+            "result": {
+                "responses": [
+                    (
+                        {"method": request["method"], "error_code": -40106}
+                        if request["method"] == "getWhitelampConfig"
+                        else {
+                            "method": request["method"],
+                            "result": {},
+                            "error_code": 0,
+                        }
+                    )
+                    for request in requests
+                ]
+            }
+        }
+
+    tapo = Tapo.__new__(Tapo)
+    tapo.capabilities = Capabilities()
+    tapo.retryPolicy = RetryPolicyEngine()
+    tapo.performRequest = performRequest
+    tapo.deviceType = "SMART.IPCAMERA"
+    tapo.childID = None
+    tapo.presets = {}
+    tapo.logger = type("Logger", (), {"debugLog": lambda self, msg: None})()
+    tapo.parent = None
+    discovered = []
+    tapo.getModuleSpec = lambda: {
+        "function": {"module_spec": {"ptz": "1", "petDetection": "0"}}
+    }
+    tapo.getVideoCapability = lambda: {"video_capability": {"main": {}}}
+    tapo.getAudioSpec = lambda: {}
+    tapo.getAppComponentList = lambda: discovered.append(True) or {
+        "app_component": {
+            "app_component_list": [
+                {"name": "ptz", "version": 1},
+                {"name": "personDetection", "version": 1},
+            ]
+        }
+    }
+    tapo.getChildDeviceComponentList = lambda: {
+        "child_component_list": [
+            {"device_id": "child", "component_list": [{"id": "battery", "ver_code": 1}]}
+        ]
+    }
+
+    with pytest.raises(ResponseException):
+        tapo._executeFunction("getWhitelampConfig", {})
+    assert tapo.capabilities.unsupported == {"getWhitelampConfig": -40106}
+    # second call fails without a request
+    with pytest.raises(ResponseException) as err:
+        tapo._executeFunction("getWhitelampConfig", {})
+    assert err.value.errorCode == -40106
+    assert len(sent) == 1
+    assert not tapo.capabilities.discovered
+
+    # first gated method discovers capabilities, components switched off are skipped
+    result = tapo.getMost()
+    assert discovered == [True]
+    assert tapo.capabilities.hasComponent("battery", "child")
+    assert "getWhitelampConfig" not in sent[-1]
+    assert "getPetDetectionConfig" not in sent[-1]
+    assert "getPersonDetectionConfig" in sent[-1]
+    # missing from the component list is not trusted, the request is still sent
+    assert "getVehicleDetectionConfig" in sent[-1]
+    assert result["getWhitelampConfig"] == [False]
+    assert result["getPetDetectionConfig"] == [False]
+    assert tapo.capabilities.audioConfig == {}
+    assert tapo.getAudioConfig(cached=True) == {}
+    assert len(sent) == 2
+    with pytest.raises(ResponseException):
+        tapo._executeFunction("setPetDetectionConfig", {})
+    assert len(sent) == 2
+    assert tapo.capabilities.isSupported("getPresetConfig")
+    tapo.getMost()
+    assert discovered == [True]
+
+    # restored from a stored profile
+    restored = Capabilities(json.loads(json.dumps(tapo.capabilities.toDict())))
+    assert not restored.isSupported("getWhitelampConfig")
+    assert not restored.isSupported("getPetDetectionConfig")
+    assert restored.isSupported("getLedStatus")
+    assert restored.audioConfig is None
+
+    # preset check on connect does not discover, module spec without ptz
+    # disables preset methods once discovered
+    tapo.capabilities = Capabilities()
+    tapo.getModuleSpec = lambda: {"function": {"module_spec": {"ptz": "0"}}}
+    tapo.isSupportingPresets()
+    assert not tapo.capabilities.discovered
+    tapo.getCapabilities()
+    sentBefore = len(sent)
+    assert not tapo.isSupportingPresets()
+    assert len(sent) == sentBefore
+
+    # child created without getChild uses its own component list
+    tapo.capabilities = Capabilities()
+    tapo.childID = "child"
+    assert tapo.getCapabilities().hasComponent("personDetection")